@@ -0,0 +1,250 @@
+"""End-to-end timings of `tasks_api` against the mock gateway.
+
+Scenarios:
+    login            repeated logins (school lookup + token)
+    list_sync        full homework list sync, all pages
+    text_extraction  paper download and text extraction, one record at a time
+    prefetch         the same for many records, sequential vs a thread pool
+
+Results are printed and written as JSON to benchmarks/results/ (named after
+the current commit), so runs of different commits can be compared with
+`--compare <older result>`.
+
+`--cassette-mode record` saves the traffic to `--cassette`; `replay` then runs
+the same scenarios from it without the gateway, which leaves only the client
+side (parsing and pipeline overhead), and `replay-realtime` adds back the
+recorded network time.
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import platform
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from ehh import globalvars, tasks_api
+from ehh.models.credentials import Credentials
+from ehh.utils.context.base import Messenger
+from ehh.utils.context.impl.api_context import APIContext
+from ehh.utils.http_cassette import CassetteTransport
+
+from mock_gateway import GatewayServer, add_gateway_arguments, gateway_from_args
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ["login", "list_sync", "text_extraction", "prefetch"]
+
+
+class QuietMessenger(Messenger):
+    # the clients report every step; that output would dominate the timings
+
+    def send_text(self, *args, **kwargs) -> None:
+        pass
+
+    def send_table(self, *args, **kwargs) -> None:
+        pass
+
+    def send_progress(self, func, *args, **kwargs) -> None:
+        func(None, *args, **kwargs)
+
+    def send_exception(self, exception: Exception) -> None:
+        raise exception
+
+
+def _summary(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[math.ceil(len(samples) * 0.95) - 1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+def _timed(func, *args) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def bench_login(args, credentials: Credentials) -> dict:
+    samples = []
+    for _ in range(args.logins):
+        elapsed, token = _timed(tasks_api.login, credentials)
+        assert token is not None, "login failed"
+        samples.append(elapsed)
+    return _summary(samples)
+
+
+def bench_list_sync(args, token) -> dict:
+    samples = []
+    for _ in range(args.repeat):
+        elapsed, hw_list = _timed(tasks_api.get_hw_list, token)
+        assert hw_list is not None and len(hw_list) == args.homeworks
+        samples.append(elapsed)
+    return {
+        **_summary(samples),
+        "records": args.homeworks,
+        "records_per_s": round(args.homeworks / statistics.median(samples), 1),
+    }
+
+
+def bench_text_extraction(args, token, records) -> dict:
+    samples = []
+    chars = 0
+    for record in records[: args.records]:
+        elapsed, text = _timed(tasks_api.get_text, token, record)
+        assert text is not None
+        samples.append(elapsed)
+        chars += len(text)
+    return {**_summary(samples), "chars": chars}
+
+
+def bench_prefetch(args, token, records) -> dict:
+    records = records[: args.records]
+
+    started = time.perf_counter()
+    for record in records:
+        tasks_api.get_text(token, record)
+    sequential = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        texts = list(pool.map(lambda r: tasks_api.get_text(token, r), records))
+    pooled = time.perf_counter() - started
+    assert all(text is not None for text in texts)
+
+    return {
+        "records": len(records),
+        "workers": args.workers,
+        "sequential_s": round(sequential, 3),
+        "pooled_s": round(pooled, 3),
+        "sequential_records_per_s": round(len(records) / sequential, 1),
+        "pooled_records_per_s": round(len(records) / pooled, 1),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _compare(current: dict, previous: dict) -> None:
+    print(f"compared with {previous['commit']} ({previous['timestamp']}):")
+    for scenario, metrics in current["results"].items():
+        old_metrics = previous["results"].get(scenario, {})
+        for name, value in metrics.items():
+            old = old_metrics.get(name)
+            if not isinstance(value, (int, float)) or not old:
+                continue
+            print(f"  {scenario}.{name}: {old} -> {value} ({value / old - 1:+.1%})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_gateway_arguments(parser)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5, help="list syncs")
+    parser.add_argument("--records", type=int, default=50, help="papers to extract")
+    parser.add_argument("--workers", type=int, default=8, help="prefetch threads")
+    parser.add_argument("--cassette", type=Path, default=Path("bench_api.jsonl.gz"))
+    parser.add_argument(
+        "--cassette-mode", choices=["record", "replay", "replay-realtime"]
+    )
+    parser.add_argument("--output", type=Path, help="result file")
+    parser.add_argument("--compare", type=Path, help="earlier result file")
+    args = parser.parse_args()
+
+    gateway = gateway_from_args(args)
+    transport = None
+    if args.cassette_mode == "record":
+        transport = CassetteTransport(args.cassette, "record")
+    elif args.cassette_mode is not None:
+        transport = CassetteTransport(
+            args.cassette, "replay", realtime=args.cassette_mode == "replay-realtime"
+        )
+    replaying = transport is not None and transport.mode == "replay"
+
+    with (
+        contextlib.nullcontext("http://replay.invalid")
+        if replaying
+        else GatewayServer(gateway)
+    ) as base_url:
+        globalvars.context = APIContext(
+            messenger=QuietMessenger(),
+            http_client=httpx.Client(
+                base_url=base_url, timeout=60, transport=transport
+            ),
+        )
+        credentials = Credentials(school="实验中学", username="bench", password="pw")
+        token = tasks_api.login(credentials)
+        records = tasks_api.get_hw_list(token)
+        # warm the paper cache of the gateway, so every scenario sees the same
+        # server-side cost
+        for record in records[: args.records]:
+            tasks_api.get_text(token, record)
+
+        results = {}
+        for scenario in args.scenarios:
+            match scenario:
+                case "login":
+                    results[scenario] = bench_login(args, credentials)
+                case "list_sync":
+                    results[scenario] = bench_list_sync(args, token)
+                case "text_extraction":
+                    results[scenario] = bench_text_extraction(args, token, records)
+                case "prefetch":
+                    results[scenario] = bench_prefetch(args, token, records)
+    if transport is not None:
+        transport.finish()
+
+    now = datetime.now(timezone.utc)
+    report = {
+        "benchmark": "api",
+        "commit": _git_commit(),
+        "timestamp": now.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "cassette_mode": args.cassette_mode,
+        "gateway": {
+            "homeworks": args.homeworks,
+            "questions": args.questions,
+            "latency_ms": args.latency,
+            "jitter_ms": args.jitter,
+            "seed": args.seed,
+        },
+        "requests": gateway.requests,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    output = args.output or (
+        RESULTS_DIR / f"api-{now:%Y%m%dT%H%M%S}-{report['commit']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False), "utf-8")
+    print(f"saved results to {output}")
+
+    if args.compare is not None:
+        _compare(report, json.loads(args.compare.read_text("utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Latency of Telegram bot updates delivered through the webhook.
+
+Runs a fake Bot API server and the bot's webhook app locally, posts updates
+for several chats and measures the time until each reply reaches the fake
+server. Compares sequential processing with `PerChatUpdateProcessor`, and
+checks that replies within each chat keep their order.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import parse_qs
+
+import httpx
+import uvicorn
+from telegram import Update
+from telegram.ext import (
+    Application,
+    BaseUpdateProcessor,
+    ContextTypes,
+    MessageHandler,
+    SimpleUpdateProcessor,
+    filters,
+)
+
+from ehh.utils.telegram_updates import PerChatUpdateProcessor
+from ehh.utils.telegram_webhook import WebhookApp
+
+TOKEN = "123456:fake"
+SECRET = "bench-secret"
+
+
+class FakeTelegram:
+    """Just enough of the Bot API for the bot to start and reply."""
+
+    def __init__(self) -> None:
+        self.replies: list[tuple[float, int, str]] = []
+        self.reply_event = asyncio.Event()
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        headers = dict(scope["headers"])
+        if headers.get(b"content-type", b"").startswith(b"application/json"):
+            params = json.loads(body or b"{}")
+        else:
+            params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+
+        method = scope["path"].rsplit("/", 1)[-1]
+        match method:
+            case "getMe":
+                result = {
+                    "id": 1,
+                    "is_bot": True,
+                    "first_name": "fake",
+                    "username": "fake_bot",
+                }
+            case "sendMessage":
+                chat_id = int(params["chat_id"])
+                self.replies.append((time.perf_counter(), chat_id, params["text"]))
+                self.reply_event.set()
+                result = {
+                    "message_id": len(self.replies),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "text": params["text"],
+                }
+            case _:
+                result = True
+
+        payload = json.dumps({"ok": True, "result": result}).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send({"type": "http.response.body", "body": payload})
+
+
+def make_update(update_id: int, chat_id: int, seq: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "user"},
+            "text": str(seq),
+        },
+    }
+
+
+async def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(app, port=port, lifespan="off", log_level="warning")
+    )
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+async def run_scenario(
+    name: str, processor: BaseUpdateProcessor, args: argparse.Namespace
+) -> dict:
+    fake = FakeTelegram()
+    fake_server = await serve(fake, args.api_port)
+
+    async def echo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        # stands in for a handler waiting on the school API
+        await asyncio.sleep(args.handler_latency / 1000)
+        await update.message.reply_text(update.message.text)
+
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(f"http://127.0.0.1:{args.api_port}/bot")
+        .concurrent_updates(processor)
+        .build()
+    )
+    application.add_handler(MessageHandler(filters.TEXT, echo))
+
+    async with application:
+        await application.start()
+        webhook_server = await serve(
+            WebhookApp(application, "/telegram", SECRET), args.webhook_port
+        )
+
+        sent_at: dict[tuple[int, str], float] = {}
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.webhook_port}"
+        ) as client:
+            started = time.perf_counter()
+            update_id = 0
+            # interleave chats like real traffic: every chat sends its n-th
+            # message before anyone sends an (n+1)-th
+            for seq in range(args.messages):
+                for chat_id in range(1, args.chats + 1):
+                    update_id += 1
+                    sent_at[(chat_id, str(seq))] = time.perf_counter()
+                    response = await client.post(
+                        "/telegram",
+                        json=make_update(update_id, chat_id, seq),
+                        headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+                    )
+                    response.raise_for_status()
+
+            total = args.chats * args.messages
+            while len(fake.replies) < total:
+                fake.reply_event.clear()
+                await fake.reply_event.wait()
+            elapsed = time.perf_counter() - started
+
+        webhook_server.should_exit = True
+        await application.stop()
+    fake_server.should_exit = True
+    await asyncio.sleep(0.2)
+
+    latencies = [at - sent_at[(chat, text)] for at, chat, text in fake.replies]
+    in_order = all(
+        [int(text) for _, c, text in fake.replies if c == chat]
+        == list(range(args.messages))
+        for chat in range(1, args.chats + 1)
+    )
+    return {
+        "scenario": name,
+        "updates": len(fake.replies),
+        "elapsed_s": round(elapsed, 3),
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "latency_max_ms": round(max(latencies) * 1000, 1),
+        "per_chat_order_kept": in_order,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=5)
+    parser.add_argument("--handler-latency", type=float, default=100, help="ms")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--api-port", type=int, default=18081)
+    parser.add_argument("--webhook-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    results = [
+        await run_scenario("sequential", SimpleUpdateProcessor(1), args),
+        await run_scenario("per-chat", PerChatUpdateProcessor(args.concurrency), args),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
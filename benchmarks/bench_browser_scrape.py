@@ -0,0 +1,168 @@
+"""Homework table scraping in `tasks_browser`: one `execute_script` for the
+whole table against the per-cell `find_element` calls it replaced.
+
+Runs a real (headless) browser against a generated page that reproduces the
+markup of the homework table, so the selectors in
+`ehh.utils.browser.constants` match it as they match the site. Both scrapers
+must return the same cells; the WebDriver commands each one sends are counted
+along with the time it takes.
+
+usage: PYTHONPATH=src python benchmarks/bench_browser_scrape.py [--rows 50]
+"""
+
+import argparse
+import json
+import math
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from ehh import globalvars, tasks_browser
+from ehh.utils.browser.constants import HOMEWORK_ROW_FIELD_SELECTORS
+from ehh.utils.context.impl.browser_context import BrowserContext
+from ehh.utils.context.impl.console_messenger import ConsoleMessenger
+
+TEACHERS = ["王老师", "李老师", "张老师", "刘老师"]
+STATUSES = ["去完成", "已完成", "补做"]
+
+
+def _row_html(i: int) -> str:
+    # cells in the column order of the site; the selectors address them by
+    # position
+    cells = [
+        "<div><span>2025-09-01 08:00:00</span></div>",
+        "<div><span>2025-09-08 23:59:59</span></div>",
+        f"<div><span>Unit {i % 12 + 1} homework #{i}</span></div>",
+        f"<div>{TEACHERS[i % len(TEACHERS)]}</div>",
+        f"<div><span>{'不限' if i % 5 == 0 else 60}</span></div>",
+        f"<div><span><span>{i % 100}</span><span>100</span></span></div>",
+        f"<div><span>{'是' if i % 100 >= 60 else '否'}</span></div>",
+        "<div></div>",
+        f"<div>{'good job' if i % 7 == 0 else ''}</div>",
+        "<div></div>",
+        f"<div><span><button><span>{STATUSES[i % len(STATUSES)]}</span></button></span></div>",
+        "<div><div><button>查看</button><button>原卷</button></div></div>",
+    ]
+    return (
+        '<tr class="el-table__row">'
+        + "".join(f"<td>{cell}</td>" for cell in cells)
+        + "</tr>"
+    )
+
+
+def write_fixture(path: Path, rows: int) -> None:
+    path.write_text(
+        '<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>'
+        "<table><tbody>"
+        + "".join(_row_html(i) for i in range(rows))
+        + "</tbody></table></body></html>",
+        "utf-8",
+    )
+
+
+def create_driver(browser: str):
+    match browser:
+        case "chrome":
+            from selenium.webdriver import Chrome, ChromeOptions
+
+            options = ChromeOptions()
+            options.add_argument("--headless=new")
+            return Chrome(options=options)
+        case "firefox":
+            from selenium.webdriver import Firefox, FirefoxOptions
+
+            options = FirefoxOptions()
+            options.add_argument("-headless")
+            return Firefox(options=options)
+        case "edge":
+            from selenium.webdriver import Edge, EdgeOptions
+
+            options = EdgeOptions()
+            options.add_argument("--headless=new")
+            return Edge(options=options)
+    raise ValueError(f"unsupported browser: {browser}")
+
+
+def count_commands(driver) -> list[int]:
+    # every WebDriver round-trip goes through `execute`
+    counter = [0]
+    execute = driver.execute
+
+    def counted(*args, **kwargs):
+        counter[0] += 1
+        return execute(*args, **kwargs)
+
+    driver.execute = counted
+    return counter
+
+
+def _summary(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[math.ceil(len(samples) * 0.95) - 1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+def bench(scrape, repeat: int, counter: list[int]) -> tuple[dict, list]:
+    samples = []
+    counter[0] = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = scrape()
+        samples.append(time.perf_counter() - started)
+    return {**_summary(samples), "commands": counter[0] // repeat}, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--browser", choices=["chrome", "firefox", "edge"])
+    parser.add_argument("--rows", type=int, default=50, help="rows in the table")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    browser = args.browser or "firefox"
+
+    globalvars.context = BrowserContext(messenger=ConsoleMessenger())
+    driver = create_driver(browser)
+    try:
+        globalvars.context.init_driver(driver)
+        with tempfile.TemporaryDirectory() as tmp:
+            fixture = Path(tmp) / "table.html"
+            write_fixture(fixture, args.rows)
+            driver.get(fixture.as_uri())
+
+            counter = count_commands(driver)
+            per_cell, per_cell_rows = bench(
+                tasks_browser._scrape_hw_rows_per_cell, args.repeat, counter
+            )
+            script, script_rows = bench(
+                tasks_browser._scrape_hw_rows, args.repeat, counter
+            )
+    finally:
+        driver.quit()
+
+    assert len(script_rows) == args.rows, "script scraped the wrong number of rows"
+    assert script_rows == per_cell_rows, "scrapers disagree on the table contents"
+
+    print(
+        json.dumps(
+            {
+                "browser": browser,
+                "rows": args.rows,
+                "fields": len(HOMEWORK_ROW_FIELD_SELECTORS),
+                "per_cell": per_cell,
+                "script": script,
+                "speedup": round(per_cell["p50_ms"] / script["p50_ms"], 1),
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
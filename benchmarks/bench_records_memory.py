@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# compares the memory footprint of slotted HomeworkRecords against the
+# previous __dict__-backed layout
+# usage: PYTHONPATH=src python benchmarks/bench_records_memory.py [count]
+
+import json
+import sys
+import tracemalloc
+from dataclasses import fields, make_dataclass
+
+from ehh.models.homework_record import HomeworkRecord
+
+TEACHERS = ["王老师", "李老师", "张老师", "刘老师"]
+
+# same fields, no slots: what HomeworkRecord looked like before
+DictHomeworkRecord = make_dataclass(
+    "DictHomeworkRecord",
+    [(f.name, f.type, f) for f in fields(HomeworkRecord)],
+)
+
+
+def _make_item(i: int) -> dict:
+    return {
+        "id": f"ut{i:08d}",
+        "taskId": f"t{i:08d}",
+        "taskPaperId": f"p{i:08d}",
+        "batchId": f"b{i:08d}",
+        "taskTitle": f"Unit {i % 12 + 1} homework #{i}",
+        "assignerName": TEACHERS[i % len(TEACHERS)],
+        "startTime": "2025-09-01 08:00:00",
+        "completeTime": None,
+        "beginTime": "2025-09-01 08:00:00",
+        "endTime": "2025-09-08 23:59:59",
+        "score": float(i % 100),
+        "totalScore": 100.0,
+        "status": [0, 1, 4][i % 3],
+    }
+
+
+def _measure(build, items: list[dict]) -> tuple[int, list]:
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    records = [build(item) for item in items]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return after - before, records
+
+
+def _build_dict_record(item: dict):
+    record = HomeworkRecord.from_api(item)
+    values = {f.name: getattr(record, f.name) for f in fields(HomeworkRecord)}
+    values["teacher_name"] = item["assignerName"]
+    return DictHomeworkRecord(**values)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    # round-trip through json so repeated strings are distinct objects, like
+    # they are in a real `userTaskPage` response
+    items = json.loads(json.dumps([_make_item(i) for i in range(count)]))
+
+    dict_bytes, _ = _measure(_build_dict_record, items)
+    slot_bytes, _ = _measure(HomeworkRecord.from_api, items)
+
+    print(f"records:           {count}")
+    print(
+        f"__dict__ records:  {dict_bytes / 1024:.1f} KiB ({dict_bytes / count:.1f} B/record)"
+    )
+    print(
+        f"slotted records:   {slot_bytes / 1024:.1f} KiB ({slot_bytes / count:.1f} B/record)"
+    )
+    print(
+        f"saved:             {(dict_bytes - slot_bytes) / 1024:.1f} KiB ({(dict_bytes - slot_bytes) / count:.1f} B/record, {(1 - slot_bytes / dict_bytes) * 100:.1f}%)"
+    )
+
+
+if __name__ == "__main__":
+    main()
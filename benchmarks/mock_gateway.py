@@ -0,0 +1,379 @@
+"""Local stand-in for the jeedu gateway.
+
+Implements every endpoint in `ehh.utils.api.constants` on top of synthetic
+data generated from a seed, so benchmarks (and manual runs of the clients,
+with `BASE_URL` pointed at it) need neither an account nor the network.
+Each request can be delayed by a fixed latency plus random jitter.
+
+Run it on its own with:
+    PYTHONPATH=src python benchmarks/mock_gateway.py --homeworks 500 --latency 50
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import random
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
+import uvicorn
+
+from ehh.utils.api.constants import (
+    FIND_SCHOOLS_URL,
+    GET_HW_DETAILS_URL,
+    GET_HW_LIST_URL,
+    GET_HW_PAPER_URL,
+    GET_TOKEN_URL,
+    LOAD_ANSWERS_CACHE_URL,
+    SAVE_ANSWERS_CACHE_URL,
+    START_HW_URL,
+    SUBMIT_ANSWERS_URL,
+)
+
+MEDIA_PATH = "/media/"
+SCHOOLS = ["第一中学", "第二中学", "实验中学", "外国语学校"]
+TEACHERS = ["王老师", "李老师", "张老师", "刘老师"]
+WORDS = (
+    "the student teacher school library weekend holiday museum river city "
+    "science history music sport friend family morning evening travel book "
+    "computer garden market festival journey question answer problem idea"
+).split()
+
+
+class MockGateway:
+    """ASGI app answering like the gateway, for `homeworks` homework items of
+    `questions` questions each.
+
+    Papers are generated on first request and kept; every other paper has a
+    listening part whose audio (`audio_kb` of zeros) is served by the gateway
+    itself. Login accepts any username and password.
+    """
+
+    def __init__(
+        self,
+        homeworks: int = 200,
+        questions: int = 40,
+        audio_kb: int = 256,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        seed: int = 0,
+    ) -> None:
+        self.homeworks = homeworks
+        self.questions = questions
+        self.audio_kb = audio_kb
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.seed = seed
+        self.requests: dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._tokens: set[str] = set()
+        self._answers_cache: dict[str, list[dict]] = {}
+        self._started: set[str] = set()
+        self._submitted: set[str] = set()
+        self._routes = {
+            FIND_SCHOOLS_URL: self._find_schools,
+            GET_TOKEN_URL: self._get_token,
+            GET_HW_LIST_URL: self._get_hw_list,
+            GET_HW_DETAILS_URL: self._get_hw_details,
+            GET_HW_PAPER_URL: self._get_hw_paper,
+            LOAD_ANSWERS_CACHE_URL: self._load_answers_cache,
+            SAVE_ANSWERS_CACHE_URL: self._save_answers_cache,
+            SUBMIT_ANSWERS_URL: self._submit_answers,
+            START_HW_URL: self._start_hw,
+        }
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+
+        path = scope["path"]
+        self.requests[path] = self.requests.get(path, 0) + 1
+        delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        if path.startswith(MEDIA_PATH):
+            await self._send(send, 200, b"\0" * (self.audio_kb * 1024), b"audio/mpeg")
+            return
+
+        handler = self._routes.get(path)
+        if handler is None:
+            await self._send_json(send, 404, {"success": False, "msg": "not found"})
+            return
+        if handler not in (self._find_schools, self._get_token):
+            headers = dict(scope["headers"])
+            authorization = headers.get(b"authorization", b"").decode()
+            if authorization.removeprefix("Bearer ") not in self._tokens:
+                await self._send_json(
+                    send, 401, {"success": False, "msg": "unauthorized"}
+                )
+                return
+
+        params = {k: v[0] for k, v in parse_qs(scope["query_string"].decode()).items()}
+        payload = json.loads(body) if body else {}
+        base_url = self._base_url(scope)
+        status, data = handler(payload, params, base_url)
+        await self._send_json(send, status, data)
+
+    @staticmethod
+    def _base_url(scope) -> str:
+        host = dict(scope["headers"]).get(b"host", b"127.0.0.1").decode()
+        return f"{scope.get('scheme', 'http')}://{host}"
+
+    @staticmethod
+    async def _send(send, status: int, body: bytes, content_type: bytes) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", content_type),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send, status: int, data: dict) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await self._send(send, status, body, b"application/json")
+
+    @staticmethod
+    def _ok(data) -> tuple[int, dict]:
+        return 200, {"success": True, "code": 200, "msg": "success", "data": data}
+
+    @staticmethod
+    def _fail(message: str) -> tuple[int, dict]:
+        return 200, {"success": False, "code": 500, "msg": message}
+
+    # anonymous endpoints
+
+    def _find_schools(self, payload: dict, params: dict, base_url: str):
+        name = payload.get("name", "")
+        return self._ok(
+            [
+                {"id": 1000 + i, "name": school}
+                for i, school in enumerate(SCHOOLS)
+                if name in school
+            ]
+        )
+
+    def _get_token(self, payload: dict, params: dict, base_url: str):
+        username, _, school_id = params.get("username", "").partition("|")
+        if not username or not school_id or not params.get("password"):
+            return self._fail("bad credentials")
+
+        access_token = uuid.uuid4().hex
+        self._tokens.add(access_token)
+        return 200, {
+            "success": True,
+            "access_token": access_token,
+            "token_type": "bearer",
+            "refresh_token": uuid.uuid4().hex,
+            "expires_in": 43199,
+            "scope": "server",
+            "jti": uuid.uuid4().hex,
+            "userInfo": {
+                "id": f"u-{username}",
+                "username": username,
+                "name": f"学生 {username}",
+                "type": "1",
+            },
+        }
+
+    # homework list and papers
+
+    def _item(self, i: int) -> dict:
+        status = [0, 1, 4][i % 3]
+        return {
+            "id": f"ut{i:08d}",
+            "taskId": f"t{i:08d}",
+            "taskPaperId": f"p{i:08d}",
+            "batchId": f"b{i:08d}",
+            "taskTitle": f"Unit {i % 12 + 1} homework #{i}",
+            "assignerName": TEACHERS[i % len(TEACHERS)],
+            "startTime": "2025-09-01 08:00:00",
+            "completeTime": "2025-09-02 20:00:00" if status == 4 else None,
+            "beginTime": f"2025-09-{i % 28 + 1:02d} 08:00:00",
+            "endTime": f"2025-10-{i % 28 + 1:02d} 23:59:59",
+            "score": float(i % 100) if status == 4 else None,
+            "totalScore": 100.0,
+            "status": status,
+        }
+
+    def _get_hw_list(self, payload: dict, params: dict, base_url: str):
+        page_index = int(payload.get("pageIndex", 1))
+        page_size = int(payload.get("pageSize", 10))
+        start = (page_index - 1) * page_size
+        items = [
+            self._item(i) for i in range(start, min(start + page_size, self.homeworks))
+        ]
+        page_count = (self.homeworks + page_size - 1) // page_size
+        return self._ok(
+            {
+                "pageIndex": page_index,
+                "pageSize": page_size,
+                "pageCount": page_count,
+                "total": self.homeworks,
+                "userTasks": items,
+            }
+        )
+
+    @staticmethod
+    def _index_of(api_id: str) -> int:
+        return int(api_id.lstrip("utpb") or -1)
+
+    @functools.lru_cache(maxsize=None)
+    def _paper(self, i: int, base_url: str) -> dict:
+        rng = random.Random(self.seed * 1_000_003 + i)
+
+        def sentence(words: int) -> str:
+            return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+        html = ['<div class="nav"><span>上一题</span><span>下一题</span></div>']
+        flows = []
+        listening = i % 2 == 0
+        if listening:
+            html.append("<h3>I. 听力 Listen and choose the best answer.</h3>")
+            html.append(f'<audio src="{base_url}{MEDIA_PATH}{i}.mp3"></audio>')
+        for q in range(1, self.questions + 1):
+            if q == 1 or q % 10 == 1:
+                html.append(f"<h3>Part {q // 10 + 1}. Read and answer.</h3>")
+                html.append(f"<p>{' '.join(sentence(12) for _ in range(6))}</p>")
+            choice = q % 3 != 0
+            if choice:
+                options = "".join(
+                    f"<li>{letter}. {sentence(3)}</li>" for letter in "ABCD"
+                )
+                html.append(f"<p>{q}. {sentence(8)}</p><ul>{options}</ul>")
+                answer = rng.choice("ABCD")
+            else:
+                html.append(f"<p>{q}. {sentence(8)} ________</p>")
+                answer = rng.choice(WORDS)
+            flows.append(
+                {
+                    "id": f"f{i:08d}-{q}",
+                    "sort": q,
+                    "tagId": f"{'radio' if choice else 'text'}{q}",
+                    "answer": answer,
+                    "score": 2,
+                }
+            )
+        html.append('<div class="footer"><button>提交</button> 1/1</div>')
+        return {
+            "id": f"p{i:08d}",
+            "name": f"Unit {i % 12 + 1} paper",
+            "content": "\n".join(html),
+            "flows": flows,
+        }
+
+    def _get_hw_paper(self, payload: dict, params: dict, base_url: str):
+        i = self._index_of(payload.get("id", ""))
+        if not 0 <= i < self.homeworks:
+            return self._fail("paper not found")
+        return self._ok(self._paper(i, base_url))
+
+    def _get_hw_details(self, payload: dict, params: dict, base_url: str):
+        i = self._index_of(payload.get("id", ""))
+        if not 0 <= i < self.homeworks:
+            return self._fail("task not found")
+        flows = self._paper(i, base_url)["flows"]
+        return self._ok(
+            {
+                "id": payload["id"],
+                "subResults": [
+                    {"tagId": flow["tagId"], "standardAnswer": flow["answer"]}
+                    for flow in flows
+                ],
+            }
+        )
+
+    # answers
+
+    def _load_answers_cache(self, payload: dict, params: dict, base_url: str):
+        return self._ok(self._answers_cache.get(payload.get("id", ""), []))
+
+    def _save_answers_cache(self, payload: dict, params: dict, base_url: str):
+        self._answers_cache[payload["id"]] = payload.get("answers", [])
+        return self._ok(None)
+
+    def _submit_answers(self, payload: dict, params: dict, base_url: str):
+        self._submitted.add(payload["id"])
+        return self._ok(None)
+
+    def _start_hw(self, payload: dict, params: dict, base_url: str):
+        self._started.add(payload["id"])
+        return self._ok(None)
+
+
+class GatewayServer:
+    """Serves an app with uvicorn in a daemon thread, for synchronous
+    clients such as `tasks_api`."""
+
+    def __init__(self, app, port: int = 0) -> None:
+        self.server = uvicorn.Server(
+            uvicorn.Config(
+                app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"
+            )
+        )
+        self._thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        port = self.server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self._thread.join()
+
+
+def add_gateway_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--homeworks", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=40)
+    parser.add_argument("--audio-kb", type=int, default=256)
+    parser.add_argument("--latency", type=float, default=20, help="ms per request")
+    parser.add_argument("--jitter", type=float, default=10, help="ms, uniform")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def gateway_from_args(args: argparse.Namespace) -> MockGateway:
+    return MockGateway(
+        homeworks=args.homeworks,
+        questions=args.questions,
+        audio_kb=args.audio_kb,
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_gateway_arguments(parser)
+    parser.add_argument("--port", type=int, default=18090)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        gateway_from_args(args),
+        host="127.0.0.1",
+        port=args.port,
+        lifespan="off",
+        log_level="info",
+    )
+
+
+if __name__ == "__main__":
+    main()
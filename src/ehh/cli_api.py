@@ -10,9 +10,12 @@ import httpx
 from prompt_toolkit import PromptSession
 from prompt_toolkit.shortcuts import choice
 from prompt_toolkit.shortcuts import CompleteStyle
+from munch import Munch
 from rich import traceback
 
 from .models.homework_record import HomeworkRecord
+from .models.homework_index import HomeworkIndex
+from .models.homework_query import HomeworkQuery
 from .models.ai_client import AIClient
 from .models.credentials import Credentials
 from .models.api.token import Token
@@ -26,10 +29,13 @@ from .utils.logging import (
 from .utils.convert import try_parse_int
 from .utils.crypto import encodeb64_safe
 from .utils.prompt import ReplCompleter, prompt_for_yn
-from .utils.config import load_config, save_config, migrate_config_if_needed
+from .utils.ai.clients import warm_ai_clients
+from .utils.http_cassette import apply_http_config, create_http_client
+from .utils.config import config_service, save_config, migrate_config_if_needed
 from .utils.context.impl.api_context import APIContext
 from .utils.context.impl.console_messenger import ConsoleMessenger
 from .utils.fs import CACHE_DIR
+from .utils.ai.ensemble import load_ensemble
 from .tasks_api import *
 from . import globalvars
 
@@ -47,12 +53,18 @@ def main():
     traceback.install()
     print("<info> rich traceback installed")
     migrate_config_if_needed()
-    globalvars.context.config = load_config()
+    globalvars.context.config = config_service.load()
     print("<info> loaded config file")
+    globalvars.context.http_client = create_http_client(
+        globalvars.context.config, base_url=BASE_URL
+    )
+    warm_ai_clients(globalvars.context.config)
+    print("<info> connecting to AI endpoints in the background")
     patch_whisper_transcribe_progress()
     print("<info> patched whisper.transcribe to use rich console")
 
     hw_list: list[HomeworkRecord] = []
+    hw_index: Optional[HomeworkIndex] = None
     session: PromptSession = PromptSession()
     ai_client: Optional[AIClient] = None
     token: Optional[Token] = None
@@ -69,6 +81,21 @@ def main():
                 f"<warning> default AI client index {sel_index} out of range; falling back to no AI client"
             )
 
+    def _on_config_reload(old: Munch, new: Munch) -> None:
+        nonlocal ai_client
+        globalvars.context.config = new
+        apply_http_config(globalvars.context, old, new, base_url=BASE_URL)
+        warm_ai_clients(new)
+        sel_index = new.ai_client.selected
+        if isinstance(sel_index, int) and 0 <= sel_index < len(new.ai_client.all):
+            ai_client = AIClient.from_dict(new.ai_client.all[sel_index])
+        else:
+            ai_client = None
+
+    # the watcher only queues reloads; they are applied here, between commands
+    config_service.subscribe(_on_config_reload, deferred=True)
+    config_service.watch()
+
     if globalvars.context.config.credentials.selected is not None:
         sel_index = globalvars.context.config.credentials.selected
         if 0 <= sel_index < len(globalvars.context.config.credentials.all):
@@ -108,6 +135,7 @@ def main():
             .strip()
             .lower()
         )
+        config_service.apply_pending()
         input_parts = shlex.split(user_input)
         if len(input_parts) <= 0:
             continue
@@ -119,10 +147,12 @@ def main():
                     print("  audio - download/transcribe audio of a homework item")
                     print("  text - display/download text content of a homework item")
                     print(
-                        "  answers - fill in/download (from paper)/generate/submit answers for a homework item"
+                        "  answers - fill in/download (from paper)/generate/submit answers for a homework item; generate takes --no-cache/--ensemble"
                     )
                     print("  help - show this help message")
-                    print("  list - list all homework items")
+                    print(
+                        "  list - list homework items; filters: status= due_before= due_after= teacher= score_min= score_max= title= sort= limit="
+                    )
                     print("  account - login/logout/select default account")
                     print("  ai - select AI client & model")
                     print("  config - reload/save configuration")
@@ -133,13 +163,26 @@ def main():
                         print("<error> not logged in; cannot retrieve homework list")
                         continue
 
-                    _hw_list = get_hw_list(token)
-                    if _hw_list is None:
+                    try:
+                        query = HomeworkQuery.parse(input_parts[1:])
+                    except ValueError as e:
+                        print(f"<error> invalid filter: {e}")
+                        continue
+
+                    # a bare `list` refetches; filtered ones run on the cached list
+                    if len(input_parts) == 1:
+                        hw_index = None
+                    elif hw_index is None or hw_index.records is not hw_list:
+                        hw_index = HomeworkIndex(hw_list) if hw_list else None
+
+                    result = query_hw_list(token, query, hw_index)
+                    if result is None:
                         print("<error> failed to retrieve homework list")
                         continue
 
-                    hw_list = _hw_list
-                    print_hw_list(hw_list)
+                    hw_index, positions = result
+                    hw_list = hw_index.records
+                    print_hw_list(hw_list, positions)
 
                 case "audio":
                     if len(input_parts) < 3:
@@ -320,8 +363,26 @@ def main():
                             else:
                                 has_audio_manual = None
 
+                            ensemble = None
+                            if "--ensemble" in input_parts[3:]:
+                                try:
+                                    ensemble = load_ensemble(globalvars.context.config)
+                                except ValueError as e:
+                                    print(f"<error> invalid ai_ensemble config: {e}")
+                                    continue
+                                if not ensemble:
+                                    print(
+                                        "<error> no ensemble members configured under ai_ensemble"
+                                    )
+                                    continue
+
                             answers = generate_answers(
-                                token, hw_list[index], ai_client, has_audio_manual
+                                token,
+                                hw_list[index],
+                                ai_client,
+                                has_audio_manual,
+                                use_cache="--no-cache" not in input_parts[3:],
+                                ensemble=ensemble,
                             )
                             if answers is None:
                                 print("<error> failed to generate answers")
@@ -527,19 +588,21 @@ def main():
 
                     match input_parts[1]:
                         case "reload":
-                            globalvars.context.config = load_config()
-                            print("<info> reloaded config file")
-                            print("<info> note: current states are not changed")
+                            if config_service.reload(force=True):
+                                config_service.apply_pending()
+                                print("<info> reloaded config file and applied it")
                         case "save":
-                            save_config(globalvars.context.config)
-                            print("<info> saved config to file")
+                            if save_config(globalvars.context.config):
+                                print("<info> saved config to file")
+                            else:
+                                print("<info> config file is up to date")
                         case _:
                             print("<error> argument invalid")
 
                 case "exit":
                     print("<info> exiting...")
-                    save_config(globalvars.context.config)
-                    print("<info> saved config to file")
+                    if save_config(globalvars.context.config):
+                        print("<info> saved config to file")
                     break
 
                 case _:
@@ -8,6 +8,7 @@ import atexit
 from pathlib import Path
 from typing import Optional
 
+from munch import Munch
 from rich import traceback
 from prompt_toolkit.shortcuts import choice
 from prompt_toolkit import PromptSession
@@ -20,16 +21,24 @@ from .utils.logging import print, print_and_copy_path, patch_whisper_transcribe_
 from .utils.convert import try_parse_int
 from .utils.crypto import encodeb64_safe
 from .utils.prompt import ReplCompleter
-from .utils.config import load_config, save_config, migrate_config_if_needed
-from .utils.context.impl.browser_context import BrowserContext
+from .utils.ai.clients import warm_ai_clients
+from .utils.webdriver import create_driver
+from .utils.browser.pool import create_driver_pool
+from .utils.config import config_service, save_config, migrate_config_if_needed
+from .utils.api.constants import BASE_URL
+from .utils.http_cassette import apply_http_config, create_http_client
+from .utils.context.impl.hybrid_context import HybridContext
 from .utils.context.impl.console_messenger import ConsoleMessenger
 from .utils.fs import CACHE_DIR
+from .utils.ai.ensemble import load_ensemble
 from .tasks_browser import *
 from . import globalvars
 
 
 def _at_exit():
     global driver
+    if globalvars.context.driver_pool is not None:
+        globalvars.context.driver_pool.close()
     if globalvars.context.driver is not None:
         try:
             globalvars.context.driver.current_url
@@ -41,7 +50,7 @@ def _at_exit():
 
 
 def main():
-    globalvars.context = BrowserContext(messenger=ConsoleMessenger())
+    globalvars.context = HybridContext(messenger=ConsoleMessenger())
 
     print("--- english homework helper ---")
     print("--- by: ujhhgtg ---")
@@ -53,60 +62,28 @@ def main():
     atexit.register(_at_exit)
     print("<info> registered atexit handler")
     migrate_config_if_needed()
-    globalvars.context.config = load_config()
+    globalvars.context.config = config_service.load()
     print("<info> loaded config file")
+    # for hybrid mode; the browser does not use it
+    globalvars.context.http_client = create_http_client(
+        globalvars.context.config, base_url=BASE_URL
+    )
+    warm_ai_clients(globalvars.context.config)
+    print("<info> connecting to AI endpoints in the background")
     patch_whisper_transcribe_progress()
     print("<info> patched whisper.transcribe to use rich console")
 
-    match globalvars.context.config.browser.type:
-        case "chrome":
-            from selenium.webdriver.chrome.options import (
-                Options as WebDriverOptions,
-            )
-            from selenium.webdriver.chrome.webdriver import (
-                WebDriver,
-            )
-
-        case "firefox":
-            from selenium.webdriver.firefox.options import (
-                Options as WebDriverOptions,
-            )
-            from selenium.webdriver.firefox.webdriver import (
-                WebDriver,
-            )
-        case "edge":
-            from selenium.webdriver.edge.options import (
-                Options as WebDriverOptions,
-            )
-            from selenium.webdriver.edge.webdriver import (
-                WebDriver,
-            )
-        case "safari":
-            from selenium.webdriver.safari.options import (
-                Options as WebDriverOptions,
-            )
-            from selenium.webdriver.safari.webdriver import (
-                WebDriver,
-            )
-        case _:
-            print(
-                f"<error> unsupported browser type: {globalvars.context.config.browser.type}; aborting..."
-            )
-            return
-    driver_options = WebDriverOptions()
-    if globalvars.context.config.browser.type != "safari":
-        driver_options.binary_location = globalvars.context.config.browser.binary_path  # type: ignore
-    else:
-        if globalvars.context.config.browser.binary_path != "":
-            print(
-                "<warning> safari browser binary path is ignored; using system default"
-            )
-    if globalvars.context.config.browser.headless:
-        driver_options.add_argument("--headless")
-    globalvars.context.init_driver(WebDriver(options=driver_options))  # type: ignore
+    driver = create_driver(globalvars.context.config.browser)
+    if driver is None:
+        print("<error> could not start browser; aborting...")
+        return
+    globalvars.context.init_driver(driver)
     print(
         f"<info> started browser {globalvars.context.config.browser.type}{" in headless mode" if globalvars.context.config.browser.headless else ""}"
     )
+    globalvars.context.driver_pool = create_driver_pool(
+        globalvars.context.config.browser
+    )
 
     ai_client: Optional[AIClient] = None
     if globalvars.context.config.ai_client.selected is not None:
@@ -121,6 +98,23 @@ def main():
                 f"<warning> default AI client index {sel_index} out of range; falling back to no AI client"
             )
 
+    def _on_config_reload(old: Munch, new: Munch) -> None:
+        nonlocal ai_client
+        globalvars.context.config = new
+        apply_http_config(globalvars.context, old, new, base_url=BASE_URL)
+        warm_ai_clients(new)
+        sel_index = new.ai_client.selected
+        if isinstance(sel_index, int) and 0 <= sel_index < len(new.ai_client.all):
+            ai_client = AIClient.from_dict(new.ai_client.all[sel_index])
+        else:
+            ai_client = None
+        if old.browser != new.browser:
+            print("<info> browser settings take effect after a restart")
+
+    # the watcher only queues reloads; they are applied here, between commands
+    config_service.subscribe(_on_config_reload, deferred=True)
+    config_service.watch()
+
     hw_list: list[HomeworkRecord] = []
     session: PromptSession = PromptSession()
 
@@ -134,7 +128,6 @@ def main():
             print(
                 f"<info> using default credentials at index {sel_index}: {cred.describe()}"
             )
-            goto_hw_list_page()
             hw_list = get_hw_list()
             print_hw_list(hw_list)
         else:
@@ -156,6 +149,7 @@ def main():
             .strip()
             .lower()
         )
+        config_service.apply_pending()
         input_parts = shlex.split(user_input)
         if len(input_parts) <= 0:
             continue
@@ -164,10 +158,14 @@ def main():
             match input_parts[0]:
                 case "help":
                     print("available commands:")
-                    print("  audio - download/transcribe audio of a homework item")
-                    print("  text - display/download text content of a homework item")
                     print(
-                        "  answers - fill in/download/generate answers for a homework item"
+                        "  audio - download/transcribe audio of a homework item; download takes several indices"
+                    )
+                    print(
+                        "  text - display/download text content of a homework item; download takes several indices"
+                    )
+                    print(
+                        "  answers - fill in/download/generate answers for a homework item; generate takes --no-cache/--ensemble"
                     )
                     print("  help - show this help message")
                     print("  list - list all homework items")
@@ -187,18 +185,20 @@ def main():
                     if len(input_parts) < 3:
                         print("<error> argument not enough")
                         continue
-                    index = try_parse_int(input_parts[2])
-                    if index is None:
+                    # download takes several indices
+                    indices = [try_parse_int(part) for part in input_parts[2:]]
+                    if None in indices:
                         print("<error> argument invalid")
                         continue
-
-                    if index < 0 or index >= len(hw_list):
-                        print(f"<error> index out of range: {index}")
+                    out_of_range = [i for i in indices if not 0 <= i < len(hw_list)]  # type: ignore
+                    if out_of_range:
+                        print(f"<error> index out of range: {out_of_range[0]}")
                         continue
+                    index: int = indices[0]  # type: ignore
 
                     match input_parts[1]:
                         case "download":
-                            download_audio(index, hw_list[index])
+                            download_audios([(i, hw_list[i]) for i in indices])  # type: ignore
                         case "transcribe":
                             audio_file = (
                                 CACHE_DIR
@@ -217,19 +217,22 @@ def main():
                     if len(input_parts) < 3:
                         print("<error> argument not enough")
                         continue
-                    index = try_parse_int(input_parts[2])
-                    if index is None:
+                    # download takes several indices
+                    indices = [try_parse_int(part) for part in input_parts[2:]]
+                    if None in indices:
                         print("<error> argument invalid")
                         continue
-                    if index < 0 or index >= len(hw_list):
-                        print(f"<error> index out of range: {index}")
+                    out_of_range = [i for i in indices if not 0 <= i < len(hw_list)]  # type: ignore
+                    if out_of_range:
+                        print(f"<error> index out of range: {out_of_range[0]}")
                         continue
+                    index: int = indices[0]  # type: ignore
 
                     match input_parts[1]:
                         case "display":
                             print(get_text(index, hw_list[index]))
                         case "download":
-                            download_text(index, hw_list[index])
+                            download_texts([(i, hw_list[i]) for i in indices])  # type: ignore
                         case _:
                             print("<error> argument invalid")
 
@@ -274,7 +277,25 @@ def main():
                             if ai_client is None:
                                 print("<error> no ai client selected")
                                 continue
-                            answers = generate_answers(index, hw_list[index], ai_client)
+                            ensemble = None
+                            if "--ensemble" in input_parts[3:]:
+                                try:
+                                    ensemble = load_ensemble(globalvars.context.config)
+                                except ValueError as e:
+                                    print(f"<error> invalid ai_ensemble config: {e}")
+                                    continue
+                                if not ensemble:
+                                    print(
+                                        "<error> no ensemble members configured under ai_ensemble"
+                                    )
+                                    continue
+                            answers = generate_answers(
+                                index,
+                                hw_list[index],
+                                ai_client,
+                                use_cache="--no-cache" not in input_parts[3:],
+                                ensemble=ensemble,
+                            )
                             if answers is None:
                                 print("<error> failed to generate answers")
                                 continue
@@ -334,7 +355,6 @@ def main():
                             )
                             logout()
                             login(cred)
-                            goto_hw_list_page()
                             hw_list = get_hw_list()
                             print(
                                 f"<success> logged in with credentials: {cred.describe()}"
@@ -459,22 +479,24 @@ def main():
 
                     match input_parts[1]:
                         case "reload":
-                            globalvars.context.config = load_config()
-                            print("<info> reloaded config file")
-                            print("<info> note: current states are not changed")
+                            if config_service.reload(force=True):
+                                config_service.apply_pending()
+                                print("<info> reloaded config file and applied it")
                         case "save":
-                            save_config(globalvars.context.config)
-                            print("<info> saved config to file")
+                            if save_config(globalvars.context.config):
+                                print("<info> saved config to file")
+                            else:
+                                print("<info> config file is up to date")
                         case _:
                             print("<error> argument invalid")
 
                 case "rescue":
-                    goto_hw_list_page()
+                    goto_hw_list_page(force=True)
 
                 case "exit":
                     print("<info> exiting...")
-                    save_config(globalvars.context.config)
-                    print("<info> saved config to file")
+                    if save_config(globalvars.context.config):
+                        print("<info> saved config to file")
                     break
 
                 case _:
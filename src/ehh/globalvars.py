@@ -1,3 +1,36 @@
+import sys
+import types
+from contextvars import ContextVar, Token
+
 from .utils.context.base import Context
 
-context: Context = None  # type: ignore
+_bound_context: ContextVar[Context | None] = ContextVar("ehh_context", default=None)
+
+
+class _GlobalVars(types.ModuleType):
+    # `context` resolves to the context bound to the running task or thread
+    # (see `bind_context`), falling back to the process-wide one
+    @property
+    def context(self) -> Context:
+        bound = _bound_context.get()
+        if bound is not None:
+            return bound
+        return self.__dict__["_default_context"]
+
+    @context.setter
+    def context(self, value: Context) -> None:
+        self.__dict__["_default_context"] = value
+
+
+def bind_context(context: Context) -> Token:
+    return _bound_context.set(context)
+
+
+def unbind_context(token: Token) -> None:
+    _bound_context.reset(token)
+
+
+_default_context: Context = None  # type: ignore
+context: Context
+
+sys.modules[__name__].__class__ = _GlobalVars
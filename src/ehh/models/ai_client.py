@@ -1,6 +1,9 @@
-from openai import OpenAI
+from typing import Optional
+
+from openai import AsyncOpenAI, OpenAI
 from munch import Munch
 
+from ..utils.ai.clients import openai_clients
 from ..utils.convert import mask_string_middle
 
 
@@ -11,27 +14,53 @@ class AIClient:
     api_key: str
     models: list[str]
     selected_model_index: int
-    client: OpenAI
+    stream: bool
+    # prompts larger than this are split; None uses the default budget
+    max_prompt_tokens: Optional[int]
 
     def __init__(
-        self, type: str, api_url: str, api_key: str, models: list[str], sel_model: int
+        self,
+        type: str,
+        api_url: str,
+        api_key: str,
+        models: list[str],
+        sel_model: int,
+        stream: bool = True,
+        max_prompt_tokens: Optional[int] = None,
     ):
         self.type = type
         self.api_url = api_url
         self.api_key = api_key
         self.models = models
         self.selected_model_index = sel_model
-        self.client = OpenAI(api_key=self.api_key, base_url=self.api_url)
+        self.stream = stream
+        self.max_prompt_tokens = max_prompt_tokens
 
     @classmethod
     def from_dict(cls, data: Munch):
         return cls(
-            data.type, data.api_url, data.api_key, data.model.all, data.model.selected
+            data.type,
+            data.api_url,
+            data.api_key,
+            data.model.all,
+            data.model.selected,
+            data.get("stream", True),
+            data.get("max_prompt_tokens", None),
         )
 
     def describe(self) -> str:
         return f"{self.type}: {self.api_url} / {mask_string_middle(self.api_key)} / {self.models}"
 
+    # the OpenAI clients are shared by every AIClient of the same endpoint
+
+    @property
+    def client(self) -> OpenAI:
+        return openai_clients.get(self.api_url, self.api_key)
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        return openai_clients.get_async(self.api_url, self.api_key)
+
     @property
     def selected_model(self) -> str:
         return self.models[self.selected_model_index]
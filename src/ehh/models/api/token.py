@@ -1,9 +1,10 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
+from .school_info import SchoolInfo
 from .user_info import UserInfo
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Token:
     access_token: str
     token_type: str
@@ -12,3 +13,18 @@ class Token:
     scope: str
     jti: str
     user_info: UserInfo
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        user_info = data["user_info"]
+        return cls(
+            **{
+                **data,
+                "user_info": UserInfo(
+                    **{**user_info, "school": SchoolInfo(**user_info["school"])}
+                ),
+            }
+        )
+
+    def to_dict(self) -> dict:
+        return asdict(self)
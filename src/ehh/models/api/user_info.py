@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from .school_info import SchoolInfo
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UserInfo:
     id: str
     username: str
@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+class BrowserPage(Enum):
+    UNKNOWN = "unknown"
+    HW_LIST = "hw_list"
+    HW_ORIGINAL = "hw_original"
+    HW_COMPLETED = "hw_completed"
+
+
+@dataclass(slots=True)
+class NavigationState:
+    """Where the browser is, so navigation only does what the current page
+    requires instead of reloading the homework list every time."""
+
+    page: BrowserPage = BrowserPage.UNKNOWN
+    # (row index, title) of the homework whose page is open
+    record_key: tuple[int, str] | None = None
+    # page of the homework table; row indices refer to the first one
+    list_page: int = 1
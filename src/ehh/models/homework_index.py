@@ -0,0 +1,138 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator
+
+from .homework_record import HomeworkRecord
+from .homework_status import HomeworkStatus
+
+PENDING_STATUSES: frozenset[HomeworkStatus] = frozenset(
+    {
+        HomeworkStatus.NOT_COMPLETED,
+        HomeworkStatus.IN_PROGRESS,
+        HomeworkStatus.MAKE_UP,
+    }
+)
+
+
+class _DueIndex:
+    """Positions of records sorted by due time, searchable with bisect."""
+
+    __slots__ = ("keys", "positions")
+
+    def __init__(self) -> None:
+        self.keys: list[datetime] = []
+        self.positions: list[int] = []
+
+    def between(self, start: datetime | None, end: datetime | None) -> list[int]:
+        lo = 0 if start is None else bisect_left(self.keys, start)
+        hi = len(self.keys) if end is None else bisect_right(self.keys, end)
+        return self.positions[lo:hi]
+
+
+class HomeworkIndex:
+    """Read-only view over a homework list with prebuilt lookup tables.
+
+    Positions returned by queries are indices into the original list, so they
+    can be passed straight to commands that take a homework index. `complete`
+    is false when the list was cut short on the server side (e.g. a limit
+    pushed down to `userTaskPage`) and must be refetched before filtering.
+    """
+
+    def __init__(
+        self, records: Iterable[HomeworkRecord] = (), complete: bool = True
+    ) -> None:
+        self.records: list[HomeworkRecord] = list(records)
+        self.complete = complete
+        self._by_status: dict[HomeworkStatus | None, list[int]] = {}
+        self._by_teacher: dict[str, list[int]] = {}
+        self._by_due = _DueIndex()
+        self._by_status_due: dict[HomeworkStatus | None, _DueIndex] = {}
+        self._no_due: list[int] = []
+        self._build()
+
+    def _build(self) -> None:
+        dated: list[tuple[datetime, int]] = []
+        for position, record in enumerate(self.records):
+            self._by_status.setdefault(record.status, []).append(position)
+            self._by_teacher.setdefault(record.teacher_name, []).append(position)
+            if record.due_time is None:
+                self._no_due.append(position)
+            else:
+                dated.append((record.due_time, position))
+
+        dated.sort()
+        for due_time, position in dated:
+            self._by_due.keys.append(due_time)
+            self._by_due.positions.append(position)
+            status_due = self._by_status_due.setdefault(
+                self.records[position].status, _DueIndex()
+            )
+            status_due.keys.append(due_time)
+            status_due.positions.append(position)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[HomeworkRecord]:
+        return iter(self.records)
+
+    def __getitem__(self, position: int) -> HomeworkRecord:
+        return self.records[position]
+
+    @property
+    def teachers(self) -> list[str]:
+        return list(self._by_teacher.keys())
+
+    def with_status(self, *statuses: HomeworkStatus | None) -> list[int]:
+        positions: list[int] = []
+        for status in statuses:
+            positions.extend(self._by_status.get(status, ()))
+        positions.sort()
+        return positions
+
+    def by_teacher(self, teacher_name: str) -> list[int]:
+        return list(self._by_teacher.get(teacher_name, ()))
+
+    def without_due_time(self) -> list[int]:
+        return list(self._no_due)
+
+    def due_between(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        statuses: Iterable[HomeworkStatus | None] | None = None,
+    ) -> list[int]:
+        """Positions due in `[start, end]`, ordered by due time.
+
+        Either bound may be `None` to leave that side open. When `statuses` is
+        given only the per-status due indexes are searched, so the cost stays
+        logarithmic in the list size plus the number of hits.
+        """
+        if statuses is None:
+            return self._by_due.between(start, end)
+
+        hits: list[tuple[datetime, int]] = []
+        for status in statuses:
+            status_due = self._by_status_due.get(status)
+            if status_due is None:
+                continue
+            positions = status_due.between(start, end)
+            hits.extend((self.records[p].due_time, p) for p in positions)  # type: ignore
+        hits.sort()
+        return [position for _, position in hits]
+
+    def pending_due_between(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> list[int]:
+        return self.due_between(start, end, statuses=PENDING_STATUSES)
+
+    def pending_due_this_week(self, now: datetime | None = None) -> list[int]:
+        now = now or datetime.now()
+        week_start = (now - timedelta(days=now.weekday())).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        week_end = week_start + timedelta(days=7) - timedelta(microseconds=1)
+        return self.pending_due_between(now, week_end)
+
+    def select(self, positions: Iterable[int]) -> list[tuple[int, HomeworkRecord]]:
+        return [(position, self.records[position]) for position in positions]
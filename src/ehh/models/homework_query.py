@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from .homework_index import HomeworkIndex, PENDING_STATUSES
+from .homework_record import HomeworkRecord
+from .homework_status import HomeworkStatus
+from ..utils.convert import try_parse_datetime
+
+SORT_KEYS = ["index", "due", "publish", "score", "title", "status"]
+
+_STATUS_ALIASES: dict[str, frozenset[HomeworkStatus]] = {
+    "pending": PENDING_STATUSES,
+    "todo": PENDING_STATUSES,
+    "done": frozenset({HomeworkStatus.COMPLETED}),
+}
+
+
+def _parse_statuses(value: str) -> frozenset[HomeworkStatus]:
+    statuses: set[HomeworkStatus] = set()
+    for name in value.split(","):
+        name = name.strip().lower()
+        if name in _STATUS_ALIASES:
+            statuses |= _STATUS_ALIASES[name]
+            continue
+        try:
+            statuses.add(HomeworkStatus[name.upper()])
+        except KeyError:
+            raise ValueError(f"unknown status '{name}'")
+    return frozenset(statuses)
+
+
+def _parse_date(value: str, end_of_day: bool) -> datetime:
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    value = value.strip().lower()
+
+    if value == "now":
+        return datetime.now()
+    if value == "today":
+        day = today
+    elif value == "tomorrow":
+        day = today + timedelta(days=1)
+    elif value == "week":
+        day = today + timedelta(days=6 - today.weekday())
+    elif value[:1] in "+-" and value.endswith("d") and value[1:-1].isdigit():
+        day = today + timedelta(days=int(value[:-1]))
+    else:
+        parsed = try_parse_datetime(value)
+        if parsed is None:
+            raise ValueError(f"invalid date '{value}'")
+        # a bare date means the whole day; a timestamp is taken as-is
+        if len(value) > 10:
+            return parsed
+        day = parsed
+
+    if end_of_day:
+        return day + timedelta(days=1) - timedelta(microseconds=1)
+    return day
+
+
+def _parse_float(key: str, value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"invalid number for '{key}': '{value}'")
+
+
+@dataclass
+class HomeworkQuery:
+    """Filters and ordering for the `list` command.
+
+    Parsed from `key=value` arguments, e.g.
+    `status=pending due_before=week teacher=wang sort=-due limit=10`.
+    """
+
+    statuses: frozenset[HomeworkStatus] | None = None
+    due_before: datetime | None = None
+    due_after: datetime | None = None
+    teacher: str | None = None
+    score_min: float | None = None
+    score_max: float | None = None
+    title: str | None = None
+    sort: str = "index"
+    descending: bool = False
+    limit: int | None = None
+
+    @classmethod
+    def parse(cls, args: list[str]) -> "HomeworkQuery":
+        query = cls()
+        for arg in args:
+            key, sep, value = arg.partition("=")
+            key = key.strip().lower()
+            if not sep or value == "":
+                raise ValueError(f"expected key=value, got '{arg}'")
+
+            match key:
+                case "status":
+                    query.statuses = _parse_statuses(value)
+                case "due_before":
+                    query.due_before = _parse_date(value, end_of_day=True)
+                case "due_after":
+                    query.due_after = _parse_date(value, end_of_day=False)
+                case "teacher":
+                    query.teacher = value.casefold()
+                case "score_min":
+                    query.score_min = _parse_float(key, value)
+                case "score_max":
+                    query.score_max = _parse_float(key, value)
+                case "title":
+                    query.title = value.casefold()
+                case "sort":
+                    query.descending = value.startswith("-")
+                    query.sort = value.lstrip("+-").lower()
+                    if query.sort not in SORT_KEYS:
+                        raise ValueError(
+                            f"unknown sort key '{query.sort}'; supported: {', '.join(SORT_KEYS)}"
+                        )
+                case "limit":
+                    if not value.isdigit():
+                        raise ValueError(f"invalid limit '{value}'")
+                    query.limit = int(value)
+                case _:
+                    raise ValueError(f"unknown filter '{key}'")
+
+        return query
+
+    @property
+    def is_unfiltered(self) -> bool:
+        return (
+            self.statuses is None
+            and self.due_before is None
+            and self.due_after is None
+            and self.teacher is None
+            and self.score_min is None
+            and self.score_max is None
+            and self.title is None
+        )
+
+    @property
+    def server_limit(self) -> int | None:
+        """Number of leading rows that fully answer this query, if any.
+
+        Only an unfiltered query in server order can be cut short while paging
+        through `userTaskPage`; everything else needs the whole list.
+        """
+        if self.is_unfiltered and self.sort == "index" and not self.descending:
+            return self.limit
+        return None
+
+    def is_answerable_by(self, index: HomeworkIndex) -> bool:
+        if index.complete:
+            return True
+        limit = self.server_limit
+        return limit is not None and limit <= len(index)
+
+    def apply(self, index: HomeworkIndex) -> list[int]:
+        candidates: list[int] | None = None
+
+        # start from the narrowest prebuilt index, then filter what is left
+        if self.due_before is not None or self.due_after is not None:
+            candidates = index.due_between(
+                self.due_after, self.due_before, statuses=self.statuses
+            )
+        elif self.statuses is not None:
+            candidates = index.with_status(*self.statuses)
+
+        if self.teacher is not None:
+            teacher_positions: set[int] = set()
+            for teacher in index.teachers:
+                if self.teacher in teacher.casefold():
+                    teacher_positions.update(index.by_teacher(teacher))
+            if candidates is None:
+                candidates = sorted(teacher_positions)
+            else:
+                candidates = [p for p in candidates if p in teacher_positions]
+
+        if candidates is None:
+            candidates = list(range(len(index)))
+
+        if self.score_min is not None or self.score_max is not None:
+            candidates = [p for p in candidates if self._score_matches(index[p])]
+        if self.title is not None:
+            candidates = [
+                p for p in candidates if self.title in index[p].title.casefold()
+            ]
+
+        candidates.sort(key=self._sort_key(index), reverse=self.descending)
+        if self.limit is not None:
+            candidates = candidates[: self.limit]
+        return candidates
+
+    def _score_matches(self, record: HomeworkRecord) -> bool:
+        if record.current_score is None:
+            return False
+        if self.score_min is not None and record.current_score < self.score_min:
+            return False
+        if self.score_max is not None and record.current_score > self.score_max:
+            return False
+        return True
+
+    def _sort_key(self, index: HomeworkIndex):
+        match self.sort:
+            case "due":
+                attr = "due_time"
+            case "publish":
+                attr = "publish_time"
+            case "score":
+                attr = "current_score"
+            case "title":
+                attr = "title"
+            case "status":
+                return lambda p: (str(index[p].status), p)
+            case _:
+                return lambda p: p
+
+        # records without a value sort last regardless of direction
+        def key(p: int):
+            value = getattr(index[p], attr)
+            missing = value is None
+            if self.descending:
+                missing = not missing
+            return (missing, value if value is not None else 0, p)
+
+        return key
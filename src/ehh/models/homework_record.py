@@ -1,12 +1,15 @@
+from sys import intern
+from datetime import datetime
 from dataclasses import dataclass
 
 from .homework_status import HomeworkStatus
+from ..utils.convert import try_parse_datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class HomeworkRecord:
     title: str
-    publish_time: str | None
+    publish_time: datetime | None
     teacher_name: str
     pass_score: float | None
     current_score: float | None
@@ -14,10 +17,37 @@ class HomeworkRecord:
     is_pass: bool | None
     teacher_comment: str | None
     status: HomeworkStatus | None
-    due_time: str | None
+    due_time: datetime | None
     api_id: str | None = None
     api_task_id: str | None = None
     api_task_paper_id: str | None = None
     api_batch_id: str | None = None
-    start_time: str | None = None
-    end_time: str | None = None
+    start_time: datetime | None = None
+    end_time: datetime | None = None
+
+    @classmethod
+    def from_api(cls, item: dict) -> "HomeworkRecord":
+        """Build a record from one entry of the `userTasks` array of `userTaskPage`.
+
+        Timestamps are parsed here once so filtering and sorting never touch
+        the raw strings again. Teacher names repeat across most of the list,
+        so they are interned to share a single string object between records.
+        """
+        return cls(
+            title=item["taskTitle"],
+            publish_time=try_parse_datetime(item["beginTime"]),
+            teacher_name=intern(item["assignerName"] or ""),
+            pass_score=0,  # idk which is pass score
+            current_score=item["score"],
+            total_score=item["totalScore"],
+            is_pass=True,  # idk which is pass condition
+            teacher_comment=None,  # idk which is teacher comment
+            status=HomeworkStatus.from_code(int(item["status"])),
+            due_time=try_parse_datetime(item["endTime"]),
+            api_id=item["id"],
+            api_task_id=item["taskId"],
+            api_task_paper_id=item["taskPaperId"],
+            api_batch_id=item["batchId"],
+            start_time=try_parse_datetime(item["startTime"]),
+            end_time=try_parse_datetime(item["completeTime"]),
+        )
@@ -8,3 +8,20 @@ class HomeworkStatus(Enum):
     NOT_COMPLETED = (0, "去完成")
     MAKE_UP = (None, "补做")
     UNKNOWN = (None, "未知")
+
+    @classmethod
+    def from_code(cls, code: int | None) -> "HomeworkStatus":
+        return _STATUS_BY_CODE.get(code, cls.UNKNOWN)
+
+    @classmethod
+    def from_text(cls, text: str | None) -> "HomeworkStatus | None":
+        return _STATUS_BY_TEXT.get(text)
+
+
+# lookup tables built once so parsing a row is a dict hit instead of a scan
+_STATUS_BY_CODE: dict[int | None, HomeworkStatus] = {
+    member.value[0]: member for member in HomeworkStatus if member.value[0] is not None
+}
+_STATUS_BY_TEXT: dict[str | None, HomeworkStatus] = {
+    member.value[1]: member for member in HomeworkStatus
+}
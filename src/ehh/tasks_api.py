@@ -1,36 +1,33 @@
 import re
 import time
 import random
+from pathlib import Path
 from typing import Optional
 
-import json5
-import openai
 from bs4 import BeautifulSoup
 
 from .utils.api.constants import *
-from .utils.constants import (
-    GENERATE_ANSWERS_PROMPT,
-    GENERATE_ANSWERS_WITH_LISTENING_PROMPT,
-)
 from .utils.logging import print, download_file_with_progress, print_and_copy_path
 from .utils.crypto import get_md5_str_of_str, encodeb64_safe
+from .utils.convert import format_datetime
 from .utils.fs import read_file_text, CACHE_DIR
+from .utils.ai.answers import request_answers
+from .utils.ai.ensemble import request_ensemble_answers
+from .utils.ai.prompts import build_answer_prompts
 from .models.api.school_info import SchoolInfo
 from .models.api.token import Token
 from .models.api.user_info import UserInfo
 from .models.homework_record import HomeworkRecord
 from .models.homework_status import HomeworkStatus
+from .models.homework_index import HomeworkIndex
+from .models.homework_query import HomeworkQuery
 from .models.credentials import Credentials
 from .models.ai_client import AIClient
+from .utils import feature_flags
 from . import globalvars
 
-
-def _get_status_enum(status_int: int) -> HomeworkStatus:
-    for member in HomeworkStatus:
-        if member.value[0] == status_int:
-            return member
-
-    return HomeworkStatus.UNKNOWN
+if feature_flags.WHISPER:
+    from whisper.model import Whisper
 
 
 def _get_school(name: str) -> Optional[SchoolInfo]:
@@ -99,7 +96,9 @@ def _get_headers(token: Token) -> Optional[dict[str, str]]:
     }
 
 
-def get_hw_list(token: Token) -> Optional[list[HomeworkRecord]]:
+def get_hw_list(
+    token: Token, max_records: Optional[int] = None
+) -> Optional[list[HomeworkRecord]]:
     print("--- step: retrieve homework list ---")
 
     if token.token_type != "bearer":
@@ -115,13 +114,18 @@ def get_hw_list(token: Token) -> Optional[list[HomeworkRecord]]:
 
     max_page_index = 0
     cur_page_index = 0
+    page_size = 50 if max_records is None else max(1, min(50, max_records))
     hw_list: list[HomeworkRecord] = []
 
     while cur_page_index <= max_page_index:
+        if max_records is not None and len(hw_list) >= max_records:
+            del hw_list[max_records:]
+            break
+
         response = globalvars.context.http_client.post(
             GET_HW_LIST_URL,
             headers=headers,
-            json={"pageIndex": cur_page_index + 1, "pageSize": 50},
+            json={"pageIndex": cur_page_index + 1, "pageSize": page_size},
         )
         data = response.json()
         if data.get("success", False) is False:
@@ -130,38 +134,28 @@ def get_hw_list(token: Token) -> Optional[list[HomeworkRecord]]:
 
         max_page_index = data["data"]["pageCount"]
 
-        for item in data["data"]["userTasks"]:
-            title = item["taskTitle"]
-            status = _get_status_enum(int(item["status"]))
-            cur_score = item["score"]
-            tot_score = item["totalScore"]
-
-            hw_list.append(
-                HomeworkRecord(
-                    api_id=item["id"],
-                    api_task_id=item["taskId"],
-                    api_task_paper_id=item["taskPaperId"],
-                    api_batch_id=item["batchId"],
-                    title=title,
-                    teacher_name=item["assignerName"],
-                    start_time=item["startTime"],
-                    end_time=item["completeTime"],
-                    publish_time=item["beginTime"],
-                    due_time=item["endTime"],
-                    current_score=cur_score,
-                    pass_score=0,  # idk which is pass score
-                    total_score=tot_score,
-                    is_pass=True,  # idk which is pass condition
-                    teacher_comment=None,  # idk which is teacher comment
-                    status=status,
-                )
-            )
+        hw_list.extend(map(HomeworkRecord.from_api, data["data"]["userTasks"]))
 
         cur_page_index += 1
 
     return hw_list
 
 
+def query_hw_list(
+    token: Token, query: HomeworkQuery, index: Optional[HomeworkIndex] = None
+) -> Optional[tuple[HomeworkIndex, list[int]]]:
+    if index is None or not query.is_answerable_by(index):
+        max_records = query.server_limit
+        hw_list = get_hw_list(token, max_records)
+        if hw_list is None:
+            return None
+        index = HomeworkIndex(
+            hw_list, complete=max_records is None or len(hw_list) < max_records
+        )
+
+    return index, query.apply(index)
+
+
 def _get_hw_details(token: Token, record: HomeworkRecord) -> Optional[dict]:
     headers = _get_headers(token)
     if headers is None:
@@ -390,15 +384,9 @@ def transcribe_audio(record: HomeworkRecord):
         print(
             f"<info> loading Whisper model{" into memory" if globalvars.context.config.whisper.in_memory else ""} (this may take a while)..."
         )
-        whisper_device = None
-        if globalvars.context.config.whisper.device == "cuda":
-            whisper_device = "cuda"
-        elif globalvars.context.config.whisper.device == "cpu":
-            whisper_device = "cpu"
-        elif globalvars.context.config.whisper.device != "auto":
-            print(
-                f"<warning> unrecognized whisper device '{globalvars.context.config.whisper.device}'; falling back to 'auto'..."
-            )
+        whisper_device = resolve_whisper_device(
+            globalvars.context.config.whisper.device
+        )
         globalvars.context.whisper_model = whisper.load_model(
             globalvars.context.config.whisper.model,
             device=whisper_device,
@@ -414,24 +402,61 @@ def transcribe_audio(record: HomeworkRecord):
     )
     end = time.perf_counter()
     print(f"<info> transcription completed in {end - start:.2f} seconds")
-    transcription = result.get("text", None)
-    if transcription is None or (transcription is str and transcription.strip() == ""):
+    save_transcription(record, result.get("text", None))
+
+
+def resolve_whisper_device(device: str) -> Optional[str]:
+    if device in ("cuda", "cpu"):
+        return device
+    if device != "auto":
+        print(
+            f"<warning> unrecognized whisper device '{device}'; falling back to 'auto'..."
+        )
+    return None
+
+
+# models loaded by transcribe_audio_file, kept for the lifetime of the process
+_whisper_models: dict[tuple[str, Optional[str], bool], "Whisper"] = {}
+
+
+def transcribe_audio_file(
+    path: str, model: str, device: Optional[str], in_memory: bool
+) -> str | list[str] | None:
+    """Transcribes `path` without going through `globalvars`.
+
+    Meant to run in a worker process (see `utils.executors.run_in_process`),
+    where the model is loaded once and reused by later calls.
+    """
+    import whisper
+
+    key = (model, device, in_memory)
+    whisper_model = _whisper_models.get(key)
+    if whisper_model is None:
+        whisper_model = whisper.load_model(model, device=device, in_memory=in_memory)
+        _whisper_models[key] = whisper_model
+
+    result = whisper_model.transcribe(path, language="en", verbose=None)
+    return result.get("text", None)
+
+
+def save_transcription(
+    record: HomeworkRecord, transcription: str | list[str] | None
+) -> Optional[Path]:
+    if isinstance(transcription, list):
+        transcription = "\n".join(transcription)
+    if transcription is None or transcription.strip() == "":
         print(f"<error> transcription failed or returned empty result")
-        return
+        return None
 
-    transcription_file = f"{path}.txt"
+    transcription_file = (
+        CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3.txt"
+    )
     with open(transcription_file, "w", encoding="utf-8") as f:
-        if isinstance(transcription, str):
-            f.write(transcription)
-            print(
-                f"<success> transcription saved to '{transcription_file}'; totalling {len(transcription)} chars in length"
-            )
-        if isinstance(transcription, list):
-            trans_str = "\n".join(transcription)
-            f.write(trans_str)
-            print(
-                f"<success> transcription saved to '{transcription_file}'; totallin {len(trans_str)} chars in length"
-            )
+        f.write(transcription)
+    print(
+        f"<success> transcription saved to '{transcription_file}'; totalling {len(transcription)} chars in length"
+    )
+    return transcription_file
 
 
 def generate_answers(
@@ -439,6 +464,8 @@ def generate_answers(
     record: HomeworkRecord,
     client: AIClient,
     has_audio_manual: bool | None,
+    use_cache: bool = True,
+    ensemble: Optional[list[AIClient]] = None,
 ) -> Optional[list[dict]]:
     print(f"--- step: generate answers for '{record.title}' ---")
 
@@ -470,82 +497,24 @@ def generate_answers(
         print("<error> text content does not exist; please download it first")
         return None
 
-    if has_audio:
-        prompt = GENERATE_ANSWERS_WITH_LISTENING_PROMPT.replace(
-            "{transcription}", read_file_text(transcription_file)
-        ).replace("{questions}", read_file_text(text_file))
-    else:
-        prompt = GENERATE_ANSWERS_PROMPT.replace(
-            "{questions}", read_file_text(text_file)
-        )
-
-    print(f"<info> current AI client: {client.describe()}")
-    print("<info> requesting model for a response (this may take a while)...")
-    try:
-        response = client.client.chat.completions.create(
-            model=client.selected_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "You are a professional English teacher.",
-                        }
-                    ],
-                },
-                {"role": "user", "content": [{"type": "text", "text": prompt}]},
-            ],
-        )
-    except openai.APIError as e:
-        print(f"<error> api returned error: {e}")
-        if (
-            e.body is not None
-            and e.body.get("error", None)
-            and e.body["error"].get("message", None)
-        ):
-            if (
-                e.body["error"]["message"]
-                == "User location is not supported for the API use."
-            ):
-                print("<tip> try changing your proxy endpoint to a different location")
-        return None
-
-    raw_data = response.choices[0].message.content
-    if raw_data is None:
-        print("<error> model returned null")
-        return None
+    # the budget has to fit every model that will see the prompt
+    clients = ensemble or [client]
+    prompts = build_answer_prompts(
+        read_file_text(text_file),
+        read_file_text(transcription_file) if has_audio else None,
+        clients[0].selected_model,
+        min(
+            (c.max_prompt_tokens for c in clients if c.max_prompt_tokens), default=None
+        ),
+    )
 
-    try:
-        answers: list[dict] = json5.loads(raw_data)  # type: ignore
-        print(
-            f"<success> model result is valid; totalling {len(raw_data)} chars in length"
+    if ensemble:
+        return request_ensemble_answers(
+            ensemble, prompts, split_alternatives=True, use_cache=use_cache
         )
-
-        print("<info> post-processing model result...")
-        post_process_count = 0
-        for answer in answers:
-            if len(answer["content"]) >= 2:
-                if answer["type"] != "fill-in-blanks":
-                    post_process_count += 1
-                    answer["type"] = "fill-in-blanks"
-                else:
-                    if "/" in answer["content"]:
-                        post_process_count += 1
-                        answer["content"] = answer["content"].split("/")
-            elif "A" <= answer["content"].upper() <= "D":
-                post_process_count += 1
-                answer["type"] = "choice|fill-in-blanks"
-            elif "E" <= answer["content"].upper() <= "Z":
-                post_process_count += 1
-                answer["type"] = "fill-in-blanks"
-
-        print(f"<info> post-processed model result for {post_process_count} times")
-        return answers
-
-    except ValueError:
-        print(f"<error> model result is not valid json")
-        return None
+    return request_answers(
+        client, prompts, split_alternatives=True, use_cache=use_cache
+    )
 
 
 def _create_answers_payload(record: HomeworkRecord, answers: list[dict]) -> dict:
@@ -785,7 +754,12 @@ def start_hw(token: Token, record: HomeworkRecord) -> None:
     print("<success> homework started")
 
 
-def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
+def print_hw_list(
+    hw_list: list[HomeworkRecord], positions: Optional[list[int]] = None
+) -> None:
+    if positions is None:
+        positions = list(range(len(hw_list)))
+
     globalvars.context.messenger.send_table(
         title="Homework List",
         show_header=True,
@@ -793,17 +767,19 @@ def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
             ("Index", "cyan", "right"),
             ("Title", "magenta", "left"),
             ("Status", "yellow"),
+            ("Due", "blue", "center"),
             ("Score", "red", "center"),
         ],
         rows=list(
             map(
-                lambda enum_obj: (
-                    str(enum_obj[0]),
-                    enum_obj[1].title,
-                    f"{enum_obj[1].status} ({enum_obj[1].status.value[1]})",  # type: ignore
-                    f"{enum_obj[1].current_score}/{enum_obj[1].total_score}",
+                lambda i: (
+                    str(i),
+                    hw_list[i].title,
+                    f"{hw_list[i].status} ({hw_list[i].status.value[1]})",  # type: ignore
+                    format_datetime(hw_list[i].due_time),
+                    f"{hw_list[i].current_score}/{hw_list[i].total_score}",
                 ),
-                enumerate(hw_list),
+                positions,
             )
         ),
     )
@@ -1,11 +1,14 @@
+import re
+import json
 import time
+import base64
 from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote
 
-import json5
-import openai
 import whisper
 from selenium.webdriver.common.by import By
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import JavascriptException, TimeoutException
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.keys import Keys
@@ -15,17 +18,22 @@ from .models.homework_status import HomeworkStatus
 from .models.homework_record import HomeworkRecord
 from .models.ai_client import AIClient
 from .models.credentials import Credentials
+from .models.browser_page import BrowserPage, NavigationState
+from .models.api.school_info import SchoolInfo
+from .models.api.token import Token
+from .models.api.user_info import UserInfo
 from .utils.browser.constants import *
-from .utils.constants import (
-    GENERATE_ANSWERS_PROMPT,
-    GENERATE_ANSWERS_WITH_LISTENING_PROMPT,
-)
 from .utils.crypto import encodeb64_safe
 from .utils.fs import read_file_text, CACHE_DIR
-from .utils.convert import mask_string_middle
+from .utils.ai.answers import request_answers
+from .utils.ai.ensemble import request_ensemble_answers
+from .utils.ai.prompts import build_answer_prompts
+from .utils.convert import mask_string_middle, try_parse_datetime, format_datetime
 from .utils.logging import print, download_file_with_progress
 from .utils.webdriver import safe_find_element
-from . import globalvars
+from .utils.context.impl.hybrid_context import HybridContext
+from .utils.browser.pool import BrowserSession, DriverPool
+from . import globalvars, tasks_api
 
 
 def _safe_get_text(element, selector: str):
@@ -39,22 +47,235 @@ def _get_status_enum(status_text: str | None) -> HomeworkStatus | None:
     if not status_text:
         return None
 
-    for member in HomeworkStatus:
-        if member.value[1] == status_text:
-            return member
+    return HomeworkStatus.from_text(status_text)
 
-    return None
+
+# one round-trip for the whole table instead of one per cell
+_SCRAPE_HW_ROWS_SCRIPT = """
+const fields = Object.entries(arguments[1]);
+return Array.from(document.querySelectorAll(arguments[0]), (row) => {
+    const cells = {};
+    for (const [name, selector] of fields) {
+        const cell = row.querySelector(selector);
+        cells[name] = cell ? cell.innerText.trim() : null;
+    }
+    return cells;
+});
+"""
+
+
+def _scrape_hw_rows() -> list[dict[str, str | None]]:
+    """Texts of the cells in `HOMEWORK_ROW_FIELD_SELECTORS` for every row of
+    the homework table, `None` for missing cells."""
+    try:
+        return globalvars.context.driver.execute_script(
+            _SCRAPE_HW_ROWS_SCRIPT,
+            HOMEWORK_TABLE_SELECTOR,
+            HOMEWORK_ROW_FIELD_SELECTORS,
+        )
+    except JavascriptException as e:
+        print(f"<warning> failed to scrape table with script: {e.msg}; falling back")
+        return _scrape_hw_rows_per_cell()
+
+
+def _scrape_hw_rows_per_cell() -> list[dict[str, str | None]]:
+    # one webdriver call per cell; slow on long tables
+    return [
+        {
+            name: _safe_get_text(row, selector)
+            for name, selector in HOMEWORK_ROW_FIELD_SELECTORS.items()
+        }
+        for row in globalvars.context.driver.find_elements(
+            By.CSS_SELECTOR, HOMEWORK_TABLE_SELECTOR
+        )
+    ]
+
+
+def _parse_score(text: str | None) -> float | None:
+    if not text:
+        return None
+    if text == "不限":
+        return 0.0
+    return float(text)
+
+
+def _parse_hw_row(cells: dict[str, str | None]) -> HomeworkRecord:
+    if cells["title"] is None:
+        raise ValueError("homework row has no title")
+
+    pass_score = _parse_score(cells["pass_score"])
+    current_score = _parse_score(cells["current_score"])
+    # is_pass = cells["is_pass"]
+    if pass_score is not None and current_score is not None:
+        is_pass = current_score >= pass_score
+    else:
+        is_pass = None
+
+    return HomeworkRecord(
+        title=cells["title"],
+        publish_time=try_parse_datetime(cells["start_time"]),
+        due_time=try_parse_datetime(cells["end_time"]),
+        teacher_name=cells["teacher"] or "",
+        pass_score=pass_score,
+        current_score=current_score,
+        total_score=_parse_score(cells["total_score"]),  # type: ignore
+        is_pass=is_pass,
+        teacher_comment=cells["teacher_words"],
+        status=_get_status_enum(cells["status"]),
+    )
+
+
+def _get_navigation() -> NavigationState:
+    # kept on the context, so each browser tracks its own page
+    navigation = getattr(globalvars.context, "navigation", None)
+    if navigation is None:
+        navigation = NavigationState()
+        globalvars.context.navigation = navigation  # type: ignore
+    return navigation
+
+
+def _reset_navigation() -> None:
+    # after anything that may have left the browser on an unexpected page
+    _get_navigation().page = BrowserPage.UNKNOWN
+
+
+def _is_hybrid() -> bool:
+    return isinstance(globalvars.context, HybridContext) and getattr(
+        globalvars.context.config.browser, "hybrid", False
+    )
+
+
+def _get_api_token(record: HomeworkRecord | None = None) -> Optional[Token]:
+    """The lifted api token, if the task can go through the api instead of the
+    browser; records scraped from the page lack the ids the api needs."""
+    if not _is_hybrid():
+        return None
+    if record is not None and record.api_task_paper_id is None:
+        return None
+    return globalvars.context.token  # type: ignore
+
+
+def _get_driver_pool() -> Optional[DriverPool]:
+    return getattr(globalvars.context, "driver_pool", None)
+
+
+def _run_batch(func, items: list[tuple[int, HomeworkRecord]]) -> None:
+    pool = _get_driver_pool()
+    # the api path is quick and needs no pooled browser
+    if (
+        pool is None
+        or len(items) <= 1
+        or all(_get_api_token(record) is not None for _, record in items)
+    ):
+        for item in items:
+            func(*item)
+        return
+
+    print(f"<info> running {len(items)} tasks on up to {pool.size} pooled browsers")
+    pool.map(func, items)
+
+
+def _count_open_dialogs() -> int:
+    return globalvars.context.driver.execute_script(
+        _COUNT_OPEN_DIALOGS_SCRIPT, DIALOG_WRAPPER_SELECTOR
+    )
+
+
+_COUNT_OPEN_DIALOGS_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0]))
+    .filter((wrapper) => wrapper.style.display !== "none").length;
+"""
+
+# clicks the close button of every open dialog, innermost first, falling back
+# to escape (which element-ui dialogs also close on)
+_CLOSE_DIALOGS_SCRIPT = """
+const open = Array.from(document.querySelectorAll(arguments[0]))
+    .filter((wrapper) => wrapper.style.display !== "none");
+for (const wrapper of open.reverse()) {
+    const button = wrapper.querySelector(arguments[1]);
+    if (button) {
+        button.click();
+    } else {
+        document.dispatchEvent(
+            new KeyboardEvent("keydown", { key: "Escape", keyCode: 27, bubbles: true })
+        );
+    }
+}
+return open.length;
+"""
+
+# resolves to the toast text if the site refused to open the homework, or
+# "dialog" once its page is open
+_OPEN_RESULT_SCRIPT = """
+const toast = document.querySelector(arguments[0]);
+if (toast) {
+    return toast.innerText || "(empty toast)";
+}
+const open = Array.from(document.querySelectorAll(arguments[1]))
+    .some((wrapper) => wrapper.style.display !== "none");
+return open ? "dialog" : null;
+"""
+
+
+def _close_dialogs() -> bool:
+    driver = globalvars.context.driver
+    if not driver.execute_script(
+        _CLOSE_DIALOGS_SCRIPT, DIALOG_WRAPPER_SELECTOR, DIALOG_CLOSE_BUTTON_SELECTOR
+    ):
+        return True
+    try:
+        WebDriverWait(driver, DIALOG_CLOSE_TIMEOUT).until(
+            lambda _: _count_open_dialogs() == 0
+        )
+    except TimeoutException:
+        return False
+    return True
 
 
-def goto_hw_list_page():
-    globalvars.context.driver.get(URL_HOMEWORK_LIST)
+def goto_hw_list_page(force: bool = False) -> None:
+    """Shows the first page of the homework list.
+
+    Open homework dialogs are closed in place; the list is only reloaded when
+    the browser is somewhere else (or its state is unknown), or with `force`.
+    """
+    navigation = _get_navigation()
+    driver = globalvars.context.driver
+    if (
+        not force
+        and navigation.page != BrowserPage.UNKNOWN
+        and navigation.list_page == 1
+        and driver.current_url == URL_HOMEWORK_LIST
+    ):
+        if navigation.page == BrowserPage.HW_LIST:
+            return
+        if _close_dialogs():
+            navigation.page = BrowserPage.HW_LIST
+            navigation.record_key = None
+            print("<info> closed hw page; back on homework list")
+            return
+
+    driver.get(URL_HOMEWORK_LIST)
     globalvars.context.wait.until(
         EC.presence_of_element_located((By.CSS_SELECTOR, HOMEWORK_TABLE_SELECTOR))
     )
+    navigation.page = BrowserPage.HW_LIST
+    navigation.record_key = None
+    navigation.list_page = 1
     print(f"<info> navigated to: {URL_HOMEWORK_LIST}")
 
 
 def goto_hw_original_page(index: int, record: HomeworkRecord) -> bool:
+    """Opens the original page (dialog) of the homework at row `index`, or
+    keeps it if it is already open, so several operations share one open."""
+    navigation = _get_navigation()
+    if (
+        navigation.page == BrowserPage.HW_ORIGINAL
+        and navigation.record_key == (index, record.title)
+        and _count_open_dialogs() > 0
+    ):
+        print("<info> hw original page already open")
+        return True
+
     row_selector_nth = f"{HOMEWORK_TABLE_SELECTOR}:nth-child({index + 1})"
     if (
         record.status == HomeworkStatus.NOT_COMPLETED
@@ -68,20 +289,27 @@ def goto_hw_original_page(index: int, record: HomeworkRecord) -> bool:
         print(f"<error> unsupported homework status: {record.status}")
         return False
 
+    goto_hw_list_page()
     globalvars.context.driver.find_element(By.CSS_SELECTOR, button_selector).click()
 
-    toast_wait = WebDriverWait(globalvars.context.driver, 1.5)
+    # wait for whichever comes first instead of always waiting out the toast
     try:
-        toast_elem = toast_wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, TOAST_SELECTOR))
+        result = globalvars.context.wait.until(
+            lambda driver: driver.execute_script(
+                _OPEN_RESULT_SCRIPT, TOAST_SELECTOR, DIALOG_WRAPPER_SELECTOR
+            )
         )
-        toast_text = toast_elem.text
-        print(f"<error> website sends toast message: {toast_text}")
+    except TimeoutException:
+        print("<error> hw original page did not open")
+        _reset_navigation()
         return False
 
-    except TimeoutException:
-        ...
+    if result != "dialog":
+        print(f"<error> website sends toast message: {result}")
+        return False
 
+    navigation.page = BrowserPage.HW_ORIGINAL
+    navigation.record_key = (index, record.title)
     print("<info> opened hw original page")
     return True
 
@@ -90,10 +318,24 @@ def goto_hw_completed_page(index: int, record: HomeworkRecord):
     if record.status != HomeworkStatus.COMPLETED:
         raise ValueError("homework status invalid: homework is not completed")
 
+    navigation = _get_navigation()
+    if (
+        navigation.page == BrowserPage.HW_COMPLETED
+        and navigation.record_key == (index, record.title)
+        and globalvars.context.driver.find_elements(
+            By.CSS_SELECTOR, ANSWER_ROWS_SELECTOR
+        )
+    ):
+        print("<info> hw completed page already open")
+        return
+
+    goto_hw_list_page()
     row_selector_nth = f"{HOMEWORK_TABLE_SELECTOR}:nth-child({index + 1})"
     globalvars.context.driver.find_element(
         By.CSS_SELECTOR, f"{row_selector_nth} > {VIEW_COMPLETED_BUTTON_SELECTOR}"
     ).click()
+    # from here on the browser may be on another page if anything fails
+    _reset_navigation()
     globalvars.context.wait.until(
         EC.element_to_be_clickable(
             (By.CSS_SELECTOR, DIALOG_VIEW_COMPLETED_BUTTON_SELECTOR)
@@ -102,11 +344,19 @@ def goto_hw_completed_page(index: int, record: HomeworkRecord):
     globalvars.context.wait.until(
         EC.presence_of_element_located((By.CSS_SELECTOR, ANSWER_ROWS_SELECTOR))
     )
+    navigation.page = BrowserPage.HW_COMPLETED
+    navigation.record_key = (index, record.title)
     print("<info> opened hw completed page")
 
 
 def logout() -> None:
     print("--- step: logout ---")
+    _reset_navigation()
+    if isinstance(globalvars.context, HybridContext):
+        globalvars.context.token = None
+    pool = _get_driver_pool()
+    if pool is not None:
+        pool.clear_session()
 
     account_dropdown = safe_find_element(
         globalvars.context.driver, By.CSS_SELECTOR, ACCOUNT_DROPDOWN_SELECTOR
@@ -129,10 +379,18 @@ def logout() -> None:
 
 
 def get_hw_list() -> list[HomeworkRecord]:
+    token = _get_api_token()
+    if token is not None:
+        hw_list = tasks_api.get_hw_list(token)
+        # the api reports failures as an empty list; check with the page
+        if hw_list:
+            return hw_list
+
     print("--- step: retrieve homework list ---")
     homework_records: list[HomeworkRecord] = []
 
     try:
+        goto_hw_list_page()
         cur_page = 1
 
         while True:
@@ -141,66 +399,19 @@ def get_hw_list() -> list[HomeworkRecord]:
                     (By.CSS_SELECTOR, HOMEWORK_TABLE_SELECTOR)
                 )
             )
-            homework_rows = globalvars.context.driver.find_elements(
-                By.CSS_SELECTOR, HOMEWORK_TABLE_SELECTOR
-            )
+            rows = _scrape_hw_rows()
 
-            if not homework_rows:
+            if not rows:
                 print(
                     f"<warning> no homework items found using selector: {HOMEWORK_TABLE_SELECTOR}"
                 )
                 break
 
             print(
-                f"<info> found {len(homework_rows)} homework items to parse in page {cur_page}"
+                f"<info> found {len(rows)} homework items to parse in page {cur_page}"
             )
 
-            for i, row in enumerate(homework_rows):
-                title = row.find_element(By.CSS_SELECTOR, TITLE_SELECTOR).text
-                publish_time = _safe_get_text(row, START_TIME_SELECTOR)
-                due_time = _safe_get_text(row, END_TIME_SELECTOR)
-                teacher_name = _safe_get_text(row, TEACHER_SELECTOR)
-                _pass_score = _safe_get_text(row, PASS_SCORE_SELECTOR)
-                if _pass_score:
-                    if _pass_score == "不限":
-                        pass_score = 0.0
-                    else:
-                        pass_score = float(_pass_score)
-                else:
-                    pass_score = None
-                _current_score = _safe_get_text(row, CURRENT_SCORE_SELECTOR)
-                if _current_score:
-                    current_score = float(_current_score)
-                else:
-                    current_score = None
-                _total_score = _safe_get_text(row, TOTAL_SCORE_SELECTOR)
-                if _total_score:
-                    total_score = float(_total_score)
-                else:
-                    total_score = None
-                # is_pass = _safe_get_text(row, IS_PASS_SELECTOR)
-                if _pass_score is not None and _current_score is not None:
-                    is_pass = current_score >= pass_score  # type: ignore
-                else:
-                    is_pass = None
-                teacher_words = _safe_get_text(row, TEACHER_WORDS_SELECTOR)
-                status_text = _safe_get_text(row, STATUS_SELECTOR)
-                status_enum = _get_status_enum(status_text)
-
-                record = HomeworkRecord(
-                    title=title,
-                    publish_time=publish_time,
-                    due_time=due_time,
-                    teacher_name=teacher_name or "",
-                    pass_score=pass_score,  # type: ignore
-                    current_score=current_score,  # type: ignore
-                    total_score=total_score,  # type: ignore
-                    is_pass=is_pass,
-                    teacher_comment=teacher_words,
-                    status=status_enum,
-                )
-
-                homework_records.append(record)
+            homework_records.extend(_parse_hw_row(cells) for cells in rows)
 
             next_page_button = globalvars.context.driver.find_element(
                 By.CSS_SELECTOR, NEXT_PAGE_BUTTON_SELECTOR
@@ -208,22 +419,25 @@ def get_hw_list() -> list[HomeworkRecord]:
             if not next_page_button.get_attribute("disabled"):
                 next_page_button.click()
                 cur_page += 1
+                _get_navigation().list_page = cur_page
             else:
                 break
 
-        goto_hw_list_page()
-
         return homework_records
 
     except Exception as e:
         print(
             f"<error> critical error during homework table parsing: {e}; returning empty list"
         )
-        goto_hw_list_page()
+        _reset_navigation()
         return []
 
 
 def download_audio(index: int, record: HomeworkRecord):
+    token = _get_api_token(record)
+    if token is not None:
+        return tasks_api.download_audio(token, record)
+
     print(f"--- step: download audio of index {index}: '{record.title}' ---")
 
     try:
@@ -243,13 +457,11 @@ def download_audio(index: int, record: HomeworkRecord):
         )
         if not audio_element:
             print(f"<error> audio element not found")
-            goto_hw_list_page()
             return
         audio_url = audio_element.get_attribute("src")
 
         if not audio_url:
             print("<error> audio source url not found on the task page")
-            goto_hw_list_page()
             return
 
         filename = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
@@ -262,10 +474,9 @@ def download_audio(index: int, record: HomeworkRecord):
         except Exception as download_e:
             print(f"<error> failed to download audio: {download_e}")
 
-        goto_hw_list_page()
-
     except Exception as e:
         print(f"<error> critical error during audio download: {e}")
+        _reset_navigation()
 
 
 def transcribe_audio(index: int, record: HomeworkRecord):
@@ -351,6 +562,10 @@ def transcribe_audio(index: int, record: HomeworkRecord):
 
 
 def get_text(index: int, record: HomeworkRecord) -> str | None:
+    token = _get_api_token(record)
+    if token is not None:
+        return tasks_api.get_text(token, record)
+
     print(f"--- step: retreive text content of index {index} ---")
 
     if not goto_hw_original_page(index, record):
@@ -366,7 +581,6 @@ def get_text(index: int, record: HomeworkRecord) -> str | None:
         f"<success> extracted text content for '{record.title}'; totaling {len(text_content)} chars in length"
     )
 
-    goto_hw_list_page()
     return text_content
 
 
@@ -384,6 +598,18 @@ def download_text(index: int, record: HomeworkRecord):
     print_and_copy_path(text_file)
 
 
+def download_texts(items: list[tuple[int, HomeworkRecord]]) -> None:
+    """`download_text` for every (index, record), in parallel on the browser
+    pool if there is one."""
+    _run_batch(download_text, items)
+
+
+def download_audios(items: list[tuple[int, HomeworkRecord]]) -> None:
+    """`download_audio` for every (index, record), in parallel on the browser
+    pool if there is one."""
+    _run_batch(download_audio, items)
+
+
 def fill_in_answers(index: int, record: HomeworkRecord, answers: dict) -> None:
     print(f"--- step: fill in answers for index {index} ---")
 
@@ -397,100 +623,153 @@ def fill_in_answers(index: int, record: HomeworkRecord, answers: dict) -> None:
         print("<error> failed to navigate to hw original page; aborting...")
         return
 
-    quiz_container_id = "taskContent"
-
-    interactive_elements_xpath = (
-        f"//div[@id='{quiz_container_id}']//input[@type='radio' or @type='text']"
-    )
-
-    all_inputs = globalvars.context.driver.find_elements(
-        By.XPATH, interactive_elements_xpath
-    )
-
-    questions = {}
-
-    for element in all_inputs:
-        input_type = element.get_attribute("type")
-        q_id = element.get_attribute("name")
-
-        if input_type == "radio":
-            if q_id and q_id not in questions:
-                questions[q_id] = {"type": "radio", "name": q_id}
-
-        elif input_type == "text":
-            if q_id and q_id not in questions:
-                questions[q_id] = {"type": "text", "element": element}
-
-    ordered_q_ids = list(questions.keys())
+    # the paper renders after the dialog opens; wait for its inputs rather
+    # than for a fixed time
+    try:
+        questions: list[dict] = globalvars.context.wait.until(
+            lambda driver: driver.execute_script(
+                _LIST_QUESTIONS_SCRIPT, QUIZ_CONTAINER_ID
+            )
+        )
+    except TimeoutException:
+        print("<error> no questions found on the hw page; aborting...")
+        return
 
-    print(f"<info> found {len(ordered_q_ids)} questions to answer")
+    print(f"<info> found {len(questions)} questions to answer")
 
-    if len(answers) < len(ordered_q_ids):
+    if len(answers) < len(questions):
         print(
-            f"<warning> only {len(answers)} answers provided for {len(ordered_q_ids)} questions"
+            f"<warning> only {len(answers)} answers provided for {len(questions)} questions"
         )
-        ordered_q_ids = ordered_q_ids[: len(answers)]
-
-    for q_num, (q_id, answer) in enumerate(zip(ordered_q_ids, answers), 1):
-
-        question_info = questions[q_id]
-
-        try:
-            time.sleep(0.5)
-            answer_types = answer["type"].split("|")
-
-            if question_info["type"] == "radio":
-                if "choice" not in answer_types:
-                    print(
-                        f"<error> question type and answer type mismatch for question {q_id}; aborting..."
-                    )
-                    return
+        questions = questions[: len(answers)]
+
+    # checked up front, so the answers before a mismatch still go in at once
+    fills = []
+    mismatch = None
+    for question, answer in zip(questions, answers):
+        answer_types = answer["type"].split("|")
+        if (question["type"] == "radio" and "choice" not in answer_types) or (
+            question["type"] == "text" and "fill-in-blanks" not in answer_types
+        ):
+            mismatch = question["name"]
+            break
+        content = answer["content"]
+        if isinstance(content, list):
+            content = content[0]
+        fills.append({**question, "value": content})
 
-                answer_letter = answer["content"]
-
-                xpath = (
-                    f"//div[@id='{quiz_container_id}']"
-                    f"//input[@type='radio' and @name='{q_id}' and @value='{answer_letter}']"
-                )
-
-                globalvars.context.wait.until(
-                    EC.element_to_be_clickable((By.XPATH, xpath))
-                ).click()
-                print(
-                    f"<success> question {q_num} (choice): selected option {answer_letter}"
-                )
-
-            elif question_info["type"] == "text":
-                if "fill-in-blanks" not in answer_types:
-                    print(
-                        f"<error> question type and answer type mismatch for question {q_id}; aborting..."
-                    )
-                    return
-
-                answer_text = answer["content"]
-
-                text_input_element = question_info["element"]
-
-                text_input_element.clear()
-                text_input_element.send_keys(answer_text)
-
-                print(
-                    f"<success> question {q_num} (fill-in-blanks): filled text '{answer_text}'"
-                )
+    try:
+        errors = globalvars.context.driver.execute_script(
+            _FILL_ANSWERS_SCRIPT, QUIZ_CONTAINER_ID, fills
+        )
+    except JavascriptException as e:
+        print(f"<warning> failed to fill in answers with script: {e.msg}; falling back")
+        errors = [_fill_in_answer(fill) for fill in fills]
 
-        except Exception as e:
+    for q_num, (fill, error) in enumerate(zip(fills, errors), 1):
+        if error is not None:
             print(
-                f"<error> could not set answer '{answer}' for question {q_num} ({question_info['type']}): {e}"
+                f"<error> could not set answer '{fill['value']}' for question {q_num} ({fill['type']}): {error}"
             )
+        elif fill["type"] == "radio":
+            print(
+                f"<success> question {q_num} (choice): selected option {fill['value']}"
+            )
+        else:
+            print(
+                f"<success> question {q_num} (fill-in-blanks): filled text '{fill['value']}'"
+            )
+
+    if mismatch is not None:
+        print(
+            f"<error> question type and answer type mismatch for question {mismatch}; aborting..."
+        )
+        return
 
     print("<info> all answers filled in; please review and submit manually")
 
 
+# questions of the paper in order, one entry per radio group or text input
+_LIST_QUESTIONS_SCRIPT = """
+const container = document.getElementById(arguments[0]);
+if (!container) {
+    return null;
+}
+const questions = [];
+const seen = new Set();
+for (const input of container.querySelectorAll("input[type=radio], input[type=text]")) {
+    if (input.name && !seen.has(input.name)) {
+        seen.add(input.name);
+        questions.push({ name: input.name, type: input.type });
+    }
+}
+return questions.length ? questions : null;
+"""
+
+# fills in every answer and reports, per answer, null or what went wrong;
+# text goes through the native setter plus input events, which is what the
+# page's bindings listen to
+_FILL_ANSWERS_SCRIPT = """
+const container = document.getElementById(arguments[0]);
+const setValue = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, "value").set;
+return arguments[1].map(({ name, type, value }) => {
+    const selector = `input[type=${type}][name="${CSS.escape(name)}"]`
+        + (type === "radio" ? `[value="${CSS.escape(String(value))}"]` : "");
+    const input = container.querySelector(selector);
+    if (!input) {
+        return type === "radio" ? `no option ${value}` : "input not found";
+    }
+    if (input.disabled) {
+        return "input is disabled";
+    }
+    if (type === "radio") {
+        if (!input.checked) {
+            input.click();
+        }
+        return input.checked ? null : "option did not get selected";
+    }
+    input.focus();
+    setValue.call(input, String(value));
+    input.dispatchEvent(new Event("input", { bubbles: true }));
+    input.dispatchEvent(new Event("change", { bubbles: true }));
+    input.blur();
+    return input.value === String(value) ? null : "text did not stick";
+});
+"""
+
+
+def _fill_in_answer(fill: dict) -> str | None:
+    # one answer through webdriver, for pages the script cannot handle
+    selector = f"#{QUIZ_CONTAINER_ID} input[type={fill['type']}][name='{fill['name']}']"
+    if fill["type"] == "radio":
+        selector += f"[value='{fill['value']}']"
+    try:
+        element = globalvars.context.wait.until(
+            EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
+        )
+        if fill["type"] == "radio":
+            element.click()
+        else:
+            element.clear()
+            element.send_keys(fill["value"])
+    except Exception as e:
+        return str(e)
+    return None
+
+
 def get_answers(index: int, record: HomeworkRecord) -> list[dict]:
+    token = _get_api_token(record)
+    if token is not None and record.status == HomeworkStatus.COMPLETED:
+        answers = tasks_api.get_answers(token, record) or []
+        # alternatives as the completed page shows them, for `fill_in_answers`
+        for answer in answers:
+            if isinstance(answer["content"], list):
+                answer["content"] = "/".join(answer["content"])
+        return answers
+
     print(f"--- step: retrieve answers for index {index}: '{record.title}'")
 
     if record.status != HomeworkStatus.COMPLETED:
-        goto_hw_list_page()
         print("<error> homework item is not completed; returning empty list")
         return []
 
@@ -500,7 +779,6 @@ def get_answers(index: int, record: HomeworkRecord) -> list[dict]:
         By.CSS_SELECTOR, ANSWER_ROWS_SELECTOR
     )
     if len(elements) <= 0:
-        goto_hw_list_page()
         print("<warning> no answers are found; returning empty list")
         return []
 
@@ -528,12 +806,15 @@ def get_answers(index: int, record: HomeworkRecord) -> list[dict]:
             {"index": index + 1, "type": answer_type, "content": answer_text}
         )
 
-    goto_hw_list_page()
     return answers_list
 
 
 def generate_answers(
-    index: int, record: HomeworkRecord, client: AIClient
+    index: int,
+    record: HomeworkRecord,
+    client: AIClient,
+    use_cache: bool = True,
+    ensemble: list[AIClient] | None = None,
 ) -> list[dict] | None:
     print(f"--- step: generate answers for index {index}: '{record.title}' ---")
 
@@ -568,75 +849,29 @@ def generate_answers(
         print("<error> text content does not exist; please download it first")
         return None
 
-    if has_audio:
-        prompt = GENERATE_ANSWERS_WITH_LISTENING_PROMPT.replace(
-            "{transcription}", read_file_text(transcription_file)
-        ).replace("{questions}", read_file_text(text_file))
-    else:
-        prompt = GENERATE_ANSWERS_PROMPT.replace(
-            "{questions}", read_file_text(text_file)
-        )
-
-    print(f"<info> current AI client: {client.describe()}")
-    print("<info> requesting model for a response (this may take a while)...")
-    try:
-        response = client.client.chat.completions.create(
-            model=client.selected_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "You are a professional English teacher.",
-                        }
-                    ],
-                },
-                {"role": "user", "content": [{"type": "text", "text": prompt}]},
-            ],
-        )
-    except openai.APIError as e:
-        print(f"<error> api returned error: {e}")
-        goto_hw_list_page()
-        return None
-
-    raw_data = response.choices[0].message.content
-    if raw_data is None:
-        print("<error> model returned null")
-        goto_hw_list_page()
-        return None
-    goto_hw_list_page()
+    # the budget has to fit every model that will see the prompt
+    clients = ensemble or [client]
+    prompts = build_answer_prompts(
+        read_file_text(text_file),
+        read_file_text(transcription_file) if has_audio else None,
+        clients[0].selected_model,
+        min(
+            (c.max_prompt_tokens for c in clients if c.max_prompt_tokens), default=None
+        ),
+    )
 
-    try:
-        answers: list[dict] = json5.loads(raw_data)  # type: ignore
-        print(
-            f"<success> model result is valid; totalling {len(raw_data)} chars in length"
+    if ensemble:
+        return request_ensemble_answers(
+            ensemble, prompts, split_alternatives=False, use_cache=use_cache
         )
-
-        print("<info> post-processing model result...")
-        post_process_count = 0
-        for answer in answers:
-            if len(answer["content"]) >= 2:
-                if answer["type"] != "fill-in-blanks":
-                    post_process_count += 1
-                    answer["type"] = "fill-in-blanks"
-            elif "A" <= answer["content"].upper() <= "D":
-                post_process_count += 1
-                answer["type"] = "choice|fill-in-blanks"
-            elif "E" <= answer["content"].upper() <= "Z":
-                post_process_count += 1
-                answer["type"] = "fill-in-blanks"
-
-        print(f"<info> post-processed model result for {post_process_count} times")
-        return answers
-
-    except ValueError:
-        print(f"<error> model result is not valid json")
-        return None
+    return request_answers(
+        client, prompts, split_alternatives=False, use_cache=use_cache
+    )
 
 
 def login(credentials: Credentials):
     print("--- step: login ---")
+    _reset_navigation()
     globalvars.context.driver.get(URL_LOGIN)
     print(f"<info> navigated to: {URL_LOGIN}")
     globalvars.context.wait.until(
@@ -690,8 +925,110 @@ def login(credentials: Credentials):
     )  # close "set security questions" dialog
     print("<success> logged in")
 
+    pool = _get_driver_pool()
+    if pool is not None:
+        pool.sync_session(globalvars.context.driver)
+    if _is_hybrid():
+        globalvars.context.token = lift_token(credentials)  # type: ignore
+        if globalvars.context.token is None:  # type: ignore
+            print("<warning> could not lift api token; using the browser for all tasks")
+        else:
+            print(
+                "<info> lifted api token; using the api where the browser is not needed"
+            )
+
+
+JWT_PATTERN = re.compile(r"[\w-]+\.[\w-]+\.[\w-]+")
+
+
+def _find_oauth_response(value) -> Optional[dict]:
+    # the token response as the site stored it, possibly wrapped in other state
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    if isinstance(value, dict):
+        if isinstance(value.get("access_token"), str):
+            return value
+        value = list(value.values())
+    if isinstance(value, list):
+        for item in value:
+            found = _find_oauth_response(item)
+            if found is not None:
+                return found
+    return None
+
+
+def _decode_jwt_claims(access_token: str) -> dict:
+    try:
+        payload = access_token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return {}
+
+
+def lift_token(credentials: Credentials) -> Optional[Token]:
+    """Builds an api `Token` from what the logged in page keeps in its storage
+    and cookies: the oauth token response if it is stored whole, otherwise the
+    access token, with the rest filled in from its claims."""
+    session = BrowserSession.read(globalvars.context.driver)
+    entries = dict(session.storage)
+    entries.update({c["name"]: unquote(c["value"]) for c in session.cookies})
+
+    data = next(filter(None, map(_find_oauth_response, entries.values())), None)
+    if data is None:
+        access_token = next(
+            (
+                value
+                for key, value in entries.items()
+                if "token" in key.lower()
+                and "refresh" not in key.lower()
+                and JWT_PATTERN.fullmatch(value)
+            ),
+            None,
+        )
+        if access_token is None:
+            return None
+        data = {"access_token": access_token}
+
+    claims = _decode_jwt_claims(data["access_token"])
+    user = data.get("userInfo") or {}
+    # the username of the token is "<username>|<school id>", see `tasks_api.login`
+    username, _, school_id = str(claims.get("user_name", "")).partition("|")
+    scope = claims.get("scope", "")
+    if isinstance(scope, list):
+        scope = " ".join(scope)
+    expires_in = data.get("expires_in")
+    if expires_in is None:
+        expires_in = max(0, int(claims.get("exp", 0) - time.time()))
+
+    return Token(
+        access_token=data["access_token"],
+        token_type=data.get("token_type", "bearer").lower(),
+        refresh_token=data.get("refresh_token", ""),
+        expires_in=expires_in,
+        scope=data.get("scope", scope),
+        jti=data.get("jti", claims.get("jti", "")),
+        user_info=UserInfo(
+            id=str(user.get("id", claims.get("id", ""))),
+            username=user.get("username", username or credentials.username),
+            full_name=user.get("name", ""),
+            type=int(user.get("type", 0)),
+            school=SchoolInfo(
+                id=int(school_id) if school_id.isdigit() else 0,
+                name=credentials.school,
+            ),
+        ),
+    )
+
+
+def print_hw_list(
+    hw_list: list[HomeworkRecord], positions: list[int] | None = None
+) -> None:
+    if positions is None:
+        positions = list(range(len(hw_list)))
 
-def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
     globalvars.context.messenger.send_table(
         title="Homework List",
         show_header=True,
@@ -699,17 +1036,19 @@ def print_hw_list(hw_list: list[HomeworkRecord]) -> None:
             ("Index", "cyan", "right"),
             ("Title", "magenta", "left"),
             ("Status", "yellow"),
+            ("Due", "blue", "center"),
             ("Score", "red", "center"),
         ],
         rows=list(
             map(
-                lambda enum_obj: (
-                    str(enum_obj[0]),
-                    enum_obj[1].title,
-                    f"{enum_obj[1].status} ({enum_obj[1].status.value[1]})",  # type: ignore
-                    f"{enum_obj[1].current_score}/{enum_obj[1].total_score}",
+                lambda i: (
+                    str(i),
+                    hw_list[i].title,
+                    f"{hw_list[i].status} ({hw_list[i].status.value[1]})",  # type: ignore
+                    format_datetime(hw_list[i].due_time),
+                    f"{hw_list[i].current_score}/{hw_list[i].total_score}",
                 ),
-                enumerate(hw_list),
+                positions,
             )
         ),
     )
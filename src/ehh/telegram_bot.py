@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import json
+import time
+import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
+from urllib.parse import urlparse
 
 import httpx
 
@@ -12,20 +15,26 @@ from telegram.ext import (
     Application,
     CommandHandler,
     ContextTypes,
+    ExtBot,
 )
 from munch import Munch
 
 
 from .models.homework_record import HomeworkRecord
 from .models.homework_status import HomeworkStatus
+from .models.homework_index import HomeworkIndex
+from .models.homework_query import HomeworkQuery
 from .models.credentials import Credentials
 from .models.api.token import Token
 from .models.ai_client import AIClient
 from .tasks_api import (
     get_hw_list,
+    query_hw_list,
     download_audio,
     download_text,
-    transcribe_audio,
+    transcribe_audio_file,
+    resolve_whisper_device,
+    save_transcription,
     get_answers,
     get_paper_answers,
     generate_answers,
@@ -33,29 +42,286 @@ from .tasks_api import (
     start_hw,
     login,
 )
-from .utils.config import load_config, save_config, migrate_config_if_needed
+from .utils.ai.clients import openai_clients, warm_ai_clients
+from .utils.http_cassette import apply_http_config, create_http_client
+from .utils.config import (
+    config_service,
+    config_writer,
+    save_config,
+    migrate_config_if_needed,
+)
 from .utils.api.constants import BASE_URL
 from .utils.crypto import encodeb64_safe
 from .utils.logging import print
+from .utils.executors import run_sync, run_in_process, shutdown_executors
 from .utils.fs import CACHE_DIR
+from .utils.session_store import ChatSession, SessionStore
+from .utils.jobs import Job, JobContext, JobManager, JobState
+from .utils.ai.ensemble import load_ensemble
+from .utils.telegram_updates import PerChatUpdateProcessor
 from .utils.context.impl.api_context import APIContext
 from .utils.context.impl.console_messenger import ConsoleMessenger
-from .utils.context.impl.telegram_messenger import TelegramMessenger
+from .utils.context.impl.telegram_messenger import (
+    TelegramMessenger,
+    TelegramRateLimiter,
+)
 from . import globalvars
 
-
-hw_list: list[HomeworkRecord] = []
-token: Optional[Token] = None
 config: Munch = None
+sessions: SessionStore = None  # type: ignore
+jobs: JobManager = None  # type: ignore
+rate_limiter = TelegramRateLimiter()
+
+
+DEFAULT_CONCURRENT_UPDATES = 16
+
+# seconds a handler may wait on its blocking work before giving up
+DEFAULT_HANDLER_TIMEOUT = 60
+HANDLER_TIMEOUTS: dict[str, float] = {
+    "download_audio": 300,
+    "transcribe_audio": 1800,
+    "generate_answers": 600,
+}
+
+# jobs of each kind allowed to run at once; the rest wait in line
+JOB_CONCURRENCY: dict[str, int] = {
+    "download_audio": 4,
+    "transcribe_audio": 1,
+    "generate_answers": 2,
+}
+
+
+async def _run_blocking(handler: str, func, *args):
+    try:
+        return await run_sync(
+            func,
+            *args,
+            timeout=HANDLER_TIMEOUTS.get(handler, DEFAULT_HANDLER_TIMEOUT),
+        )
+    finally:
+        # output printed by `func` is batched; get it out before the handler replies
+        drain = getattr(globalvars.context.messenger, "drain", None)
+        if drain is not None:
+            await drain()
+
+
+def _get_default_credentials(index: Optional[int] = None) -> Optional[Credentials]:
+    sel = getattr(config.credentials, "selected", None)
+    if isinstance(sel, int) and 0 <= sel < len(config.credentials.all):
+        return Credentials.from_dict(config.credentials.all[sel])
+    if index is not None and 1 <= index <= len(config.credentials.all):
+        return Credentials.from_dict(config.credentials.all[index - 1])
+    if len(config.credentials.all) > 0:
+        return Credentials.from_dict(config.credentials.all[0])
+    return None
+
+
+def _create_chat_context(bot: ExtBot, chat_id: int) -> APIContext:
+    return APIContext(
+        messenger=TelegramMessenger(
+            bot=bot, chat_id=chat_id, rate_limiter=rate_limiter
+        ),
+        http_client=create_http_client(config, base_url=BASE_URL),
+    )
+
+
+async def _get_session(
+    update: Update, context: ContextTypes.DEFAULT_TYPE
+) -> ChatSession:
+    return await _get_chat_session(update.effective_chat.id)
+
+
+async def _get_chat_session(chat_id: int) -> ChatSession:
+    session = sessions.get(chat_id)
+    # in use until the handler or job asking for it is done; eviction leaves
+    # its http client open until then
+    session.hold()
+    asyncio.current_task().add_done_callback(lambda _: session.release())  # type: ignore
+    session.context.config = config
+    # only affects the task running this (and executor calls made from it)
+    globalvars.bind_context(session.context)
+
+    if session.token is None and not session.cache.get("auto_login_attempted"):
+        session.cache["auto_login_attempted"] = True
+        cred_obj = _get_default_credentials()
+        if cred_obj is not None:
+            session.set_token(await _run_blocking("account_login", login, cred_obj))
+            sessions.save(session)
+            if session.token is None:
+                print("<warning> telegram bot: login failed with provided credentials")
+            else:
+                print("<info> telegram bot: logged in to school API")
 
+    return session
 
-def _ensure_hw_list() -> bool:
-    global hw_list, token
-    if token is None:
+
+async def _ensure_hw_list(session: ChatSession) -> bool:
+    if session.token is None:
         return False
-    if not hw_list:
-        hw_list = get_hw_list(token) or []
-    return len(hw_list) > 0
+    if not session.hw_list:
+        session.hw_list = await _run_blocking("list", get_hw_list, session.token) or []
+    return len(session.hw_list) > 0
+
+
+def _audio_path(record: HomeworkRecord) -> Path:
+    return CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
+
+
+def _submit_job(chat_id: int, kind: str, record: HomeworkRecord, **args) -> Job:
+    # records are looked up again when the job runs, which may be after a restart
+    return jobs.submit(
+        chat_id,
+        kind,
+        record.title,
+        {"api_id": record.api_id, "title": record.title, **args},
+    )
+
+
+async def _get_job_session(job: Job) -> ChatSession:
+    session = await _get_chat_session(job.chat_id)
+    # the job's blocking work stops sending output to the chat once it is cancelled
+    globalvars.bind_context(JobContext(session.context, job))  # type: ignore
+    return session
+
+
+async def _get_job_record(session: ChatSession, job: Job) -> HomeworkRecord:
+    if not await _ensure_hw_list(session):
+        raise RuntimeError("no homework items available")
+    for record in session.hw_list:
+        if record.api_id == job.args["api_id"] and record.title == job.args["title"]:
+            return record
+    raise RuntimeError("homework is no longer in the list")
+
+
+async def _job_download_audio(job: Job) -> None:
+    session = await _get_job_session(job)
+    if session.token is None:
+        raise RuntimeError("not logged in; cannot download audio")
+    record = await _get_job_record(session, job)
+
+    await _run_blocking("download_audio", download_audio, session.token, record)
+    audio_path = _audio_path(record)
+    if not audio_path.exists():
+        raise RuntimeError("audio file not found after download")
+
+    job.result_text = f"Audio: {record.title}"
+    job.result_file = str(audio_path)
+
+
+async def _job_transcribe_audio(job: Job) -> None:
+    session = await _get_job_session(job)
+    record = await _get_job_record(session, job)
+    audio_file = _audio_path(record)
+    if not audio_file.exists():
+        raise RuntimeError("audio file not found; please /download_audio first")
+
+    whisper_conf = config.whisper
+    jobs.report(job, f"transcribing with whisper model '{whisper_conf.model}'")
+    # whisper is CPU/GPU bound; keep it off both the event loop and the GIL
+    transcription = await run_in_process(
+        transcribe_audio_file,
+        str(audio_file),
+        whisper_conf.model,
+        resolve_whisper_device(whisper_conf.device),
+        whisper_conf.in_memory,
+        timeout=HANDLER_TIMEOUTS["transcribe_audio"],
+    )
+
+    txt_path = save_transcription(record, transcription)
+    if txt_path is None:
+        raise RuntimeError("transcription file not found after transcribe")
+
+    job.result_text = f"Transcription: {record.title}"
+    job.result_file = str(txt_path)
+
+
+async def _job_generate_answers(job: Job) -> None:
+    ai_client = _get_ai_client_from_config()
+    if ai_client is None:
+        raise RuntimeError("no AI client configured in config")
+    ensemble = load_ensemble(config) if job.args.get("ensemble") else None
+    if ensemble is not None and not ensemble:
+        raise RuntimeError("no ensemble members configured under ai_ensemble")
+    session = await _get_job_session(job)
+    record = await _get_job_record(session, job)
+
+    if ensemble:
+        jobs.report(job, f"asking {len(ensemble)} models")
+    else:
+        jobs.report(job, f"asking model '{ai_client.selected_model}'")
+    answers = await _run_blocking(
+        "generate_answers",
+        generate_answers,
+        session.token,
+        record,
+        ai_client,
+        job.args.get("has_audio_manual"),
+        job.args.get("use_cache", True),
+        ensemble,
+    )
+    if answers is None:
+        raise RuntimeError("failed to generate answers")
+
+    answers_file = (
+        CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_answers_gen.json"
+    )
+    answers_file.write_text(
+        json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
+    )
+
+    job.result_text = f"Generated Answers: {record.title}"
+    job.result_file = str(answers_file)
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}m {seconds:02d}s" if minutes else f"{seconds}s"
+
+
+def _format_job(job: Job) -> str:
+    text = f"Job #{job.id} ({job.kind}): {job.title}\nStatus: {job.state.value}"
+    if job.started_at is not None:
+        end = job.finished_at or time.time()
+        text += f" ({_format_duration(end - job.started_at)})"
+    if job.error:
+        text += f"\nError: {job.error}"
+    elif job.progress and not job.state.finished:
+        text += f"\n{job.progress}"
+    return text
+
+
+# job id -> function that re-renders the job's status message
+_job_status_messages: dict[int, Callable[[], None]] = {}
+
+
+async def _on_job_change(job: Job, state: JobState) -> None:
+    messenger = sessions.get(job.chat_id).context.messenger
+    assert isinstance(messenger, TelegramMessenger)
+
+    refresh = _job_status_messages.get(job.id)
+    if refresh is None:
+        refresh = messenger.send_live(lambda: _format_job(job))
+        _job_status_messages[job.id] = refresh
+    else:
+        refresh()
+
+    if not state.finished:
+        return
+    _job_status_messages.pop(job.id, None)
+    if state is not JobState.DONE or job.result_file is None:
+        return
+
+    # let the job's own output arrive first
+    await messenger.drain()
+    result_file = Path(job.result_file)
+    if job.kind == "download_audio":
+        await messenger.bot.send_audio(
+            chat_id=job.chat_id, audio=result_file, caption=job.result_text
+        )
+    else:
+        await messenger.bot.send_document(
+            chat_id=job.chat_id, document=result_file, caption=job.result_text
+        )
 
 
 def _get_ai_client_from_config() -> Optional[AIClient]:
@@ -66,31 +332,49 @@ def _get_ai_client_from_config() -> Optional[AIClient]:
 
 
 async def command_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    global hw_list, token
-
-    if not isinstance(globalvars.context.messenger, TelegramMessenger):
-        globalvars.context = APIContext(
-            messenger=TelegramMessenger(
-                bot=context.bot, chat_id=update.effective_chat.id
-            ),
-            http_client=httpx.Client(base_url=BASE_URL),
-        )
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         print("<error> not logged in; cannot retrive homework list")
         return
 
-    hw_list = get_hw_list(token)
-    if not hw_list:
+    try:
+        query = HomeworkQuery.parse(context.args or [])
+    except ValueError as e:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id, text=f"Invalid filter: {e}"
+        )
+        return
+
+    # a bare /list refetches; filtered ones run on the cached list
+    if not context.args:
+        session.hw_index = None
+    elif session.hw_index is None or session.hw_index.records is not session.hw_list:
+        session.hw_index = HomeworkIndex(session.hw_list) if session.hw_list else None
+
+    result = await _run_blocking(
+        "list", query_hw_list, session.token, query, session.hw_index
+    )
+    if result is None or not result[0].records:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="No homework items found.",
         )
         return
 
+    session.hw_index, positions = result
+    session.hw_list = session.hw_index.records
+    if not positions:
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="No homework items match the filters.",
+        )
+        return
+
     message_lines = ["*📚 Homework List 📋*"]
 
-    for i, hw in enumerate(hw_list):
+    for i in positions:
+        hw = session.hw_list[i]
         status_text = hw.status.value if hw.status else "Unknown"
         if hw.status == HomeworkStatus.COMPLETED:
             status_emoji = "✅"
@@ -127,11 +411,11 @@ async def command_list(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 async def command_download_audio(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
     chat_id = update.effective_chat.id
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=chat_id,
             text="Not logged in; cannot download audio.",
@@ -151,49 +435,25 @@ async def command_download_audio(
         await context.bot.send_message(chat_id=chat_id, text="Invalid index.")
         return
 
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=chat_id, text="No homework items available."
         )
         return
 
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=chat_id, text=f"Index out of range: {idx+1}"
         )
         return
 
-    record = hw_list[idx]
-
-    try:
-        download_audio(token, record)
-    except Exception as e:
-        await context.bot.send_message(
-            chat_id=chat_id, text=f"Failed to download audio: {e}"
-        )
-        return
-
-    audio_path = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
-    if not audio_path.exists():
-        await context.bot.send_message(
-            chat_id=chat_id, text="Audio file not found after download."
-        )
-        return
-
-    await context.bot.send_message(
-        chat_id=chat_id, text=f"Audio for homework '{record.title}' downloaded."
-    )
-    await context.bot.send_audio(
-        chat_id=chat_id,
-        audio=audio_path,
-        caption=f"Audio: {record.title}",
-    )
+    _submit_job(chat_id, "download_audio", session.hw_list[idx])
 
 
 async def command_transcribe_audio(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
     if not context.args:
         await context.bot.send_message(
@@ -210,56 +470,35 @@ async def command_transcribe_audio(
         )
         return
 
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items available."
         )
         return
 
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
 
-    record = hw_list[idx]
-    audio_file = CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
-    if not audio_file.exists():
+    record = session.hw_list[idx]
+    if not _audio_path(record).exists():
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Audio file not found; please /download_audio first.",
         )
         return
 
-    try:
-        transcribe_audio(record)
-    except Exception as e:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Transcription failed: {e}"
-        )
-        return
-
-    txt_path = audio_file.with_suffix(audio_file.suffix + ".txt")
-    if txt_path.exists():
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text=f"Transcription saved: {txt_path}"
-        )
-        await context.bot.send_document(
-            chat_id=update.effective_chat.id, document=open(str(txt_path), "rb")
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="Transcription file not found after transcribe.",
-        )
+    _submit_job(update.effective_chat.id, "transcribe_audio", record)
 
 
 async def command_download_text(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Not logged in; cannot download text.",
@@ -278,19 +517,21 @@ async def command_download_text(
             chat_id=update.effective_chat.id, text="Invalid index."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
+    record = session.hw_list[idx]
     try:
-        download_text(token, record)
+        await _run_blocking("download_text", download_text, session.token, record)
+    except asyncio.TimeoutError:
+        raise
     except Exception as e:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Failed to download text: {e}"
@@ -312,9 +553,9 @@ async def command_download_text(
 async def command_download_answers(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Not logged in; cannot retrieve answers.",
@@ -333,18 +574,20 @@ async def command_download_answers(
             chat_id=update.effective_chat.id, text="Invalid index."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
-    answers = get_answers(token, record)
+    record = session.hw_list[idx]
+    answers = await _run_blocking(
+        "download_answers", get_answers, session.token, record
+    )
     if answers is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No answers retrieved."
@@ -364,9 +607,9 @@ async def command_download_answers(
 async def command_download_answers_paper(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Not logged in; cannot retrieve answers.",
@@ -385,18 +628,20 @@ async def command_download_answers_paper(
             chat_id=update.effective_chat.id, text="Invalid index."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
-    answers = get_paper_answers(token, record)
+    record = session.hw_list[idx]
+    answers = await _run_blocking(
+        "download_answers_paper", get_paper_answers, session.token, record
+    )
     if answers is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No answers retrieved."
@@ -419,12 +664,12 @@ async def command_download_answers_paper(
 async def command_generate_answers(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
     if not context.args:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
-            text="Provide homework index, e.g. /generate_answers 1",
+            text="Provide homework index, e.g. /generate_answers 1 (add --no-cache to ask the model again, --ensemble to ask all ensemble models)",
         )
         return
     try:
@@ -440,20 +685,19 @@ async def command_generate_answers(
             chat_id=update.effective_chat.id, text="No AI client configured in config."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
-    # if token not present, we cannot auto-detect audio; ask user via argument 'has_audio=yes'
+    # if not logged in, we cannot auto-detect audio; ask user via argument 'has_audio=yes'
     has_audio_manual = None
-    if token is None:
+    if session.token is None:
         if len(context.args) > 1 and context.args[1].lower() in (
             "yes",
             "y",
@@ -463,32 +707,23 @@ async def command_generate_answers(
             has_audio_manual = True
         else:
             has_audio_manual = False
-    answers = generate_answers(token, record, ai_client, has_audio_manual)
-    if answers is None:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Failed to generate answers."
-        )
-        return
-    answers_file = (
-        CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_answers_gen.json"
-    )
 
-    answers_file.write_text(
-        json.dumps(answers, indent=4, ensure_ascii=False), encoding="utf-8"
-    )
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=open(str(answers_file), "rb"),
-        caption=f"Generated Answers: {record.title}",
+    _submit_job(
+        update.effective_chat.id,
+        "generate_answers",
+        session.hw_list[idx],
+        has_audio_manual=has_audio_manual,
+        use_cache="--no-cache" not in context.args,
+        ensemble="--ensemble" in context.args,
     )
 
 
 async def command_submit_answers(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Not logged in; cannot submit homework.",
@@ -507,27 +742,27 @@ async def command_submit_answers(
             chat_id=update.effective_chat.id, text="Invalid index."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
-    submit_answers(token, record)
+    record = session.hw_list[idx]
+    await _run_blocking("submit_answers", submit_answers, session.token, record)
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Submit attempted for: {record.title}"
     )
 
 
 async def command_start_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    global hw_list, token
+    session = await _get_session(update, context)
 
-    if token is None:
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
             text="Not logged in; cannot start homework.",
@@ -546,22 +781,22 @@ async def command_start_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             chat_id=update.effective_chat.id, text="Invalid index."
         )
         return
-    if not _ensure_hw_list():
+    if not await _ensure_hw_list(session):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No homework items."
         )
         return
-    if idx < 0 or idx >= len(hw_list):
+    if idx < 0 or idx >= len(session.hw_list):
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text=f"Index out of range: {idx+1}"
         )
         return
-    record = hw_list[idx]
-    start_hw(token, record)
+    record = session.hw_list[idx]
+    await _run_blocking("start_hw", start_hw, session.token, record)
     # refresh list
-    new_list = get_hw_list(token)
+    new_list = await _run_blocking("start_hw", get_hw_list, session.token)
     if new_list:
-        hw_list = new_list
+        session.hw_list = new_list
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Started homework: {record.title}"
     )
@@ -570,7 +805,7 @@ async def command_start_hw(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 async def command_account_login(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global token, hw_list
+    session = await _get_session(update, context)
     # usage: /account_login [index]
     sel_index = None
     if context.args:
@@ -581,26 +816,22 @@ async def command_account_login(
                 chat_id=update.effective_chat.id, text="Invalid index."
             )
             return
-    cred_obj = None
-    sel = getattr(config.credentials, "selected", None)
-    if isinstance(sel, int) and 0 <= sel < len(config.credentials.all):
-        cred_obj = Credentials.from_dict(config.credentials.all[sel])
-    elif sel_index is not None and 1 <= sel_index <= len(config.credentials.all):
-        cred_obj = Credentials.from_dict(config.credentials.all[sel_index - 1])
-    elif len(config.credentials.all) > 0:
-        cred_obj = Credentials.from_dict(config.credentials.all[0])
+    cred_obj = _get_default_credentials(sel_index)
     if cred_obj is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="No credentials configured."
         )
         return
-    token = login(cred_obj)
-    if token is None:
+    session.set_token(await _run_blocking("account_login", login, cred_obj))
+    sessions.save(session)
+    if session.token is None:
         await context.bot.send_message(
             chat_id=update.effective_chat.id, text="Login failed."
         )
         return
-    hw_list = get_hw_list(token) or []
+    session.hw_list = (
+        await _run_blocking("account_login", get_hw_list, session.token) or []
+    )
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Logged in as: {cred_obj.describe()}"
     )
@@ -609,17 +840,15 @@ async def command_account_login(
 async def command_account_logout(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global token, hw_list
-    token = None
-    hw_list = []
+    session = await _get_session(update, context)
+    session.set_token(None)
+    sessions.save(session)
     await context.bot.send_message(chat_id=update.effective_chat.id, text="Logged out.")
 
 
 async def command_ai_select_api(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
-
     # usage: /ai_select_api <index|none>
     if not context.args:
         await context.bot.send_message(
@@ -647,7 +876,7 @@ async def command_ai_select_api(
         )
         return
     config.ai_client.selected = idx - 1
-    save_config(config)
+    config_writer.save(config)
     await context.bot.send_message(
         chat_id=update.effective_chat.id, text=f"Selected AI client index: {idx}"
     )
@@ -656,8 +885,6 @@ async def command_ai_select_api(
 async def command_ai_select_model(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global hw_list, token
-
     # usage: /ai_select_model <model_index>
     ai_client = _get_ai_client_from_config()
     if ai_client is None:
@@ -686,7 +913,7 @@ async def command_ai_select_model(
     # update config stored client
     selected_conf = config.ai_client.all[config.ai_client.selected]
     selected_conf["model"]["selected"] = midx - 1
-    save_config(config)
+    config_writer.save(config)
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=f"Selected model index {midx} for AI client.",
@@ -696,25 +923,115 @@ async def command_ai_select_model(
 async def command_config_reload(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    global config
-
-    config = load_config()
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id, text="Config reloaded."
-    )
+    if config_service.reload(force=True):
+        text = "Config reloaded."
+    else:
+        text = "Failed to reload config; keeping the current one."
+    await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
 
 
 async def command_config_save(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    save_config(config)
+    # whatever is pending would write the same config
+    config_writer.discard()
+    saved = await run_sync(save_config, config)
     await context.bot.send_message(
-        chat_id=update.effective_chat.id, text="Config saved."
+        chat_id=update.effective_chat.id,
+        text="Config saved." if saved else "Config file is up to date.",
+    )
+
+
+async def command_jobs(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = update.effective_chat.id
+    chat_jobs = jobs.jobs_of(chat_id)
+    if not chat_jobs:
+        await context.bot.send_message(chat_id=chat_id, text="No jobs yet.")
+        return
+
+    lines = []
+    for job in chat_jobs:
+        line = f"#{job.id} {job.kind}: {job.title} - {job.state.value}"
+        if job.error:
+            line += f" ({job.error})"
+        lines.append(line)
+    await context.bot.send_message(chat_id=chat_id, text="\n".join(lines))
+
+
+async def command_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = update.effective_chat.id
+    if not context.args:
+        await context.bot.send_message(
+            chat_id=chat_id, text="Provide a job id, e.g. /cancel 3"
+        )
+        return
+    try:
+        job_id = int(context.args[0].lstrip("#"))
+    except ValueError:
+        await context.bot.send_message(chat_id=chat_id, text="Invalid job id.")
+        return
+
+    if jobs.cancel(chat_id, job_id):
+        await context.bot.send_message(
+            chat_id=chat_id, text=f"Cancelling job #{job_id}."
+        )
+        return
+
+    job = jobs.get(chat_id, job_id)
+    if job is None:
+        await context.bot.send_message(chat_id=chat_id, text=f"No job #{job_id}.")
+    else:
+        await context.bot.send_message(
+            chat_id=chat_id, text=f"Job #{job_id} already {job.state.value}."
+        )
+
+
+async def _on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if isinstance(context.error, asyncio.TimeoutError):
+        text = "Operation timed out; please try again later."
+    else:
+        print(f"<error> telegram bot: unhandled error: {context.error}")
+        text = f"An unexpected error occurred: {context.error}"
+
+    if isinstance(update, Update) and update.effective_chat is not None:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text=text)
+
+
+def _apply_config(old: Munch, new: Munch) -> None:
+    global config
+
+    config = new
+    warm_ai_clients(new)
+    apply_http_config(globalvars.context, old, new, base_url=BASE_URL)
+    for session in sessions:
+        apply_http_config(session.context, old, new, base_url=BASE_URL)
+
+
+async def _post_init(application: Application) -> None:
+    resumed = jobs.resume()
+    if resumed:
+        print(f"<info> telegram bot: resumed {resumed} unfinished job(s)")
+
+    # sessions are only touched on the event loop, so reloads noticed by the
+    # watcher thread are applied there
+    loop = asyncio.get_running_loop()
+    config_service.subscribe(
+        lambda old, new: loop.call_soon_threadsafe(_apply_config, old, new)
     )
+    config_service.watch()
+
+
+async def _post_shutdown(application: Application) -> None:
+    config_service.stop()
+    config_writer.flush()
+    await jobs.close()
+    sessions.close()
+    openai_clients.close()
+    shutdown_executors()
 
 
 def main():
-    global globalvars, token, config
+    global globalvars, config, sessions, jobs
 
     print("--- step: start telegram bot ---")
 
@@ -724,31 +1041,52 @@ def main():
     )
 
     migrate_config_if_needed()
-    config = load_config()
-    token = None
-    try:
-        sel = config.credentials.selected
-        cred_obj = None
-        if isinstance(sel, int) and 0 <= sel < len(config.credentials.all):
-            cred_obj = Credentials.from_dict(config.credentials.all[sel])
-        elif len(config.credentials.all) > 0:
-            cred_obj = Credentials.from_dict(config.credentials.all[0])
-
-        if cred_obj is not None:
-            token = login(cred_obj)
-            if token is None:
-                print("<warning> telegram bot: login failed with provided credentials")
-            else:
-                print("<info> telegram bot: logged in to school API")
-    except Exception as e:
-        print(f"<warning> telegram bot: login attempt failed: {e}")
+    config = config_service.load()
+    warm_ai_clients(config)
+    globalvars.context.http_client = create_http_client(config, base_url=BASE_URL)
 
     telegram_token = getattr(config, "telegram_bot_token", None)
     if not telegram_token:
         print("<error> no telegram bot token configured; aborting")
         return
 
-    application = Application.builder().token(telegram_token).build()
+    bot_config = getattr(config, "telegram_bot", None) or Munch()
+    webhook_config = getattr(bot_config, "webhook", None) or Munch()
+
+    # handlers hand blocking work to executors, so updates can be processed
+    # concurrently without one user's command stalling everybody else
+    builder = (
+        Application.builder()
+        .token(telegram_token)
+        .concurrent_updates(
+            PerChatUpdateProcessor(
+                getattr(bot_config, "concurrent_updates", None)
+                or DEFAULT_CONCURRENT_UPDATES
+            )
+        )
+        .post_init(_post_init)
+        .post_shutdown(_post_shutdown)
+    )
+    api_base_url = getattr(bot_config, "api_base_url", None)
+    if api_base_url:
+        api_base_url = api_base_url.rstrip("/")
+        builder = builder.base_url(f"{api_base_url}/bot").base_file_url(
+            f"{api_base_url}/file/bot"
+        )
+    application = builder.build()
+    application.add_error_handler(_on_error)
+    sessions = SessionStore(
+        lambda chat_id: _create_chat_context(application.bot, chat_id)
+    )
+    jobs = JobManager(
+        runners={
+            "download_audio": _job_download_audio,
+            "transcribe_audio": _job_transcribe_audio,
+            "generate_answers": _job_generate_answers,
+        },
+        on_change=_on_job_change,
+        limits=JOB_CONCURRENCY,
+    )
 
     # basic functionality
     application.add_handler(CommandHandler("list", command_list))
@@ -779,7 +1117,32 @@ def main():
     application.add_handler(CommandHandler("config_reload", command_config_reload))
     application.add_handler(CommandHandler("config_save", command_config_save))
 
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # jobs
+    application.add_handler(CommandHandler("jobs", command_jobs))
+    application.add_handler(CommandHandler("cancel", command_cancel))
+
+    webhook_url = getattr(webhook_config, "url", None)
+    if not webhook_url:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        return
+
+    try:
+        from .utils.telegram_webhook import run_webhook
+    except ImportError:
+        print("<error> webhook mode requires uvicorn; install it or unset the url")
+        return
+
+    asyncio.run(
+        run_webhook(
+            application,
+            url=webhook_url,
+            listen=getattr(webhook_config, "listen", None) or "127.0.0.1",
+            port=getattr(webhook_config, "port", None) or 8080,
+            path=getattr(webhook_config, "path", None) or urlparse(webhook_url).path,
+            secret_token=getattr(webhook_config, "secret_token", None),
+            allowed_updates=Update.ALL_TYPES,
+        )
+    )
 
 
 if __name__ == "__main__":
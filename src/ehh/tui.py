@@ -6,43 +6,52 @@ import shlex
 import atexit
 from pathlib import Path
 
+from munch import Munch
 from textual import work
 from textual.binding import Binding
-from textual.containers import Container
+from textual.containers import Container, Vertical
 from textual.app import App, ComposeResult
 from textual.widgets import (
     Header,
     Footer,
     Input,
     RichLog,
-    ListView,
-    ListItem,
-    Label,
+    DataTable,
 )
-from selenium.webdriver.support.ui import WebDriverWait
 
 from .models.homework_record import HomeworkRecord
+from .models.homework_index import HomeworkIndex
+from .models.homework_query import HomeworkQuery
 from .models.ai_client import AIClient
 from .models.credentials import Credentials
 from .utils.convert import try_parse_int
 from .utils.crypto import encodeb64_safe
-from .utils.config import load_config, save_config, migrate_config_if_needed
+from .utils.ai.clients import warm_ai_clients
+from .utils.webdriver import create_driver
+from .utils.browser.pool import create_driver_pool
+from .utils.config import config_service, save_config, migrate_config_if_needed
 from .utils.logging import print, print_and_copy_path
-from .utils.context.base import Context
+from .utils.api.constants import BASE_URL
+from .utils.http_cassette import apply_http_config, create_http_client
+from .utils.context.impl.hybrid_context import HybridContext
 from .utils.context.impl.textual_messenger import TextualMessenger
 from .utils.fs import CACHE_DIR
+from .utils.ai.ensemble import load_ensemble
 from .tasks_browser import *
 from . import globalvars
 
+# how often reloads noticed by the config watcher are applied, in seconds
+CONFIG_APPLY_INTERVAL = 0.5
 
-class HomeworkRecordItem(ListItem):
-    def __init__(self, record: HomeworkRecord, index: int) -> None:
-        super().__init__()
-        self.record = record
-        self.index = index
 
-    def compose(self) -> ComposeResult:
-        yield Label(f"[{self.index}] {self.record.title}", classes="list-label")
+def _hw_row_key(index: int, record: HomeworkRecord) -> str:
+    # browser-scraped records have no api id; their position is all we have
+    return record.api_id or f"#{index}"
+
+
+def _hw_row_cells(index: int, record: HomeworkRecord) -> tuple[str, str, str]:
+    status = record.status.value[1] if record.status else "-"
+    return (str(index), record.title, status)
 
 
 class HomeworkApp(App):
@@ -51,12 +60,18 @@ class HomeworkApp(App):
         grid-size: 3 1;
         grid-columns: 1fr 3fr;
     }
-    #hw-list {
+    #hw-pane {
         dock: left;
-        width: 30;
+        width: 40;
         border-right: thick $secondary 50%;
         padding: 0;
     }
+    #hw-search {
+        height: 3;
+    }
+    #hw-list {
+        height: 1fr;
+    }
     #main-area {
         height: 100%;
         padding: 1;
@@ -69,10 +84,6 @@ class HomeworkApp(App):
         border-top: heavy $secondary 50%;
         height: 3;
     }
-    .list-label {
-        width: 100%;
-        overflow: auto;
-    }
     """
 
     BINDINGS = [
@@ -80,20 +91,35 @@ class HomeworkApp(App):
     ]
 
     hw_list: list[HomeworkRecord] = []
+    hw_index: HomeworkIndex | None = None
     ai_client: AIClient | None = None
 
     def __init__(self, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
-        globalvars.context = Context(messenger=TextualMessenger(self, "#output-log"))
+        # positions picked by the last `list`, before the search box narrows them
+        self._listed_positions: list[int] = []
+        self._search_text = ""
+        # row key -> cells currently shown, so refreshes only touch what changed
+        self._rendered_rows: dict[str, tuple[str, str, str]] = {}
+        globalvars.context = HybridContext(
+            messenger=TextualMessenger(self, "#output-log")
+        )
 
     def compose(self) -> ComposeResult:
         yield Header()
         yield Footer()
 
-        yield ListView(id="hw-list", classes="box")
+        with Vertical(id="hw-pane"):
+            yield Input(placeholder="Search titles...", id="hw-search")
+            yield DataTable(id="hw-list", classes="box", cursor_type="row")
 
         with Container(id="main-area"):
-            yield RichLog(id="output-log", classes="box", markup=True)
+            yield RichLog(
+                id="output-log",
+                classes="box",
+                markup=True,
+                max_lines=TextualMessenger.MAX_LINES,
+            )
             yield Input(
                 placeholder="Enter command (e.g., list, help, exit)", id="command-input"
             )
@@ -108,57 +134,25 @@ class HomeworkApp(App):
         atexit.register(self._at_exit)
         print("<info> registered atexit handler")
         migrate_config_if_needed()
-        globalvars.context.config = load_config()
+        globalvars.context.config = config_service.load()
         print("<info> loaded config file")
-        match globalvars.context.config.browser.type:
-            case "chrome":
-                from selenium.webdriver.chrome.options import (
-                    Options as WebDriverOptions,
-                )
-                from selenium.webdriver.chrome.webdriver import (
-                    WebDriver,
-                )
-            case "firefox":
-                from selenium.webdriver.firefox.options import (
-                    Options as WebDriverOptions,
-                )
-                from selenium.webdriver.firefox.webdriver import (
-                    WebDriver,
-                )
-            case "edge":
-                from selenium.webdriver.edge.options import (
-                    Options as WebDriverOptions,
-                )
-                from selenium.webdriver.edge.webdriver import (
-                    WebDriver,
-                )
-            case "safari":
-                from selenium.webdriver.safari.options import (
-                    Options as WebDriverOptions,
-                )
-                from selenium.webdriver.safari.webdriver import (
-                    WebDriver,
-                )
-            case _:
-                print(
-                    f"<error> unsupported browser type: {globalvars.context.config.browser.type}; aborting..."
-                )
-                return
-        driver_options = WebDriverOptions()
-        if globalvars.context.config.browser.type != "safari":
-            driver_options.binary_location = globalvars.context.config.browser.binary_path  # type: ignore
-        else:
-            if globalvars.context.config.browser.binary_path != "":
-                print(
-                    "<warning> safari browser binary path is ignored; using system default"
-                )
-        if globalvars.context.config.browser.headless:
-            driver_options.add_argument("--headless")
-        globalvars.context.driver = WebDriver(options=driver_options)  # type: ignore
-        globalvars.context.wait = WebDriverWait(globalvars.context.driver, 15)
+        # for hybrid mode; the browser does not use it
+        globalvars.context.http_client = create_http_client(
+            globalvars.context.config, base_url=BASE_URL
+        )
+        warm_ai_clients(globalvars.context.config)
+        print("<info> connecting to AI endpoints in the background")
+        driver = create_driver(globalvars.context.config.browser)
+        if driver is None:
+            print("<error> could not start browser; aborting...")
+            return
+        globalvars.context.init_driver(driver)
         print(
             f"<info> started browser {globalvars.context.config.browser.type} {" in headless mode" if globalvars.context.config.browser.headless else ""}"
         )
+        globalvars.context.driver_pool = create_driver_pool(
+            globalvars.context.config.browser
+        )
 
         if globalvars.context.config.ai_client.selected is not None:
             sel_index = globalvars.context.config.ai_client.selected
@@ -180,7 +174,6 @@ class HomeworkApp(App):
                 )
                 try:
                     login(cred)
-                    goto_hw_list_page()
                     self.hw_list = get_hw_list()
                     self._update_homework_list_view()
                     print(
@@ -195,31 +188,112 @@ class HomeworkApp(App):
         else:
             print(f"<warning> no default credentials provided; not logging in")
 
+        # the watcher only queues reloads; they are applied on the app thread
+        config_service.subscribe(self._on_config_reload, deferred=True)
+        config_service.watch()
+        self.set_interval(CONFIG_APPLY_INTERVAL, config_service.apply_pending)
+
         print("--- entering interactive mode ---")
         self.query_one("#command-input").focus()
 
+    def _on_config_reload(self, old: Munch, new: Munch) -> None:
+        globalvars.context.config = new
+        apply_http_config(globalvars.context, old, new, base_url=BASE_URL)
+        warm_ai_clients(new)
+        sel_index = new.ai_client.selected
+        if isinstance(sel_index, int) and 0 <= sel_index < len(new.ai_client.all):
+            self.ai_client = AIClient.from_dict(new.ai_client.all[sel_index])
+        else:
+            self.ai_client = None
+        if old.browser != new.browser:
+            print("<info> browser settings take effect after a restart")
+
     def on_mount(self) -> None:
+        hw_table = self.query_one("#hw-list", DataTable)
+        hw_table.add_column("#", key="index")
+        hw_table.add_column("Title", key="title")
+        hw_table.add_column("Status", key="status")
+        globalvars.context.messenger.start()
         self._initialize_app()
 
     def _at_exit(self):
+        if globalvars.context.driver_pool is not None:
+            globalvars.context.driver_pool.close()
         if globalvars.context.driver is not None:
             try:
                 globalvars.context.driver.quit()
                 print("<info> atexit: browser closed automatically")
-                save_config(globalvars.context.config)
-                print("<info> saved config to file")
+                if save_config(globalvars.context.config):
+                    print("<info> saved config to file")
             except Exception as e:
                 print(f"<error> error occured at exit: {e}")
 
-    def _update_homework_list_view(self) -> None:
-        hw_list_view = self.query_one("#hw-list", ListView)
-        hw_list_view.clear()
-        for index, record in enumerate(self.hw_list):
-            hw_list_view.append(HomeworkRecordItem(record, index))
+    def _parse_indices(self, args: list[str]) -> list[int] | None:
+        indices = []
+        for arg in args:
+            index = try_parse_int(arg)
+            if index is None or not (0 <= index < len(self.hw_list)):
+                print(f"<error> invalid or out of range index: {arg}")
+                return None
+            indices.append(index)
+        return indices
+
+    def _update_homework_list_view(self, positions: list[int] | None = None) -> None:
+        if positions is None:
+            positions = list(range(len(self.hw_list)))
+
+        self._listed_positions = positions
+        self._render_homework_rows()
+
+    def _render_homework_rows(self) -> None:
+        """Bring the table in line with the listed rows by applying a diff.
+
+        The DataTable only paints rows in view, and rows that did not change
+        are left alone instead of being rebuilt on every refresh.
+        """
+        hw_table = self.query_one("#hw-list", DataTable)
+
+        wanted: dict[str, tuple[str, str, str]] = {}
+        for index in self._listed_positions:
+            record = self.hw_list[index]
+            if self._search_text and self._search_text not in record.title.casefold():
+                continue
+            wanted[_hw_row_key(index, record)] = _hw_row_cells(index, record)
+
+        for key in [key for key in self._rendered_rows if key not in wanted]:
+            hw_table.remove_row(key)
+            del self._rendered_rows[key]
+
+        for key, cells in wanted.items():
+            shown = self._rendered_rows.get(key)
+            if shown is None:
+                hw_table.add_row(*cells, key=key)
+            elif shown != cells:
+                for column_key, old_value, new_value in zip(
+                    ("index", "title", "status"), shown, cells
+                ):
+                    if old_value != new_value:
+                        hw_table.update_cell(key, column_key, new_value)
+            self._rendered_rows[key] = cells
+
+        wanted_order = list(wanted)
+        if [row.key.value for row in hw_table.ordered_rows] != wanted_order:
+            rank = {cells[0]: i for i, cells in enumerate(wanted.values())}
+            hw_table.sort("index", key=lambda index_cell: rank[index_cell])
+
+    def on_input_changed(self, message: Input.Changed) -> None:
+        if message.input.id != "hw-search":
+            return
+
+        self._search_text = message.value.strip().casefold()
+        self._render_homework_rows()
 
     def on_input_submitted(self, message: Input.Submitted) -> None:
+        if message.input.id != "command-input":
+            return
+
         user_input = message.value.strip().lower()
-        self.query_one(Input).value = ""
+        message.input.value = ""
         if not user_input:
             return
 
@@ -238,7 +312,7 @@ class HomeworkApp(App):
         except Exception as e:
             print(f"<error> an unexpected error occurred: {e}")
             try:
-                goto_hw_list_page()
+                goto_hw_list_page(force=True)
             except Exception:
                 ...
 
@@ -247,35 +321,59 @@ class HomeworkApp(App):
         match command:
             case "help":
                 print("<info> available commands:")
-                print("  audio [download|transcribe] <index>")
-                print("  text [display|download] <index>")
-                print("  answers [fill_in|download|generate] <index>")
-                print("  list - list all homework items")
+                print("  audio [download|transcribe] <index> [<index>...]")
+                print("  text [display|download] <index> [<index>...]")
+                print(
+                    "  answers [fill_in|download|generate] <index> [--no-cache] [--ensemble]"
+                )
+                print(
+                    "  list [status=|due_before=|due_after=|teacher=|score_min=|score_max=|title=|sort=|limit=]"
+                )
                 print("  account [login|logout|select_default]")
                 print("  ai [select_api|select_model]")
                 print("  config [reload|save]")
                 print("  exit - exit the program")
 
             case "list":
-                self.hw_list = get_hw_list()
-                self._update_homework_list_view()
-                print("<info> homework list updated")
+                try:
+                    query = HomeworkQuery.parse(args)
+                except ValueError as e:
+                    print(f"<error> invalid filter: {e}")
+                    return
+
+                # a bare `list` refetches; filtered ones run on the cached list
+                if not args:
+                    self.hw_list = get_hw_list()
+                if (
+                    not args
+                    or self.hw_index is None
+                    or self.hw_index.records is not self.hw_list
+                ):
+                    self.hw_index = HomeworkIndex(self.hw_list)
+                    self.hw_list = self.hw_index.records
+
+                positions = query.apply(self.hw_index)
+                self._update_homework_list_view(positions)
+                print(
+                    f"<info> homework list updated; showing {len(positions)} of {len(self.hw_list)} items"
+                )
 
             case "audio":
                 if len(args) < 2:
                     print(
-                        "<error> argument not enough. Usage: audio [download|transcribe] <index>"
+                        "<error> argument not enough. Usage: audio [download|transcribe] <index> [<index>...]"
                     )
                     return
                 subcommand = args[0]
-                index = try_parse_int(args[1])
-                if index is None or not (0 <= index < len(self.hw_list)):
-                    print(f"<error> invalid or out of range index: {args[1]}")
+                # download takes several indices
+                indices = self._parse_indices(args[1:])
+                if indices is None:
                     return
+                index = indices[0]
 
                 record = self.hw_list[index]
                 if subcommand == "download":
-                    download_audio(index, record)
+                    download_audios([(i, self.hw_list[i]) for i in indices])
                 elif subcommand == "transcribe":
                     audio_file = (
                         CACHE_DIR / f"homework_{encodeb64_safe(record.title)}_audio.mp3"
@@ -292,20 +390,21 @@ class HomeworkApp(App):
             case "text":
                 if len(args) < 2:
                     print(
-                        "<error> argument not enough. Usage: text [display|download] <index>"
+                        "<error> argument not enough. Usage: text [display|download] <index> [<index>...]"
                     )
                     return
                 subcommand = args[0]
-                index = try_parse_int(args[1])
-                if index is None or not (0 <= index < len(self.hw_list)):
-                    print(f"<error> invalid or out of range index: {args[1]}")
+                # download takes several indices
+                indices = self._parse_indices(args[1:])
+                if indices is None:
                     return
+                index = indices[0]
 
                 record = self.hw_list[index]
                 if subcommand == "display":
                     print(get_text(index, record))
                 elif subcommand == "download":
-                    download_text(index, record)
+                    download_texts([(i, self.hw_list[i]) for i in indices])
                 else:
                     print("<error> argument invalid")
 
@@ -361,7 +460,25 @@ class HomeworkApp(App):
                     if self.ai_client is None:
                         print("<error> no ai client selected")
                         return
-                    answers = generate_answers(index, record, self.ai_client)
+                    ensemble = None
+                    if "--ensemble" in args[2:]:
+                        try:
+                            ensemble = load_ensemble(globalvars.context.config)
+                        except ValueError as e:
+                            print(f"<error> invalid ai_ensemble config: {e}")
+                            return
+                        if not ensemble:
+                            print(
+                                "<error> no ensemble members configured under ai_ensemble"
+                            )
+                            return
+                    answers = generate_answers(
+                        index,
+                        record,
+                        self.ai_client,
+                        use_cache="--no-cache" not in args[2:],
+                        ensemble=ensemble,
+                    )
                     if answers is None:
                         print("<error> failed to generate answers")
                         return
@@ -415,7 +532,6 @@ class HomeworkApp(App):
                         )
                         logout()
                         login(cred)
-                        goto_hw_list_page()
                         self.hw_list = get_hw_list()
                         self._update_homework_list_view()
                         print(
@@ -574,14 +690,14 @@ class HomeworkApp(App):
                     return
                 subcommand = args[0]
                 if subcommand == "reload":
-                    globalvars.context.config = load_config()
-                    print("<info> reloaded config file")
-                    print(
-                        "<info> note: current states (browser, ai client) are not changed"
-                    )
+                    if config_service.reload(force=True):
+                        config_service.apply_pending()
+                        print("<info> reloaded config file and applied it")
                 elif subcommand == "save":
-                    save_config(globalvars.context.config)
-                    print("<info> saved config to file")
+                    if save_config(globalvars.context.config):
+                        print("<info> saved config to file")
+                    else:
+                        print("<info> config file is up to date")
                 else:
                     print("<error> argument invalid")
 
@@ -0,0 +1,418 @@
+import contextvars
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Optional
+
+import json5
+import openai
+
+from ...models.ai_client import AIClient
+from ..logging import print
+from .cache import CompletionCache, completion_cache
+from .prompts import AnswerPrompt
+from ... import globalvars
+
+SYSTEM_PROMPT = "You are a professional English teacher."
+
+
+class AnswerArrayParser:
+    """Incrementally parses the top-level JSON5 array of answer objects in a
+    model's output.
+
+    `feed` returns the objects completed by each chunk, so answers can be used
+    while the rest is still streaming in, and raises `ValueError` as soon as
+    the output stops looking like an array of objects. Text before the array
+    (such as a stray markdown fence) and after it is ignored.
+    """
+
+    def __init__(self) -> None:
+        self.started = False
+        self.closed = False
+        self._depth = 0
+        self._buffer: list[str] = []
+        self._quote: Optional[str] = None
+        self._escaped = False
+        self._comment: Optional[str] = None
+        self._slash = False
+        self._star = False
+
+    def feed(self, text: str) -> list[dict]:
+        objects: list[dict] = []
+        for ch in text:
+            if self.closed:
+                break
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                    self._depth = 1
+                continue
+
+            if self._comment == "line":
+                if ch == "\n":
+                    self._comment = None
+                continue
+            if self._comment == "block":
+                if self._star and ch == "/":
+                    self._comment = None
+                self._star = ch == "*"
+                continue
+
+            if self._quote is not None:
+                self._buffer.append(ch)
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == self._quote:
+                    self._quote = None
+                continue
+
+            if self._slash:
+                self._slash = False
+                if ch == "/":
+                    self._comment = "line"
+                    continue
+                if ch == "*":
+                    self._comment = "block"
+                    self._star = False
+                    continue
+                raise ValueError("unexpected '/' in model output")
+            if ch == "/":
+                self._slash = True
+                continue
+
+            if self._depth == 1:
+                if ch.isspace() or ch == ",":
+                    continue
+                if ch == "]":
+                    self._depth = 0
+                    self.closed = True
+                    continue
+                if ch != "{":
+                    raise ValueError(f"expected an answer object, got {ch!r}")
+
+            if ch in "'\"":
+                self._quote = ch
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+            self._buffer.append(ch)
+
+            if self._depth == 1:
+                objects.append(self._parse_object("".join(self._buffer)))
+                self._buffer.clear()
+
+        return objects
+
+    def close(self) -> None:
+        if not self.started:
+            raise ValueError("model output contains no answer array")
+        if not self.closed:
+            raise ValueError("model output ended before the answer array was closed")
+
+    @staticmethod
+    def _parse_object(text: str) -> dict:
+        value = json5.loads(text)
+        if not isinstance(value, dict):
+            raise ValueError(f"expected an answer object, got {text!r}")
+        return value
+
+
+def build_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT}]},
+        {"role": "user", "content": [{"type": "text", "text": prompt}]},
+    ]
+
+
+def validate_answer(answer: dict) -> dict:
+    index = answer.get("index")
+    if not isinstance(index, int) or index < 1:
+        raise ValueError(f"answer has an invalid index: {answer}")
+    if not isinstance(answer.get("type"), str):
+        raise ValueError(f"answer {index} has an invalid type: {answer}")
+    if not isinstance(answer.get("content"), str):
+        raise ValueError(f"answer {index} has an invalid content: {answer}")
+    return answer
+
+
+def post_process_answer(answer: dict, split_alternatives: bool) -> bool:
+    """Fixes up the type (and with `split_alternatives`, the "a/b" content) of
+    an answer. Returns whether anything was changed."""
+    if len(answer["content"]) >= 2:
+        if answer["type"] != "fill-in-blanks":
+            answer["type"] = "fill-in-blanks"
+            return True
+        if split_alternatives and "/" in answer["content"]:
+            answer["content"] = answer["content"].split("/")
+            return True
+    elif "A" <= answer["content"].upper() <= "D":
+        answer["type"] = "choice|fill-in-blanks"
+        return True
+    elif "E" <= answer["content"].upper() <= "Z":
+        answer["type"] = "fill-in-blanks"
+        return True
+    return False
+
+
+def _stream_answers(
+    progress,
+    client: AIClient,
+    messages: list[dict],
+    sampling: dict,
+    cached: Optional[str],
+    split_alternatives: bool,
+    answers: list[dict],
+    stats: dict,
+    cancelled: Optional[threading.Event] = None,
+) -> None:
+    task_id = None
+    if progress is not None:
+        task_id = progress.add_task("[cyan]Receiving answers...", total=None)
+
+    parser = AnswerArrayParser()
+    received: list[str] = []
+
+    def consume(text: str) -> None:
+        received.append(text)
+        stats["chars"] += len(text)
+        for answer in parser.feed(text):
+            answers.append(validate_answer(answer))
+            if post_process_answer(answer, split_alternatives):
+                stats["post_processed"] += 1
+            if progress is not None:
+                progress.update(task_id, completed=len(answers))
+
+    if cached is not None:
+        consume(cached)
+        parser.close()
+        return
+
+    if cancelled is not None and cancelled.is_set():
+        return
+
+    if not client.stream:
+        response = client.client.chat.completions.create(
+            model=client.selected_model, messages=messages, **sampling  # type: ignore
+        )
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("model returned null")
+        consume(content)
+        parser.close()
+        stats["output"] = "".join(received)
+        return
+
+    # leaving the block closes the connection, so malformed output stops the
+    # generation instead of being paid for until the end
+    with client.client.chat.completions.create(
+        model=client.selected_model,
+        messages=messages,  # type: ignore
+        stream=True,
+        **sampling,
+    ) as stream:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                consume(content)
+            if parser.closed:
+                break
+            if cancelled is not None and cancelled.is_set():
+                return
+    parser.close()
+    stats["output"] = "".join(received)
+
+
+def _stream_parts(
+    progress,
+    client: AIClient,
+    parts: list[dict],
+    sampling: dict,
+    split_alternatives: bool,
+) -> None:
+    if len(parts) == 1:
+        part = parts[0]
+        _stream_answers(
+            progress,
+            client,
+            part["messages"],
+            sampling,
+            part["cached"],
+            split_alternatives,
+            part["answers"],
+            part["stats"],
+        )
+        return
+
+    # a pool of their own: the caller may itself be running on the shared
+    # thread pool, and the parts must not queue behind it
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(
+        max_workers=len(parts), thread_name_prefix="ehh-answers"
+    )
+    try:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _stream_answers,
+                progress,
+                client,
+                part["messages"],
+                sampling,
+                part["cached"],
+                split_alternatives,
+                part["answers"],
+                part["stats"],
+                cancelled,
+            )
+            for part in parts
+        ]
+        # every part is done unless one of them failed
+        wait(futures, return_when=FIRST_EXCEPTION)
+        for future in futures:
+            if future.done():
+                future.result()
+    except BaseException:
+        # the answers are useless without every part; stop paying for the rest
+        cancelled.set()
+        raise
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def merge_parts(
+    parts: list[list[dict]], prompts: Optional[list[AnswerPrompt]] = None
+) -> list[dict]:
+    """Concatenates the answers of prompt parts in order, numbering the
+    answers of each part after the blanks of the parts before it.
+
+    A part may number its answers from 1 or, if it has one blank per
+    question, by the question numbers of the paper. `ValueError` is raised
+    if its indices fit neither, as the answers would otherwise be filled
+    into the wrong blanks.
+    """
+    if len(parts) == 1:
+        return parts[0]
+    if prompts is None or len(prompts) != len(parts):
+        raise ValueError("the prompt of each part is required to merge")
+
+    merged = []
+    offset = 0
+    for i, (answers, prompt) in enumerate(zip(parts, prompts), 1):
+        if prompt.blanks is None:
+            raise ValueError(f"the blanks of part {i} are unknown")
+        positions = {}
+        if prompt.blanks == len(prompt.questions):
+            positions = {
+                number: position for position, number in enumerate(prompt.questions, 1)
+            }
+        indices = [answer["index"] for answer in answers]
+        if all(1 <= index <= prompt.blanks for index in indices):
+            renumber = lambda index: index
+        elif positions and all(index in positions for index in indices):
+            renumber = positions.__getitem__
+        else:
+            outside = sorted(
+                index
+                for index in indices
+                if not 1 <= index <= prompt.blanks and index not in positions
+            )
+            raise ValueError(
+                f"answers {outside} of part {i} are outside its {prompt.blanks} blanks"
+            )
+
+        for answer in answers:
+            answer["index"] = renumber(answer["index"]) + offset
+        merged.extend(answers)
+        offset += prompt.blanks
+    return merged
+
+
+def request_answers(
+    client: AIClient,
+    prompt: str | list[AnswerPrompt],
+    split_alternatives: bool = True,
+    use_cache: bool = True,
+    sampling: Optional[dict] = None,
+) -> Optional[list[dict]]:
+    """Asks the model to answer `prompt`, validating and post-processing each
+    answer as soon as it has been received.
+
+    A list of prompts (see `prompts.build_answer_prompts`) is sent as parallel
+    requests and their answers are merged in order.
+
+    Outputs are cached by prompt, model and `sampling` (extra arguments for
+    the completion request); `use_cache=False` skips the lookup but still
+    stores the fresh output.
+    """
+    print(f"<info> current AI client: {client.describe()}")
+
+    sampling = sampling or {}
+    prompts = [AnswerPrompt(prompt, [])] if isinstance(prompt, str) else prompt
+    parts = []
+    for part_prompt in prompts:
+        messages = build_messages(part_prompt.text)
+        cache_key = CompletionCache.make_key(client.selected_model, messages, sampling)
+        parts.append(
+            {
+                "messages": messages,
+                "cache_key": cache_key,
+                "cached": completion_cache.get(cache_key) if use_cache else None,
+                "answers": [],
+                "stats": {"chars": 0, "post_processed": 0, "output": None},
+            }
+        )
+    missing = sum(1 for part in parts if part["cached"] is None)
+    if missing == 0:
+        print("<info> reusing cached model response")
+    elif len(parts) == 1:
+        print("<info> requesting model for a response (this may take a while)...")
+    else:
+        print(
+            f"<info> requesting model for {missing} of {len(parts)} parts in parallel (this may take a while)..."
+        )
+
+    try:
+        globalvars.context.messenger.send_progress(
+            _stream_parts, client, parts, sampling, split_alternatives
+        )
+    except openai.APIError as e:
+        print(f"<error> api returned error: {e}")
+        body = e.body if isinstance(e.body, dict) else None
+        if (
+            body is not None
+            and isinstance(body.get("error", None), dict)
+            and body["error"].get("message", None)
+            == "User location is not supported for the API use."
+        ):
+            print("<tip> try changing your proxy endpoint to a different location")
+        return None
+    except ValueError as e:
+        print(f"<error> model result is not valid json: {e}")
+        return None
+
+    try:
+        answers = merge_parts([part["answers"] for part in parts], prompts)
+    except ValueError as e:
+        print(f"<error> failed to merge answers of the prompt parts: {e}")
+        return None
+    chars = sum(part["stats"]["chars"] for part in parts)
+    post_processed = sum(part["stats"]["post_processed"] for part in parts)
+    print(
+        f"<success> model result is valid; {len(answers)} answers totalling {chars} chars in length"
+    )
+    print(f"<info> post-processed model result for {post_processed} times")
+
+    for part in parts:
+        if part["stats"]["output"] is None:
+            continue
+        try:
+            completion_cache.put(part["cache_key"], part["stats"]["output"])
+        except OSError as e:
+            print(f"<warning> failed to cache model response: {e}")
+    if use_cache:
+        print(f"<info> completion cache: {completion_cache.describe()}")
+    return answers
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from ..fs import CACHE_DIR
+
+COMPLETION_CACHE_DIR = CACHE_DIR / "completions"
+MAX_COMPLETION_CACHE_BYTES = 32 * 1024 * 1024
+# bump when the cached content or the key layout changes
+CACHE_VERSION = 1
+
+
+class CompletionCache:
+    """Model outputs stored on disk, keyed by everything that determines them:
+    the rendered messages, the model and the sampling parameters.
+
+    Reads refresh an entry's mtime, and writes evict the least recently used
+    entries once the directory grows past `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: Path = COMPLETION_CACHE_DIR,
+        max_bytes: int = MAX_COMPLETION_CACHE_BYTES,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, messages: list[dict], sampling: dict) -> str:
+        payload = json.dumps(
+            {
+                "version": CACHE_VERSION,
+                "model": model,
+                "messages": messages,
+                "sampling": sampling,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            content = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(content, encoding="utf-8")
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def describe(self) -> str:
+        total = self.hits + self.misses
+        rate = f"{self.hits / total:.0%}" if total else "n/a"
+        return f"{self.hits} hits / {self.misses} misses ({rate} hit rate)"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.txt"
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith(".txt"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+
+
+completion_cache = CompletionCache()
@@ -0,0 +1,105 @@
+import threading
+from typing import Iterable, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from ..executors import get_thread_pool
+
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+WARM_UP_TIMEOUT = 10
+
+
+class OpenAIClientRegistry:
+    """Process-wide OpenAI clients, one per `(api_url, api_key)`.
+
+    All clients share one connection pool (one sync and one async), so
+    connections to an endpoint survive re-selecting or re-creating the
+    `AIClient`s that use them. Async clients are meant for the background loop
+    of `executors.run_coroutine`, since their connections bind to the loop
+    they are first used on.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+    ) -> None:
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self._lock = threading.Lock()
+        self._http_client: Optional[httpx.Client] = None
+        self._async_http_client: Optional[httpx.AsyncClient] = None
+        self._clients: dict[tuple[str, str], OpenAI] = {}
+        self._async_clients: dict[tuple[str, str], AsyncOpenAI] = {}
+
+    def get(self, api_url: str, api_key: str) -> OpenAI:
+        with self._lock:
+            client = self._clients.get((api_url, api_key))
+            if client is None:
+                if self._http_client is None:
+                    self._http_client = DefaultHttpxClient(limits=self.limits)
+                client = OpenAI(
+                    api_key=api_key, base_url=api_url, http_client=self._http_client
+                )
+                self._clients[(api_url, api_key)] = client
+            return client
+
+    def get_async(self, api_url: str, api_key: str) -> AsyncOpenAI:
+        with self._lock:
+            client = self._async_clients.get((api_url, api_key))
+            if client is None:
+                if self._async_http_client is None:
+                    self._async_http_client = DefaultAsyncHttpxClient(
+                        limits=self.limits
+                    )
+                client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=api_url,
+                    http_client=self._async_http_client,
+                )
+                self._async_clients[(api_url, api_key)] = client
+            return client
+
+    def warm(self, endpoints: Iterable[tuple[str, str]]) -> None:
+        """Creates the clients of `endpoints` and opens a connection to each in
+        the background, so the first request skips the DNS and TLS setup."""
+        for api_url, api_key in set(endpoints):
+            client = self.get(api_url, api_key)
+            self.get_async(api_url, api_key)
+            get_thread_pool().submit(self._warm_one, client)
+
+    @staticmethod
+    def _warm_one(client: OpenAI) -> None:
+        try:
+            client.with_options(max_retries=0, timeout=WARM_UP_TIMEOUT).models.list()
+        except openai.OpenAIError:
+            # only the connection matters; gateways may not list models
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            # the async pool is dropped rather than closed: closing needs the
+            # loop it was used on
+            self._async_http_client = None
+            self._clients.clear()
+            self._async_clients.clear()
+
+
+openai_clients = OpenAIClientRegistry()
+
+
+def warm_ai_clients(config) -> None:
+    """Warms the clients of every endpoint in `ai_client.all`."""
+    ai_client_config = getattr(config, "ai_client", None)
+    openai_clients.warm(
+        (entry.api_url, entry.api_key)
+        for entry in getattr(ai_client_config, "all", None) or []
+    )
@@ -0,0 +1,295 @@
+import asyncio
+from collections import Counter
+from typing import Optional
+
+import openai
+from munch import Munch
+
+from ...models.ai_client import AIClient
+from ..executors import run_coroutine
+from ..logging import print
+from .answers import (
+    AnswerArrayParser,
+    build_messages,
+    merge_parts,
+    post_process_answer,
+    validate_answer,
+)
+from .cache import CompletionCache, completion_cache
+from .prompts import AnswerPrompt
+from ... import globalvars
+
+
+def load_ensemble(config: Munch) -> list[AIClient]:
+    """Builds the members listed under `ai_ensemble.members`, each a
+    `{client: <index into ai_client.all>, model: <index into its models>}`.
+
+    Raises `ValueError` for a member that does not point at a configured
+    client and model."""
+    ensemble_config = getattr(config, "ai_ensemble", None) or Munch()
+    clients = config.ai_client.all
+    members = []
+    for i, entry in enumerate(getattr(ensemble_config, "members", None) or [], 1):
+        client_index = getattr(entry, "client", None)
+        if not isinstance(client_index, int) or not 0 <= client_index < len(clients):
+            raise ValueError(
+                f"ensemble member {i} refers to AI client {client_index}, but only {len(clients)} are configured"
+            )
+        client = AIClient.from_dict(clients[client_index])
+        model_index = getattr(entry, "model", None)
+        if not isinstance(model_index, int) or not 0 <= model_index < len(
+            client.models
+        ):
+            raise ValueError(
+                f"ensemble member {i} refers to model {model_index} of AI client {client_index}, which has {len(client.models)}"
+            )
+        client.selected_model_index = model_index
+        members.append(client)
+    return members
+
+
+def _vote_key(content) -> tuple | str:
+    if isinstance(content, list):
+        return tuple(_vote_key(item) for item in content)
+    return " ".join(str(content).split()).casefold()
+
+
+class _Ballot:
+    # per-question votes of the members whose responses came back complete
+    # and valid; a member that fails midway never gets to vote
+
+    def __init__(self, quorum: int) -> None:
+        self.quorum = quorum
+        self.votes: dict[int, Counter] = {}
+        self.first_answers: dict[tuple, dict] = {}
+        # questions seen in at least one complete response
+        self.questions: set[int] = set()
+
+    def add(self, answers: list[dict]) -> None:
+        for answer in answers:
+            key = _vote_key(answer["content"])
+            self.votes.setdefault(answer["index"], Counter())[key] += 1
+            self.first_answers.setdefault((answer["index"], key), answer)
+        self.questions.update(answer["index"] for answer in answers)
+
+    @property
+    def settled(self) -> bool:
+        return bool(self.questions) and all(
+            self._top(index)[1] >= self.quorum for index in self.questions
+        )
+
+    def _top(self, index: int) -> tuple:
+        votes = self.votes.get(index)
+        return votes.most_common(1)[0] if votes else (None, 0)
+
+    def result(self) -> tuple[list[dict], dict[int, tuple[int, int]]]:
+        answers = []
+        agreement = {}
+        for index in sorted(self.questions or self.votes):
+            key, count = self._top(index)
+            if key is None:
+                continue
+            answers.append(self.first_answers[(index, key)])
+            agreement[index] = (count, sum(self.votes[index].values()))
+        return answers, agreement
+
+
+async def _ask_member(
+    client: AIClient,
+    messages: list[dict],
+    split_alternatives: bool,
+    use_cache: bool,
+    ballot: _Ballot,
+    settled: asyncio.Event,
+    on_answer,
+) -> None:
+    parser = AnswerArrayParser()
+    received: list[str] = []
+    answers: list[dict] = []
+
+    def consume(text: str) -> None:
+        received.append(text)
+        for answer in parser.feed(text):
+            answer = validate_answer(answer)
+            post_process_answer(answer, split_alternatives)
+            answers.append(answer)
+            on_answer(len(answers))
+
+    cache_key = CompletionCache.make_key(client.selected_model, messages, {})
+    cached = completion_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        consume(cached)
+    elif not client.stream:
+        response = await client.async_client.chat.completions.create(
+            model=client.selected_model, messages=messages  # type: ignore
+        )
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("model returned null")
+        consume(content)
+    else:
+        stream = await client.async_client.chat.completions.create(
+            model=client.selected_model, messages=messages, stream=True  # type: ignore
+        )
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    consume(chunk.choices[0].delta.content)
+                if parser.closed:
+                    break
+    parser.close()
+
+    if cached is None:
+        try:
+            completion_cache.put(cache_key, "".join(received))
+        except OSError as e:
+            print(f"<warning> failed to cache model response: {e}")
+    # only now: answers of a response that fails validation midway, or
+    # breaks off, must not count towards the quorum
+    ballot.add(answers)
+    if ballot.settled:
+        settled.set()
+
+
+async def _run_ensemble(
+    progress,
+    members: list[AIClient],
+    messages: list[dict],
+    split_alternatives: bool,
+    use_cache: bool,
+    ballot: _Ballot,
+) -> int:
+    settled = asyncio.Event()
+    tasks: dict[asyncio.Task, AIClient] = {}
+    for client in members:
+        on_answer = lambda count: None
+        if progress is not None:
+            task_id = progress.add_task(f"[cyan]{client.selected_model}", total=None)
+            on_answer = lambda count, task_id=task_id: progress.update(
+                task_id, completed=count
+            )
+        task = asyncio.create_task(
+            _ask_member(
+                client,
+                messages,
+                split_alternatives,
+                use_cache,
+                ballot,
+                settled,
+                on_answer,
+            )
+        )
+        tasks[task] = client
+
+    settled_waiter = asyncio.create_task(settled.wait())
+    pending = set(tasks)
+    succeeded = 0
+    try:
+        while pending and not settled.is_set():
+            done, pending = await asyncio.wait(
+                pending | {settled_waiter}, return_when=asyncio.FIRST_COMPLETED
+            )
+            done.discard(settled_waiter)
+            pending.discard(settled_waiter)
+            for task in done:
+                e = task.exception()
+                if e is None:
+                    succeeded += 1
+                elif isinstance(e, (openai.APIError, ValueError)):
+                    print(f"<warning> {tasks[task].selected_model} failed: {e}")
+                else:
+                    raise e
+    finally:
+        # once every question has a quorum the stragglers cannot change it
+        for task in pending | {settled_waiter}:
+            task.cancel()
+        await asyncio.gather(*pending, settled_waiter, return_exceptions=True)
+
+    if pending:
+        print(
+            f"<info> quorum reached; stopped waiting for {', '.join(tasks[task].selected_model for task in pending)}"
+        )
+    return succeeded
+
+
+def _request_part(
+    members: list[AIClient],
+    prompt: str,
+    split_alternatives: bool,
+    quorum: int,
+    use_cache: bool,
+) -> Optional[list[dict]]:
+    ballot = _Ballot(quorum)
+    result: list[int] = []
+
+    def run(progress) -> None:
+        result.append(
+            run_coroutine(
+                _run_ensemble(
+                    progress,
+                    members,
+                    build_messages(prompt),
+                    split_alternatives,
+                    use_cache,
+                    ballot,
+                )
+            )
+        )
+
+    globalvars.context.messenger.send_progress(run)
+    if not result or result[0] == 0 and not ballot.settled:
+        print("<error> no model returned a valid response")
+        return None
+
+    answers, agreement = ballot.result()
+    unanimous = sum(1 for agreed, voted in agreement.values() if agreed == voted)
+    print(
+        f"<success> merged {len(answers)} answers; {unanimous}/{len(agreement)} unanimous"
+    )
+    disputed = [
+        f"{index} ({agreed}/{voted})"
+        for index, (agreed, voted) in agreement.items()
+        if agreed < quorum
+    ]
+    if disputed:
+        print(f"<warning> no quorum on questions: {', '.join(disputed)}")
+    return answers
+
+
+def request_ensemble_answers(
+    members: list[AIClient],
+    prompt: str | list[AnswerPrompt],
+    split_alternatives: bool = True,
+    quorum: Optional[int] = None,
+    use_cache: bool = True,
+) -> Optional[list[dict]]:
+    """Asks all `members` concurrently and merges their answers by per-question
+    majority vote.
+
+    Returns as soon as `quorum` members (by default a majority) agree on every
+    question of a complete response, without waiting for the rest. The parts
+    of a split prompt are voted on one after another.
+    """
+    if quorum is None:
+        ensemble_config = getattr(globalvars.context.config, "ai_ensemble", None)
+        quorum = getattr(ensemble_config, "quorum", None) or len(members) // 2 + 1
+    print(
+        f"<info> asking {len(members)} models: {', '.join(m.selected_model for m in members)} (quorum {quorum})"
+    )
+
+    prompts = [AnswerPrompt(prompt, [])] if isinstance(prompt, str) else prompt
+    parts = []
+    for i, part_prompt in enumerate(prompts):
+        if len(prompts) > 1:
+            print(f"<info> part {i + 1} of {len(prompts)}")
+        answers = _request_part(
+            members, part_prompt.text, split_alternatives, quorum, use_cache
+        )
+        if answers is None:
+            return None
+        parts.append(answers)
+    try:
+        return merge_parts(parts, prompts)
+    except ValueError as e:
+        print(f"<error> failed to merge answers of the prompt parts: {e}")
+        return None
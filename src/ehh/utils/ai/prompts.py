@@ -0,0 +1,261 @@
+import functools
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from ..constants import GENERATE_ANSWERS_PROMPT, GENERATE_ANSWERS_WITH_LISTENING_PROMPT
+from ..logging import print
+from .. import feature_flags
+
+DEFAULT_MAX_PROMPT_TOKENS = 8000
+# repeated instructions and headings shorter than this are kept
+MIN_REPEATED_LINE_LENGTH = 16
+
+WHITESPACE_PATTERN = re.compile(r"[^\S\n]+")
+CJK_PATTERN = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# page chrome that ends up in the extracted paper text; english words on a
+# line of their own are left alone, as they are as likely to be a word bank
+BOILERPLATE_PATTERN = re.compile(
+    r"^(?:上一题|下一题|上一页|下一页|返回|提交|交卷|保存|答题卡|收起|展开|"
+    r"第\s*\d+\s*页|共\s*\d+\s*[页题]|\d+\s*/\s*\d+|page\s+\d+(?:\s+of\s+\d+)?)$",
+    re.IGNORECASE,
+)
+SECTION_HEADING_PATTERN = re.compile(
+    r"^(?:[IVX]+\s*[.、．]|[一二三四五六七八九十]+\s*[.、．]|"
+    r"(?:part|section)\s+\w+|第[一二三四五六七八九十\d]+(?:部分|节|大题))",
+    re.IGNORECASE,
+)
+QUESTION_PATTERN = re.compile(r"^(\d+)\s*[.．、)）]")
+# a blank to fill in: underscores or empty brackets
+BLANK_PATTERN = re.compile(r"_{2,}|[(（]\s*[)）]")
+OPTION_PATTERN = re.compile(r"^[A-H]\s*[.．、)）]")
+# directions of a section, which pages repeat above every group of questions
+INSTRUCTION_PATTERN = re.compile(
+    r"^(?:directions?|instructions?|read|listen|choose|complete|fill|answer|"
+    r"match|write|根据|阅读|听|选择|从|请|用所给|补全|完成)",
+    re.IGNORECASE,
+)
+LISTENING_PATTERN = re.compile(r"听|listen", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    import tiktoken  # type: ignore
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # models behind openai-compatible gateways are unknown to tiktoken
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens of `text` for `model`; estimated when tiktoken is not installed."""
+    if feature_flags.TIKTOKEN:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    # about one token per CJK character and per four other characters
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _is_instruction(line: str) -> bool:
+    if QUESTION_PATTERN.match(line) or OPTION_PATTERN.match(line):
+        return False
+    return bool(INSTRUCTION_PATTERN.match(line) or SECTION_HEADING_PATTERN.match(line))
+
+
+def compact_text(text: str) -> str:
+    """Deduplicates whitespace and drops navigation text and repeated
+    instructions from extracted paper text."""
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        line = WHITESPACE_PATTERN.sub(" ", line).strip()
+        if not line or BOILERPLATE_PATTERN.match(line):
+            continue
+        # only directions and headings are repeats of each other; an option
+        # or a sentence of the passage that reappears is part of the paper
+        if len(line) >= MIN_REPEATED_LINE_LENGTH and _is_instruction(line):
+            if line in seen:
+                continue
+            seen.add(line)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _split_lines(lines: list[str], pattern: re.Pattern) -> list[list[str]]:
+    groups: list[list[str]] = []
+    for line in lines:
+        if not groups or pattern.match(line):
+            groups.append([])
+        groups[-1].append(line)
+    return groups
+
+
+def split_question_groups(text: str, model: str, max_tokens: int) -> list[str]:
+    """Splits `text` at section headings, and sections still larger than
+    `max_tokens` at question numbers.
+
+    The questions of a split section are packed into groups that each repeat
+    the section's heading and passage, since they cannot be answered without
+    them.
+    """
+    groups = []
+    for section in _split_lines(text.splitlines(), SECTION_HEADING_PATTERN):
+        section_text = "\n".join(section)
+        if count_tokens(section_text, model) <= max_tokens:
+            groups.append(section_text)
+            continue
+
+        questions = [
+            "\n".join(lines) for lines in _split_lines(section, QUESTION_PATTERN)
+        ]
+        preamble = ""
+        if not QUESTION_PATTERN.match(questions[0]):
+            preamble = questions.pop(0)
+        if not questions or count_tokens(preamble, model) > max_tokens:
+            groups.append(section_text)
+            continue
+
+        current: list[str] = []
+        for question in questions:
+            candidate = "\n".join(filter(None, [preamble, *current, question]))
+            if current and count_tokens(candidate, model) > max_tokens:
+                groups.append("\n".join(filter(None, [preamble, *current])))
+                current = []
+            current.append(question)
+        groups.append("\n".join(filter(None, [preamble, *current])))
+    return groups
+
+
+@dataclass(slots=True)
+class AnswerPrompt:
+    """One part of a split answer prompt."""
+
+    text: str
+    # printed numbers of the numbered questions in the part, in order
+    questions: list[int]
+    # answers the part asks for (see `count_blanks`); the answers of later
+    # parts are numbered after them
+    blanks: Optional[int] = None
+
+
+def question_numbers(text: str) -> list[int]:
+    numbers = []
+    for line in text.splitlines():
+        match = QUESTION_PATTERN.match(line)
+        if match:
+            numbers.append(int(match.group(1)))
+    return numbers
+
+
+def count_blanks(text: str) -> Optional[int]:
+    """The answers `text` asks for: one per numbered question (or one per
+    blank, for a question with several) and one per blank of a passage
+    without numbered questions.
+
+    `None` if that cannot be told, such as for a passage with blanks that is
+    followed by numbered questions (a cloze whose blanks are listed again
+    with their options, or questions on top of the blanks).
+    """
+    count = 0
+    for section in _split_lines(text.splitlines(), SECTION_HEADING_PATTERN):
+        blocks = ["\n".join(lines) for lines in _split_lines(section, QUESTION_PATTERN)]
+        passage_blanks = 0
+        if not QUESTION_PATTERN.match(blocks[0]):
+            passage_blanks = len(BLANK_PATTERN.findall(blocks.pop(0)))
+        if passage_blanks and blocks:
+            return None
+        count += passage_blanks + sum(
+            max(1, len(BLANK_PATTERN.findall(block))) for block in blocks
+        )
+    return count
+
+
+def _render(questions: str, transcription: Optional[str]) -> str:
+    if transcription is None:
+        return GENERATE_ANSWERS_PROMPT.replace("{questions}", questions)
+    return GENERATE_ANSWERS_WITH_LISTENING_PROMPT.replace(
+        "{transcription}", transcription
+    ).replace("{questions}", questions)
+
+
+def build_answer_prompts(
+    questions: str,
+    transcription: Optional[str],
+    model: str,
+    max_tokens: Optional[int] = None,
+) -> list[AnswerPrompt]:
+    """Renders the prompts answering `questions`, compacted and split into as
+    many parts as needed to keep each under `max_tokens`.
+
+    Each part numbers its answers from 1; `answers.merge_parts` renumbers them
+    by the blanks of the parts before it. Questions whose blanks cannot be
+    counted are sent as a single prompt, whatever its size. The transcription
+    only goes with the parts that contain listening sections (or the first
+    part, if none is recognized).
+    """
+    max_tokens = max_tokens or DEFAULT_MAX_PROMPT_TOKENS
+    original_tokens = count_tokens(_render(questions, transcription), model)
+    questions = compact_text(questions)
+    if transcription is not None:
+        transcription = WHITESPACE_PATTERN.sub(" ", transcription).strip()
+
+    prompt = _render(questions, transcription)
+    tokens = count_tokens(prompt, model)
+    if tokens <= max_tokens:
+        print(f"<info> prompt is {tokens} tokens (compacted from {original_tokens})")
+        return [AnswerPrompt(prompt, question_numbers(questions))]
+
+    whole = AnswerPrompt(prompt, question_numbers(questions))
+
+    overhead = count_tokens(_render("", transcription), model)
+    groups = split_question_groups(questions, model, max_tokens - overhead)
+    listening = [bool(LISTENING_PATTERN.search(group)) for group in groups]
+    if transcription is not None and not any(listening):
+        listening[0] = True
+
+    # pack consecutive groups, starting a new part whenever the next group
+    # does not fit or needs the transcription while the current part has not
+    parts: list[tuple[list[str], bool]] = []
+    for group, needs_transcription in zip(groups, listening):
+        if parts:
+            part_groups, part_listening = parts[-1]
+            merged = "\n".join(part_groups + [group])
+            with_transcription = transcription if part_listening else None
+            if needs_transcription == part_listening and (
+                count_tokens(_render(merged, with_transcription), model) <= max_tokens
+            ):
+                part_groups.append(group)
+                continue
+        parts.append(([group], needs_transcription))
+
+    if len(parts) == 1:
+        print(f"<warning> questions could not be split below {max_tokens} tokens")
+        return [whole]
+
+    prompts = []
+    for part_groups, part_listening in parts:
+        part_questions = "\n".join(part_groups)
+        blanks = count_blanks(part_questions)
+        if blanks is None:
+            # answers are placed by counting blanks; a guess would put them
+            # into the wrong ones
+            print(
+                f"<warning> cannot count the blanks of the questions; sending them as one prompt of {tokens} tokens"
+            )
+            return [whole]
+        prompts.append(
+            AnswerPrompt(
+                _render(part_questions, transcription if part_listening else None),
+                question_numbers(part_questions),
+                blanks,
+            )
+        )
+    part_tokens = [count_tokens(prompt.text, model) for prompt in prompts]
+    print(
+        f"<info> prompt split into {len(prompts)} parts of {', '.join(map(str, part_tokens))} tokens (compacted from {original_tokens})"
+    )
+    if max(part_tokens) > max_tokens:
+        print(f"<warning> some questions could not be split below {max_tokens} tokens")
+    return prompts
@@ -42,10 +42,26 @@ DIALOG_VIEW_COMPLETED_BUTTON_SELECTOR = "td.el-table_2_column_17 > div:nth-child
 VIEW_ORIGINAL_BUTTON_SELECTOR = (
     "td:nth-child(12) > div:nth-child(1) > div:nth-child(1) > button:nth-child(2)"
 )
+# cells of a homework row, by the name `get_hw_list` parses them under
+HOMEWORK_ROW_FIELD_SELECTORS = {
+    "title": TITLE_SELECTOR,
+    "start_time": START_TIME_SELECTOR,
+    "end_time": END_TIME_SELECTOR,
+    "teacher": TEACHER_SELECTOR,
+    "pass_score": PASS_SCORE_SELECTOR,
+    "current_score": CURRENT_SCORE_SELECTOR,
+    "total_score": TOTAL_SCORE_SELECTOR,
+    "teacher_words": TEACHER_WORDS_SELECTOR,
+    "status": STATUS_SELECTOR,
+}
 NEXT_PAGE_BUTTON_SELECTOR = ".btn-next"
 TOAST_SELECTOR = ".el-message"
+DIALOG_WRAPPER_SELECTOR = ".el-dialog__wrapper"
+DIALOG_CLOSE_BUTTON_SELECTOR = ".el-dialog__headerbtn"
+DIALOG_CLOSE_TIMEOUT = 3
 
 PAPER_SELECTOR = ".el-dialog__body"
+QUIZ_CONTAINER_ID = "taskContent"
 ANSWER_ROWS_SELECTOR = ".el-table--scrollable-y > div:nth-child(3) > table:nth-child(1) > tbody:nth-child(2) > tr"
 ANSWER_TEXT_SELECTOR = "td:nth-child(3) > div:nth-child(1) > span:nth-child(1)"
 
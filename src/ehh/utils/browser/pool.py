@@ -0,0 +1,267 @@
+import copy
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional, TypeVar
+
+from munch import Munch
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.ui import WebDriverWait
+
+from ..context.base import Context, Messenger
+from ..logging import print
+from ..webdriver import create_driver, get_profile_dir
+from ... import globalvars
+from .constants import URL_LOGIN
+
+T = TypeVar("T")
+
+READ_STORAGE_SCRIPT = """
+const entries = {};
+for (const storage of [window.localStorage, window.sessionStorage]) {
+    for (let i = 0; i < storage.length; i++) {
+        entries[storage.key(i)] = storage.getItem(storage.key(i));
+    }
+}
+return entries;
+"""
+
+# a fresh tab has nothing in session storage either; both get everything
+WRITE_STORAGE_SCRIPT = """
+for (const [key, value] of Object.entries(arguments[0])) {
+    window.localStorage.setItem(key, value);
+    window.sessionStorage.setItem(key, value);
+}
+"""
+
+COOKIE_KEYS = ("name", "value", "path", "domain", "secure", "httpOnly", "expiry")
+
+
+@dataclass(slots=True)
+class BrowserSession:
+    """What keeps a browser logged in: cookies of the site and its storage."""
+
+    cookies: list[dict] = field(default_factory=list)
+    storage: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def read(cls, driver: WebDriver) -> "BrowserSession":
+        return cls(
+            cookies=driver.get_cookies(),
+            storage=driver.execute_script(READ_STORAGE_SCRIPT) or {},
+        )
+
+    def apply(self, driver: WebDriver) -> None:
+        # cookies and storage can only be set on a page of the site
+        driver.get(URL_LOGIN)
+        driver.delete_all_cookies()
+        for cookie in self.cookies:
+            driver.add_cookie(
+                {key: cookie[key] for key in COOKIE_KEYS if key in cookie}
+            )
+        driver.execute_script(WRITE_STORAGE_SCRIPT, self.storage)
+
+
+class _PooledMessenger(Messenger):
+    # progress bars are live displays, and only one can be shown at a time
+
+    def __init__(self, messenger: Messenger) -> None:
+        self.messenger = messenger
+
+    def send_text(self, *args, **kwargs) -> None:
+        self.messenger.send_text(*args, **kwargs)
+
+    def send_table(self, *args, **kwargs) -> None:
+        self.messenger.send_table(*args, **kwargs)
+
+    def send_progress(self, func, *args, **kwargs) -> None:
+        func(None, *args, **kwargs)
+
+    def send_exception(self, exception: Exception) -> None:
+        self.messenger.send_exception(exception)
+
+
+class _Worker:
+    def __init__(self, driver: WebDriver, slot: int) -> None:
+        self.driver = driver
+        self.slot = slot
+        self.uses = 0
+        self.session_version = 0
+
+    def is_healthy(self) -> bool:
+        try:
+            # the cheapest command that still needs a live browser and session
+            self.driver.window_handles
+            return True
+        except WebDriverException:
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except WebDriverException:
+            pass
+
+
+class DriverPool:
+    """Extra browsers that share the login of the main one, so tasks on
+    different homework items can run side by side.
+
+    Drivers are started on first use. `sync_session` copies the cookies and
+    storage of the logged in main browser into a shared jar, and each driver
+    loads the jar the next time it is leased after a change. Each of the
+    `size` slots has its own profile directory, as a profile can only be open
+    in one browser at a time; `create_driver` gets the slot number. A driver that
+    fails its health check or breaks during a task is replaced; every driver
+    is also replaced after `max_uses` tasks, as long-running browsers keep
+    growing.
+    """
+
+    def __init__(
+        self,
+        create_driver: Callable[[int], Optional[WebDriver]],
+        size: int,
+        max_uses: int = 50,
+    ) -> None:
+        self.create_driver = create_driver
+        self.size = size
+        self.max_uses = max_uses
+        self._idle: queue.LifoQueue[_Worker] = queue.LifoQueue()
+        self._started = 0
+        self._free_slots = list(range(size))
+        self._lock = threading.Lock()
+        self._session = BrowserSession()
+        self._session_version = 0
+
+    def sync_session(self, driver: WebDriver) -> None:
+        session = BrowserSession.read(driver)
+        with self._lock:
+            self._session = session
+            self._session_version += 1
+        print(
+            f"<info> shared browser session with pool ({len(session.cookies)} cookies, {len(session.storage)} storage entries)"
+        )
+
+    def clear_session(self) -> None:
+        with self._lock:
+            self._session = BrowserSession()
+            self._session_version += 1
+
+    def _acquire(self) -> _Worker:
+        while True:
+            with self._lock:
+                start = self._started < self.size and self._idle.empty()
+                if start:
+                    self._started += 1
+                    slot = self._free_slots.pop(0)
+            if start:
+                return self._start_worker(slot)
+
+            worker = self._idle.get()
+            if worker.is_healthy():
+                return worker
+            print("<warning> pooled browser failed health check; replacing it")
+            self._discard(worker)
+
+    def _start_worker(self, slot: int) -> _Worker:
+        try:
+            driver = self.create_driver(slot)
+        except Exception as e:
+            print(f"<error> failed to start pooled browser: {e}")
+            driver = None
+        if driver is None:
+            with self._lock:
+                self._started -= 1
+                self._free_slots.append(slot)
+            raise RuntimeError("failed to start a pooled browser")
+        print(f"<info> started pooled browser {self._started}/{self.size}")
+        return _Worker(driver, slot)
+
+    def _discard(self, worker: _Worker) -> None:
+        # the profile is free for the replacement once the browser has quit
+        worker.quit()
+        with self._lock:
+            self._started -= 1
+            self._free_slots.append(worker.slot)
+
+    def _release(self, worker: _Worker, broken: bool) -> None:
+        if broken or worker.uses >= self.max_uses:
+            self._discard(worker)
+            print(
+                f"<info> recycled pooled browser ({'crashed' if broken else f'{worker.uses} tasks'})"
+            )
+            return
+        self._idle.put(worker)
+
+    @contextmanager
+    def lease(self, context: Context) -> Iterator[Context]:
+        """A copy of `context` that drives a pooled browser, logged in with the
+        shared session, for the duration of the block."""
+        worker = self._acquire()
+        broken = False
+        try:
+            with self._lock:
+                session, version = self._session, self._session_version
+            if worker.session_version != version:
+                session.apply(worker.driver)
+                worker.session_version = version
+
+            worker_context = copy.copy(context)
+            worker_context.messenger = _PooledMessenger(context.messenger)
+            worker_context.driver = worker.driver  # type: ignore
+            worker_context.wait = WebDriverWait(worker.driver, 15)  # type: ignore
+            # the page of the pooled browser, not the one of `context`
+            worker_context.navigation = None  # type: ignore
+            worker_context.driver_pool = None  # type: ignore
+
+            worker.uses += 1
+            yield worker_context
+        except WebDriverException:
+            broken = not worker.is_healthy()
+            raise
+        finally:
+            self._release(worker, broken)
+
+    def map(self, func: Callable[..., T], items: list[tuple]) -> list[T]:
+        """Runs `func(*item)` for every item on the pooled browsers, with
+        `globalvars.context` bound to a leased copy of the caller's context."""
+        context = globalvars.context
+
+        def run(item: tuple) -> T:
+            with self.lease(context) as worker_context:
+                bound = globalvars.bind_context(worker_context)
+                try:
+                    return func(*item)
+                finally:
+                    globalvars.unbind_context(bound)
+
+        with ThreadPoolExecutor(
+            max_workers=self.size, thread_name_prefix="ehh-browser"
+        ) as executor:
+            return list(executor.map(run, items))
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._discard(self._idle.get_nowait())
+
+
+def create_driver_pool(browser_config: Munch) -> Optional[DriverPool]:
+    """The pool set up by `browser.pool`, or `None` if it is disabled."""
+    pool_config = getattr(browser_config, "pool", None)
+    size = getattr(pool_config, "size", 0) or 0
+    if size <= 0:
+        return None
+    print(f"<info> browser pool enabled with {size} browsers")
+    # next to the profile of the main browser, which keeps that one open
+    profile_dir = get_profile_dir(browser_config)
+    return DriverPool(
+        lambda slot: create_driver(
+            browser_config,
+            profile_dir=profile_dir.with_name(f"{profile_dir.name}-pool-{slot}"),
+        ),
+        size,
+        getattr(pool_config, "max_uses", None) or 50,
+    )
@@ -1,13 +1,47 @@
+import os
+import atexit
+import tempfile
+import threading
+import time
 from pathlib import Path
+from typing import Callable, Optional
 
 import yaml
 import json5
-from munch import Munch, munchify
+from munch import Munch, munchify, unmunchify
 
 from .logging import print
 from .fs import CONFIG_DIR
 
 CONFIG_FILE = CONFIG_DIR / "config.yaml"
+DEFAULT_WATCH_INTERVAL = 2.0
+# a burst of changes is written once it has been quiet for WRITE_DELAY seconds,
+# but never later than WRITE_MAX_DELAY seconds after the first change
+WRITE_DELAY = 1.0
+WRITE_MAX_DELAY = 5.0
+
+
+class _ConfigLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):  # type: ignore
+    # libyaml when pyyaml was built with it; configs are plain data, so the
+    # safe loader is enough
+    pass
+
+
+def _construct_munch(loader: yaml.SafeLoader, node: yaml.MappingNode) -> dict:
+    return loader.construct_mapping(node, deep=True)
+
+
+# `save_config` used to dump Munch objects with their python tag
+_ConfigLoader.add_constructor("!munch.Munch", _construct_munch)
+
+# path -> ((mtime, size), parsed data); data is never handed out, only copies
+_parse_cache: dict[Path, tuple[tuple[int, int], dict]] = {}
+_parse_cache_lock = threading.Lock()
+
+
+def _file_stamp(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
 
 
 def load_config(path: str | Path = CONFIG_FILE) -> Munch:
@@ -19,13 +53,271 @@ def load_config(path: str | Path = CONFIG_FILE) -> Munch:
             f"Config file not found at {path}. Please create one based on config.json.example."
         )
 
-    with open(path, "rt", encoding="utf-8") as f:
-        return munchify(yaml.load(f, Loader=yaml.FullLoader))  # type: ignore
+    stamp = _file_stamp(path)
+    with _parse_cache_lock:
+        cached = _parse_cache.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, "rt", encoding="utf-8") as f:
+            data = yaml.load(f, Loader=_ConfigLoader)
+        if not isinstance(data, dict):
+            raise ValueError(f"config file '{path}' does not contain a mapping")
+        cached = (stamp, data)
+        with _parse_cache_lock:
+            _parse_cache[path] = cached
+
+    # munchify copies every mapping and list, so callers can modify the result
+    return munchify(cached[1])  # type: ignore
+
+
+class _ConfigDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):  # type: ignore
+    pass
+
+
+# path -> ((mtime, size), text) of the last write, to skip writes that change
+# nothing
+_written: dict[Path, tuple[tuple[int, int], str]] = {}
+_write_lock = threading.Lock()
+
+
+def _dump_config(config: dict) -> str:
+    # plain dicts, so the file carries no python tags
+    return yaml.dump(
+        unmunchify(config), Dumper=_ConfigDumper, allow_unicode=True, indent=2
+    )
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # a crash leaves either the old file or the new one, never half of it
+    fd, tmp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wt", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+    try:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+    except OSError:
+        return  # not possible on windows; the rename is still atomic there
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def save_config(config: Munch, path: str | Path = CONFIG_FILE) -> bool:
+    """Writes `config` to `path` unless the file already holds it. Returns
+    whether it wrote."""
+    path = Path(path)
+    text = _dump_config(config)
+    with _write_lock:
+        previous = None
+        if path.exists():
+            written = _written.get(path)
+            if written is not None and written[0] == _file_stamp(path):
+                previous = written[1]
+            else:
+                # changed by someone else since
+                previous = path.read_text("utf-8")
+        if text == previous:
+            return False
+        _write_atomic(path, text)
+        _written[path] = (_file_stamp(path), text)
+    config_service.note_saved(path)
+    return True
+
+
+class ConfigWriter:
+    """Writes the config in a background thread, coalescing bursts of
+    changes (selecting a client, then a model) into a single write.
+
+    `save` takes a copy of the config, as other threads may keep changing
+    it; serializing and writing happen later on the writer's thread. Pending
+    writes are flushed at exit.
+    """
+
+    def __init__(
+        self, delay: float = WRITE_DELAY, max_delay: float = WRITE_MAX_DELAY
+    ) -> None:
+        self.delay = delay
+        self.max_delay = max_delay
+        self._pending: dict[Path, dict] = {}
+        self._first_change: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def save(self, config: Munch, path: str | Path = CONFIG_FILE) -> None:
+        # plain dicts and lists, copied all the way down
+        snapshot = unmunchify(config)
+        with self._lock:
+            self._pending[Path(path)] = snapshot
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            delay = min(self.delay, self._first_change + self.max_delay - now)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(max(delay, 0), self.flush)
+            self._timer.name = "ehh-config-writer"
+            self._timer.daemon = True
+            self._timer.start()
+
+    def discard(self, path: str | Path = CONFIG_FILE) -> None:
+        # the file was changed on disk; that version wins over pending writes
+        with self._lock:
+            self._pending.pop(Path(path), None)
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._first_change = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        for path, config in pending.items():
+            try:
+                if save_config(config, path):
+                    print(f"<info> saved config to {path}")
+            except Exception as e:
+                print(f"<error> failed to save config to {path}: {e}")
+
+
+ConfigListener = Callable[[Munch, Munch], None]
+# stamp of a config file that does not exist
+_MISSING_STAMP = (-1, -1)
+
+
+class ConfigService:
+    """The config file as the running program sees it.
+
+    `load` parses the file once (again only when it changes on disk), and
+    `watch` polls its modification time, so edits made while the program runs
+    are picked up without a restart. Listeners get the old and the new config
+    after every reload and apply the difference to whatever they keep alive;
+    a file that fails to parse leaves the current config in place.
+
+    Reloads noticed by the watcher happen on its thread. Listeners that must
+    run on the main thread subscribe as `deferred` and are called when that
+    thread calls `apply_pending`.
+    """
+
+    def __init__(self, path: str | Path = CONFIG_FILE) -> None:
+        self.path = Path(path)
+        self.config: Optional[Munch] = None
+        self._stamp: Optional[tuple[int, int]] = None
+        self._listeners: list[ConfigListener] = []
+        self._deferred: list[ConfigListener] = []
+        # (config before the first, config after the last) unapplied reload
+        self._pending: Optional[tuple[Munch, Munch]] = None
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def load(self) -> Munch:
+        with self._lock:
+            if self.config is None:
+                try:
+                    stamp = _file_stamp(self.path)
+                except OSError:
+                    stamp = _MISSING_STAMP
+                # raises the not found error that explains what to do
+                self.config = load_config(self.path)
+                self._stamp = stamp
+            return self.config
+
+    def subscribe(self, listener: ConfigListener, deferred: bool = False) -> None:
+        with self._lock:
+            (self._deferred if deferred else self._listeners).append(listener)
+
+    def apply_pending(self) -> bool:
+        """Calls the deferred listeners with the reloads since the last call,
+        on the calling thread. Returns whether there were any."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+            listeners = list(self._deferred)
+        if pending is None:
+            return False
+        for listener in listeners:
+            try:
+                listener(*pending)
+            except Exception as e:
+                print(f"<error> failed to apply reloaded config: {e}")
+        return True
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-reads the file if it changed (or always, with `force`) and hands
+        the new config to the listeners. Returns whether it did."""
+        with self._lock:
+            try:
+                stamp = _file_stamp(self.path)
+            except OSError:
+                stamp = _MISSING_STAMP
+            if not force and stamp == self._stamp:
+                return False
+            try:
+                new = load_config(self.path)
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                # remembered, so the watcher reports each broken version once
+                self._stamp = stamp
+                print(f"<error> failed to reload config; keeping current one: {e}")
+                return False
+
+            old, self.config, self._stamp = self.config, new, stamp
+            old = old or new
+            config_writer.discard(self.path)
+            for listener in self._listeners:
+                try:
+                    listener(old, new)
+                except Exception as e:
+                    print(f"<error> failed to apply reloaded config: {e}")
+            if self._deferred:
+                self._pending = (self._pending[0] if self._pending else old, new)
+            return True
+
+    def note_saved(self, path: str | Path) -> None:
+        # the program's own writes are not changes to pick up
+        with self._lock:
+            if Path(path) == self.path and self.config is not None:
+                self._stamp = _file_stamp(self.path)
+
+    def watch(self) -> None:
+        """Starts polling the file for changes in a daemon thread, as often as
+        `config_watch.interval` says (`config_watch.enabled` turns it off)."""
+        config = self.load()
+        watch_config = getattr(config, "config_watch", None)
+        if not getattr(watch_config, "enabled", True):
+            return
+        interval = getattr(watch_config, "interval", None) or DEFAULT_WATCH_INTERVAL
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._stop.clear()
+            self._watcher = threading.Thread(
+                target=self._watch, args=(interval,), name="ehh-config", daemon=True
+            )
+            self._watcher.start()
+
+    def _watch(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            if self.reload():
+                print("<info> config file changed; reloaded it")
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            self._watcher = None
 
 
-def save_config(config: Munch, path: str | Path = CONFIG_FILE) -> None:
-    with open(path, "wt", encoding="utf-8") as f:
-        f.write(yaml.dump(munchify(config), allow_unicode=True, indent=2))
+config_service = ConfigService()
+config_writer = ConfigWriter()
+atexit.register(config_writer.flush)
 
 
 def migrate_config_if_needed() -> None:
@@ -10,6 +10,17 @@ COMPLETION_WORD_MAP = {
         "config",
         "exit",
     ],
+    ("list",): [
+        "status=",
+        "due_before=",
+        "due_after=",
+        "teacher=",
+        "score_min=",
+        "score_max=",
+        "title=",
+        "sort=",
+        "limit=",
+    ],
     ("audio",): ["download", "transcribe"],
     ("text",): ["display", "download"],
     ("answers",): ["download", "fill_in", "generate", "download_from_paper", "submit"],
@@ -1,15 +1,20 @@
+from typing import Optional
+
 from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support.ui import WebDriverWait
 
+from ...browser.pool import DriverPool
 from ..base import Context, Messenger
 
 
 class BrowserContext(Context):
     driver: WebDriver
     wait: WebDriverWait
+    driver_pool: Optional[DriverPool]
 
     def __init__(self, messenger: Messenger) -> None:
         super().__init__(messenger)
+        self.driver_pool = None
 
     def init_driver(self, driver: WebDriver) -> None:
         self.driver = driver
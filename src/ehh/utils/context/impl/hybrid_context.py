@@ -0,0 +1,16 @@
+from typing import Optional
+
+from ....models.api.token import Token
+from ..base import Messenger
+from .browser_context import BrowserContext
+
+
+class HybridContext(BrowserContext):
+    """A browser context that also talks to the API: the browser logs in, and
+    the token it gets is used for everything that does not need a page."""
+
+    token: Optional[Token]
+
+    def __init__(self, messenger: Messenger) -> None:
+        super().__init__(messenger)
+        self.token = None
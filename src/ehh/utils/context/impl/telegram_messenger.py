@@ -1,23 +1,340 @@
+import asyncio
+import html
+import io
+import itertools
+import threading
+from collections import deque
+from datetime import timedelta
+from typing import Callable, Optional
+
+from rich import box
+from rich.console import Console as RichConsole
+from rich.table import Table as RichTable
+from rich.text import Text as RichText
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import ExtBot
+
 from ..base import Messenger
+from ...logging import print
+from .... import globalvars
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TelegramRateLimiter:
+    """Spaces out API calls to stay under Telegram's flood limits: about one
+    message per second in a chat and 30 per second overall.
+
+    One instance should be shared by all messengers of a bot.
+    """
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1) -> None:
+        self.global_interval = 1 / global_rate
+        self.chat_interval = 1 / chat_rate
+        self._global_next = 0.0
+        self._chat_next: dict[int | str, float] = {}
+
+    async def acquire(self, chat_id: int | str) -> None:
+        loop = asyncio.get_running_loop()
+
+        # slots are reserved before sleeping and there is no await in between,
+        # so concurrent senders line up behind each other instead of racing
+        now = loop.time()
+        start = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = start + self.chat_interval
+        if len(self._chat_next) > 1024:
+            self._chat_next = {k: v for k, v in self._chat_next.items() if v > now}
+        if start > now:
+            await asyncio.sleep(start - now)
+
+        now = loop.time()
+        start = max(now, self._global_next)
+        self._global_next = start + self.global_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class _LiveMessage:
+    # a message whose text is rendered when it is sent, and that is edited in
+    # place when it is queued again afterwards
+    def __init__(self, render: Callable[[], str], parse_mode: Optional[str] = None):
+        self.render = render
+        self.parse_mode = parse_mode
+        self.message_id: Optional[int] = None
+        self.last_text: Optional[str] = None
+        self.queued = False
+
+
+class _TelegramProgress:
+    # the part of rich's Progress that `send_progress` callers use
+    BAR_WIDTH = 20
+
+    def __init__(self, on_change: Callable[[], None]) -> None:
+        self.on_change = on_change
+        self.tasks: dict[int, list] = {}
+        # parallel work (the parts of a split prompt) adds tasks from several
+        # threads at once
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def add_task(
+        self, description: str, total: Optional[float] = 100, completed: float = 0, **_
+    ) -> int:
+        with self._lock:
+            task_id = next(self._ids)
+            self.tasks[task_id] = [
+                RichText.from_markup(description).plain,
+                completed,
+                total,
+            ]
+        self.on_change()
+        return task_id
+
+    def update(
+        self,
+        task_id: int,
+        *,
+        advance: Optional[float] = None,
+        completed: Optional[float] = None,
+        total: Optional[float] = None,
+        description: Optional[str] = None,
+        **_,
+    ) -> None:
+        task = self.tasks[task_id]
+        if description is not None:
+            task[0] = RichText.from_markup(description).plain
+        if completed is not None:
+            task[1] = completed
+        if advance is not None:
+            task[1] += advance
+        if total is not None:
+            task[2] = total
+        self.on_change()
+
+    def render(self) -> str:
+        lines = []
+        for description, completed, total in list(self.tasks.values()):
+            if not total:
+                lines.append(f"{description} {completed:,.0f}")
+                continue
+            ratio = min(max(completed / total, 0.0), 1.0)
+            filled = round(ratio * self.BAR_WIDTH)
+            bar = "█" * filled + "░" * (self.BAR_WIDTH - filled)
+            lines.append(f"{description}\n{bar} {ratio:4.0%}")
+        return "\n".join(lines) or "..."
 
 
 class TelegramMessenger(Messenger):
-    def __init__(self, bot: ExtBot, chat_id: str | int) -> None:
+    """Sends output to a chat through an outbound queue.
+
+    Lines printed close together are merged into one message, and sends are
+    paced by a `TelegramRateLimiter`. Progress bars are a single message that
+    is edited as the work advances. `send_*` may be called from any thread;
+    the queue itself is only touched on the bot's event loop.
+    """
+
+    # lines printed within this window after a quiet period share one message
+    BATCH_WINDOW = 0.5
+    TABLE_WIDTH = 60
+    SEND_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        bot: ExtBot,
+        chat_id: str | int,
+        rate_limiter: Optional[TelegramRateLimiter] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
         self.bot = bot
         self.chat_id = chat_id
+        self.rate_limiter = rate_limiter or TelegramRateLimiter()
+        self.loop = loop or asyncio.get_running_loop()
+        self._queue: deque[str | _LiveMessage] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_now = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
 
     def send_text(self, *args, **kwargs):
-        format_mode = kwargs.get("format_mode")
-        try:
-            if format_mode is None:
-                self.bot.send_message(chat_id=self.chat_id, text=args[0])
-            else:
-                self.bot.send_message(
-                    chat_id=self.chat_id, text=args[0], format_mode=format_mode
-                )
-        except Exception as e:
-            print(f"<error> failed to send Telegram message: {e}")
+        text = str(args[0]) if args else ""
+        parse_mode = kwargs.get("parse_mode", kwargs.get("format_mode"))
+        if parse_mode is None:
+            self._submit(text)
+        else:
+            self._submit(_LiveMessage(lambda: text, parse_mode))
+
+    def send_table(
+        self,
+        title: str,
+        columns: list[tuple[str, str, str] | tuple[str, str]],
+        rows: list[tuple],
+        show_header: bool = True,
+        header_style: str = "bold green",
+    ):
+        table = RichTable(title=title, show_header=show_header, box=box.SIMPLE_HEAD)
+        for column in columns:
+            table.add_column(
+                column[0], justify=column[2] if len(column) > 2 else "left"  # type: ignore
+            )
+        for row in rows:
+            table.add_row(*row)
+
+        console = RichConsole(
+            file=io.StringIO(), width=self.TABLE_WIDTH, no_color=True, highlight=False
+        )
+        console.print(table)
+        rendered: str = console.file.getvalue()  # type: ignore
+
+        # one message per table unless it does not fit; split on row boundaries
+        limit = MAX_MESSAGE_LENGTH - len("<pre></pre>")
+        chunk: list[str] = []
+        size = 0
+        for line in rendered.rstrip().splitlines():
+            line = html.escape(line)
+            if chunk and size + len(line) + 1 > limit:
+                self._submit_pre("\n".join(chunk))
+                chunk, size = [], 0
+            chunk.append(line[:limit])
+            size += len(line) + 1
+        if chunk:
+            self._submit_pre("\n".join(chunk))
 
     def send_progress(self, func, *args, **kwargs) -> None:
-        func(None, *args, **kwargs)
+        message = _LiveMessage(lambda: progress.render())
+
+        def on_change() -> None:
+            # the queued message renders the latest state when it is sent,
+            # so updates in between need no further scheduling
+            if not message.queued:
+                self._submit(message)
+
+        progress = _TelegramProgress(on_change)
+        try:
+            func(progress, *args, **kwargs)
+        finally:
+            self._submit(message)
+
+    def send_live(
+        self, render: Callable[[], str], parse_mode: Optional[str] = None
+    ) -> Callable[[], None]:
+        """Sends a message showing `render()`, and returns a function that
+        edits it to show the current `render()` again."""
+        message = _LiveMessage(render, parse_mode)
+        self._submit(message)
+        return lambda: self._submit(message)
+
+    def send_exception(self, exception: Exception) -> None:
+        self.send_text(f"<error> {type(exception).__name__}: {exception}")
+
+    async def drain(self) -> None:
+        """Sends everything queued so far without waiting for the batch window,
+        and returns once the queue is empty. Must be awaited on the bot's loop."""
+        if self._queue:
+            self._flush_now.set()
+        await self._idle.wait()
+
+    def _submit_pre(self, text: str) -> None:
+        self._submit(_LiveMessage(lambda: f"<pre>{text}</pre>", "HTML"))
+
+    def _submit(self, item: str | _LiveMessage) -> None:
+        try:
+            on_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            on_loop = False
+
+        if on_loop:
+            self._enqueue(item)
+        else:
+            self.loop.call_soon_threadsafe(self._enqueue, item)
+
+    def _enqueue(self, item: str | _LiveMessage) -> None:
+        if isinstance(item, _LiveMessage):
+            if item.queued:
+                return
+            item.queued = True
+            self._queue.append(item)
+        else:
+            for start in range(0, max(len(item), 1), MAX_MESSAGE_LENGTH):
+                self._queue.append(item[start : start + MAX_MESSAGE_LENGTH])
+
+        self._idle.clear()
+        if self._worker is None or self._worker.done():
+            self._worker = self.loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        try:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.BATCH_WINDOW)
+            except asyncio.TimeoutError:
+                pass
+
+            while self._queue:
+                self._flush_now.clear()
+                # lines keep piling up while we wait for a slot, so a busy
+                # chat gets fewer, fuller messages
+                await self.rate_limiter.acquire(self.chat_id)
+
+                item = self._queue.popleft()
+                if isinstance(item, _LiveMessage):
+                    item.queued = False
+                    await self._send_live(item)
+                    continue
+
+                lines = [item]
+                size = len(item)
+                while (
+                    self._queue
+                    and isinstance(self._queue[0], str)
+                    and size + 1 + len(self._queue[0]) <= MAX_MESSAGE_LENGTH
+                ):
+                    line = self._queue.popleft()
+                    lines.append(line)  # type: ignore
+                    size += 1 + len(line)
+                await self._call(self.bot.send_message, text="\n".join(lines))
+        finally:
+            if not self._queue:
+                self._idle.set()
+
+    async def _send_live(self, message: _LiveMessage) -> None:
+        text = message.render()
+        if text == message.last_text:
+            return
+
+        if message.message_id is None:
+            sent = await self._call(
+                self.bot.send_message, text=text, parse_mode=message.parse_mode
+            )
+            if sent is not None:
+                message.message_id = sent.message_id
+        else:
+            await self._call(
+                self.bot.edit_message_text,
+                message_id=message.message_id,
+                text=text,
+                parse_mode=message.parse_mode,
+            )
+        message.last_text = text
+
+    async def _call(self, method, **kwargs):
+        for _ in range(self.SEND_ATTEMPTS):
+            try:
+                return await method(chat_id=self.chat_id, **kwargs)
+            except RetryAfter as e:
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                await asyncio.sleep(delay)
+            except TelegramError as e:
+                self._report(f"<error> failed to send Telegram message: {e}")
+                return None
+        self._report("<error> failed to send Telegram message: still rate limited")
+        return None
+
+    def _report(self, text: str) -> None:
+        # through the process-wide messenger; the chat's own messenger would
+        # only queue the report behind the message it failed to send
+        bound = globalvars.bind_context(None)  # type: ignore
+        try:
+            print(text)
+        finally:
+            globalvars.unbind_context(bound)
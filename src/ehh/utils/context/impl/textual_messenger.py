@@ -1,32 +1,82 @@
+import re
+from collections import deque
+
 from textual.widgets import RichLog
 from textual.app import App
 from textual.css.query import NoMatches
+from textual.timer import Timer
 
 from ..base import Messenger
 
+_MARKUP_PATTERN = re.compile(r"\[|<(?:info|error|warning|success)>")
+_MARKUP_REPLACEMENTS = {
+    "[": "\\[",
+    "<info>": "<[blue]info[/blue]>",
+    "<error>": "<[red]error[/red]>",
+    "<warning>": "<[yellow]warning[/yellow]>",
+    "<success>": "<[b][green]success[/green][/b]>",
+}
+
+
+def _to_markup(message: str) -> str:
+    return _MARKUP_PATTERN.sub(lambda m: _MARKUP_REPLACEMENTS[m.group(0)], message)
+
 
 class TextualMessenger(Messenger):
+    """Writes to the `RichLog` of `widget_id`, once per frame.
+
+    Any thread may send text; it is queued, and the queue is drained by a
+    timer on the app thread. `start` sets that timer up and has to be called
+    on the app thread (from `on_mount`); text sent before is kept until then.
+    """
+
+    # ~30 fps; chatty steps land in one write per frame instead of one per line
+    FLUSH_INTERVAL = 1 / 30
+    MAX_LINES = 5000
+
     def __init__(self, app: App, widget_id: str) -> None:
         self.app = app
         self.widget_id = widget_id
+        self._log_widget: RichLog | None = None
+        self._pending: deque[str] = deque(maxlen=self.MAX_LINES)
+        self._flush_timer: Timer | None = None
         super().__init__()
 
+    def _get_log_widget(self) -> RichLog | None:
+        if self._log_widget is None or not self._log_widget.is_attached:
+            try:
+                self._log_widget = self.app.query_one(self.widget_id, RichLog)
+            except NoMatches:
+                self._log_widget = None
+        return self._log_widget
+
+    def start(self) -> None:
+        # not from `send_text`: widgets and timers only work on the app
+        # thread, and blocking a worker on it with `call_from_thread` would
+        # deadlock commands that wait for those workers on the app loop
+        if self._flush_timer is None:
+            self._flush_timer = self.app.set_interval(self.FLUSH_INTERVAL, self.flush)
+
     def send_text(self, *args, **kwargs):
-        try:
-            log_widget = self.app.query_one("#output-log", RichLog)
-        except NoMatches:
-            print(
-                f"<warning> could not following in app due to log widget not found:\n{args[0]}"
-            )
+        # deque appends are atomic, so this is safe from any thread
+        self._pending.append(_to_markup(str(args[0]) if args else ""))
+
+    def send_progress(self, func, *args, **kwargs) -> None:
+        func(None, *args, **kwargs)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+
+        log_widget = self._get_log_widget()
+        if log_widget is None:
             return
 
-        message = (
-            args[0]
-            .replace("[", "[[")
-            .replace("]", "]]")
-            .replace("<info>", "<[blue]info[/blue]>")
-            .replace("<error>", "<[red]error[/red]>")
-            .replace("<warning>", "<[yellow]warning[/yellow]>")
-            .replace("<success>", "<[b][green]success[/green][/b]>")
-        )
-        log_widget.write(message)
+        # popleft, so lines appended by other threads meanwhile stay queued
+        messages = []
+        while True:
+            try:
+                messages.append(self._pending.popleft())
+            except IndexError:
+                break
+        log_widget.write("\n".join(messages))
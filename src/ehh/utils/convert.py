@@ -1,3 +1,6 @@
+from datetime import datetime
+
+
 def try_parse_int(input_string: str) -> int | None:
     try:
         return int(input_string)
@@ -5,6 +8,26 @@ def try_parse_int(input_string: str) -> int | None:
         return None
 
 
+def try_parse_datetime(value: str | int | float | None) -> datetime | None:
+    if value is None or value == "":
+        return None
+
+    # epoch timestamps come in milliseconds from the gateway
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000)
+
+    try:
+        return datetime.fromisoformat(value.strip().replace("/", "-"))
+    except ValueError:
+        return None
+
+
+def format_datetime(value: datetime | None) -> str:
+    if value is None:
+        return "-"
+    return value.strftime("%Y-%m-%d %H:%M")
+
+
 def mask_string_middle(input_string: str) -> str:
     REVEAL_COUNT = 3
 
@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+T = TypeVar("T")
+
+THREAD_POOL_WORKERS = 8
+# whisper models are large; one worker keeps a single model resident
+PROCESS_POOL_WORKERS = 1
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        _thread_pool = ThreadPoolExecutor(
+            max_workers=THREAD_POOL_WORKERS, thread_name_prefix="ehh-worker"
+        )
+    return _thread_pool
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: forking a process that may hold CUDA or event loop state is unsafe
+        _process_pool = ProcessPoolExecutor(
+            max_workers=PROCESS_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+async def run_sync(
+    func: Callable[..., T], *args: Any, timeout: Optional[float] = None, **kwargs: Any
+) -> T:
+    """Runs blocking `func` in the shared thread pool and awaits its result.
+
+    Context variables of the caller are visible inside `func`. On timeout the
+    awaiting coroutine gets `asyncio.TimeoutError`; the worker thread itself
+    cannot be interrupted and finishes in the background.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(
+        contextvars.copy_context().run, functools.partial(func, *args, **kwargs)
+    )
+    return await asyncio.wait_for(
+        loop.run_in_executor(get_thread_pool(), call), timeout
+    )
+
+
+async def run_in_process(
+    func: Callable[..., T], *args: Any, timeout: Optional[float] = None
+) -> T:
+    """Runs CPU-bound `func` in the shared process pool.
+
+    `func` and its arguments must be picklable, and `func` must not rely on
+    `globalvars`: the worker process has its own, empty module state.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(get_process_pool(), func, *args), timeout
+    )
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """An event loop running forever in a daemon thread.
+
+    Lets synchronous code run coroutines (and keep async clients bound to
+    one loop) whether or not the calling thread has a loop of its own.
+    """
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="ehh-async", daemon=True
+            ).start()
+            _background_loop = loop
+    return _background_loop
+
+
+def run_coroutine(
+    coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None
+) -> T:
+    """Runs `coroutine` on the background loop and blocks until it is done."""
+    future = asyncio.run_coroutine_threadsafe(coroutine, get_background_loop())
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+
+def shutdown_executors() -> None:
+    global _thread_pool, _process_pool, _background_loop
+    if _thread_pool is not None:
+        _thread_pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = None
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _background_loop is not None:
+        _background_loop.call_soon_threadsafe(_background_loop.stop)
+        _background_loop = None
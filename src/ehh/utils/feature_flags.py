@@ -1,6 +1,7 @@
 WHISPER: bool = True
 PYPERCLIP: bool = True
 SELENIUM: bool = True
+TIKTOKEN: bool = True
 
 try:
     import whisper  # type: ignore
@@ -16,3 +17,8 @@ try:
     import selenium  # type: ignore
 except ImportError:
     SELENIUM = False
+
+try:
+    import tiktoken  # type: ignore
+except ImportError:
+    TIKTOKEN = False
@@ -6,6 +6,7 @@ PLATFORM_DIRS = PlatformDirs(appname="ehh", appauthor="ujhhgtg", ensure_exists=T
 
 CONFIG_DIR = Path(PLATFORM_DIRS.user_config_dir)
 CACHE_DIR = Path(PLATFORM_DIRS.user_cache_dir)
+DATA_DIR = Path(PLATFORM_DIRS.user_data_dir)
 
 
 def read_file_text(path: str | Path) -> str:
@@ -0,0 +1,254 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Literal, Optional
+
+import httpx
+from munch import Munch
+
+from .logging import print
+
+CASSETTE_VERSION = 1
+# everything else describes the original transfer, not the stored content
+KEPT_HEADERS = ("content-type",)
+
+CassetteMode = Literal["record", "replay"]
+
+
+def _request_key(request: httpx.Request) -> str:
+    # the host is left out so a recording against one server (say, the mock
+    # gateway on a random port) replays against another
+    digest = hashlib.sha256()
+    for part in (
+        request.method.encode(),
+        request.url.raw_path,
+        hashlib.sha256(request.content).digest(),
+    ):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """Records the HTTP traffic of a client to a cassette, or replays it.
+
+    A cassette is a gzipped JSON lines file of interactions (request key,
+    status, headers and elapsed time), with each distinct response body stored
+    once. Requests are matched by method, path, query and body; repeats of a
+    request replay its recorded responses in order, then the last one again.
+    With `realtime`, replayed responses take as long as the recorded ones.
+
+    Only hashes of requests are stored, but responses are stored as they are,
+    so a cassette holds the tokens and homework of the recorded account.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        mode: CassetteMode,
+        realtime: bool = False,
+        transport: Optional[httpx.BaseTransport] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.mode = mode
+        self.realtime = realtime
+        self._lock = threading.Lock()
+        self._blobs: dict[str, bytes] = {}
+        self._recorded_blobs: set[str] = set()
+        self._interactions: dict[str, deque[dict]] = defaultdict(deque)
+        self._file = None
+        self._transport = None
+
+        if mode == "record":
+            self._transport = transport or httpx.HTTPTransport()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+            self._write({"version": CASSETTE_VERSION})
+        else:
+            self._load()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        key = _request_key(request)
+        if self.mode == "record":
+            return self._record(key, request)
+        return self._replay(key, request)
+
+    def _record(self, key: str, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        response = self._transport.handle_request(request)  # type: ignore
+        try:
+            # decoded content; the stored headers no longer mention the encoding
+            content = httpx.Response(
+                response.status_code,
+                headers=response.headers,
+                stream=response.stream,
+                request=request,
+            ).read()
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - started
+
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() in KEPT_HEADERS
+        ]
+        body_hash = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            if body_hash not in self._recorded_blobs:
+                self._recorded_blobs.add(body_hash)
+                self._write({"blob": body_hash, **self._encode(content)})
+            self._write(
+                {
+                    "key": key,
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": response.status_code,
+                    "headers": headers,
+                    "body": body_hash,
+                    "elapsed": round(elapsed, 4),
+                }
+            )
+            # keep what has been recorded readable if the process dies
+            self._file.flush()  # type: ignore
+        return httpx.Response(
+            response.status_code, headers=headers, content=content, request=request
+        )
+
+    def _replay(self, key: str, request: httpx.Request) -> httpx.Response:
+        with self._lock:
+            queue = self._interactions.get(key)
+            if not queue:
+                raise httpx.ConnectError(
+                    f"no recorded response for {request.method} {request.url.path} in cassette '{self.path}'",
+                    request=request,
+                )
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+
+        if self.realtime:
+            time.sleep(interaction["elapsed"])
+        return httpx.Response(
+            interaction["status"],
+            headers=interaction["headers"],
+            content=self._blobs[interaction["body"]],
+            request=request,
+        )
+
+    def _load(self) -> None:
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "blob" in entry:
+                        self._blobs[entry["blob"]] = self._decode(entry)
+                    elif "key" in entry:
+                        self._interactions[entry["key"]].append(entry)
+                    elif entry.get("version") != CASSETTE_VERSION:
+                        raise ValueError(
+                            f"unsupported cassette version {entry.get('version')}"
+                        )
+        except EOFError:
+            # the recording process died; everything up to its last flush is there
+            print(f"<warning> cassette '{self.path}' is truncated")
+
+    def _write(self, entry: dict) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")  # type: ignore
+
+    @staticmethod
+    def _encode(content: bytes) -> dict:
+        try:
+            return {"text": content.decode("utf-8")}
+        except UnicodeDecodeError:
+            return {"base64": base64.b64encode(content).decode("ascii")}
+
+    @staticmethod
+    def _decode(entry: dict) -> bytes:
+        if "text" in entry:
+            return entry["text"].encode("utf-8")
+        return base64.b64decode(entry["base64"])
+
+    def close(self) -> None:
+        # shared by every client of the process; closed by `close_cassettes`
+        pass
+
+    def finish(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+
+_cassettes: dict[Path, CassetteTransport] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(
+    path: str | Path, mode: CassetteMode, realtime: bool = False
+) -> CassetteTransport:
+    """The process-wide cassette at `path`, opened on first use."""
+    path = Path(path).expanduser().resolve()
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None:
+            if not _cassettes:
+                atexit.register(close_cassettes)
+            cassette = CassetteTransport(path, mode, realtime)
+            _cassettes[path] = cassette
+            if mode == "record":
+                print(f"<info> recording http traffic to cassette '{path}'")
+            else:
+                print(
+                    f"<info> replaying http traffic from cassette '{path}'{' in real time' if realtime else ''}"
+                )
+        return cassette
+
+
+def close_cassettes() -> None:
+    with _cassettes_lock:
+        for cassette in _cassettes.values():
+            cassette.finish()
+        _cassettes.clear()
+
+
+def create_http_client(config: Optional[Munch], **kwargs) -> httpx.Client:
+    """An `httpx.Client` that records or replays through the cassette set by
+    `http_cassette` in `config`, or a plain one if there is none."""
+    cassette_config = getattr(config, "http_cassette", None)
+    mode = getattr(cassette_config, "mode", None)
+    if mode is None:
+        return httpx.Client(**kwargs)
+    if mode not in ("record", "replay"):
+        print(f"<warning> unknown http cassette mode '{mode}'; not using cassette")
+        return httpx.Client(**kwargs)
+
+    transport = get_cassette(
+        cassette_config.path, mode, getattr(cassette_config, "realtime", False)
+    )
+    return httpx.Client(transport=transport, **kwargs)
+
+
+# requests still running on a replaced client get this long to finish
+REPLACED_CLIENT_GRACE_PERIOD = 60
+
+
+def apply_http_config(context, old: Munch, new: Munch, **kwargs) -> None:
+    """Gives `context` a new client if the http settings changed between the
+    `old` and `new` config; the old client is closed after a grace period."""
+    if getattr(old, "http_cassette", None) == getattr(new, "http_cassette", None):
+        return
+    old_client = context.http_client
+    context.http_client = create_http_client(new, **kwargs)
+    timer = threading.Timer(REPLACED_CLIENT_GRACE_PERIOD, old_client.close)
+    timer.daemon = True
+    timer.start()
+    print("<info> http settings changed; using a new http client")
@@ -0,0 +1,344 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from .context.base import Context, Messenger
+from .fs import DATA_DIR
+from .logging import print
+
+JOBS_DB = DATA_DIR / "bot_jobs.sqlite3"
+
+
+class JobState(Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    @property
+    def finished(self) -> bool:
+        return self in (JobState.DONE, JobState.FAILED, JobState.CANCELLED)
+
+
+@dataclass
+class Job:
+    id: int
+    chat_id: int
+    kind: str
+    title: str
+    args: dict
+    state: JobState = JobState.QUEUED
+    progress: str = ""
+    result_text: Optional[str] = None
+    result_file: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    # set by `JobManager.cancel`; threads doing the job's blocking work cannot
+    # be stopped, so they check it (see `JobContext`)
+    cancelled: threading.Event = field(
+        default_factory=threading.Event, repr=False, compare=False
+    )
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class _CancellableProgress:
+    def __init__(self, progress, job: Job) -> None:
+        self._progress = progress
+        self._job = job
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._progress, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            _check_cancelled(self._job)
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class _JobMessenger(Messenger):
+    # output of a cancelled job raises instead, which also ends the work that
+    # produced it
+    def __init__(self, messenger: Messenger, job: Job) -> None:
+        self.messenger = messenger
+        self.job = job
+
+    def send_text(self, *args, **kwargs) -> None:
+        _check_cancelled(self.job)
+        self.messenger.send_text(*args, **kwargs)
+
+    def send_table(self, *args, **kwargs) -> None:
+        _check_cancelled(self.job)
+        self.messenger.send_table(*args, **kwargs)
+
+    def send_progress(self, func, *args, **kwargs) -> None:
+        _check_cancelled(self.job)
+        self.messenger.send_progress(
+            lambda progress, *args, **kwargs: func(
+                _CancellableProgress(progress, self.job), *args, **kwargs
+            ),
+            *args,
+            **kwargs,
+        )
+
+    def send_exception(self, exception: Exception) -> None:
+        _check_cancelled(self.job)
+        self.messenger.send_exception(exception)
+
+    def __getattr__(self, name: str):
+        return getattr(self.messenger, name)
+
+
+class JobContext:
+    """`context` as the work of `job` sees it: the same context, except that
+    output sent after the job is cancelled raises `JobCancelled`."""
+
+    def __init__(self, context: Context, job: Job) -> None:
+        object.__setattr__(self, "_context", context)
+        object.__setattr__(self, "messenger", _JobMessenger(context.messenger, job))
+
+    def __getattr__(self, name: str):
+        return getattr(self._context, name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self._context, name, value)
+
+
+def _check_cancelled(job: Job) -> None:
+    if job.cancelled.is_set():
+        raise JobCancelled(f"job {job.id} was cancelled")
+
+
+JobRunner = Callable[[Job], Awaitable[None]]
+
+_COLUMNS = (
+    "id",
+    "chat_id",
+    "kind",
+    "title",
+    "args",
+    "state",
+    "progress",
+    "result_text",
+    "result_file",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
+
+class JobManager:
+    """Runs long commands in the background.
+
+    Each job kind has its own runner and concurrency limit. Jobs are stored in
+    SQLite whenever they change, so results outlive the process, and jobs that
+    were queued or running at shutdown are started again by `resume`.
+    Runners report failure by raising; the exception message becomes the
+    job's error.
+
+    Cancelling a job cancels its task. Blocking work it started in another
+    thread keeps running until it next sends output through a `JobContext`,
+    and nothing the job reports after the cancel reaches the chat.
+    """
+
+    def __init__(
+        self,
+        runners: dict[str, JobRunner],
+        on_change: Callable[[Job, JobState], Awaitable[None]],
+        limits: Optional[dict[str, int]] = None,
+        default_limit: int = 2,
+        db_path: str | Path = JOBS_DB,
+    ) -> None:
+        self.runners = runners
+        self.on_change = on_change
+        limits = limits or {}
+        self._semaphores = {
+            kind: asyncio.Semaphore(limits.get(kind, default_limit)) for kind in runners
+        }
+        self._tasks: dict[int, tuple[Job, asyncio.Task]] = {}
+        self._notifications: set[asyncio.Task] = set()
+        self._closing = False
+        self._db = sqlite3.connect(str(db_path))
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, "
+                "kind TEXT NOT NULL, title TEXT NOT NULL, args TEXT NOT NULL, "
+                "state TEXT NOT NULL, progress TEXT NOT NULL, result_text TEXT, "
+                "result_file TEXT, error TEXT, created_at REAL NOT NULL, "
+                "started_at REAL, finished_at REAL)"
+            )
+
+    def submit(self, chat_id: int, kind: str, title: str, args: dict) -> Job:
+        if kind not in self.runners:
+            raise ValueError(f"unknown job kind '{kind}'")
+
+        job = Job(id=0, chat_id=chat_id, kind=kind, title=title, args=args)
+        with self._db:
+            cursor = self._db.execute(
+                f"INSERT INTO jobs ({', '.join(_COLUMNS[1:])}) "
+                f"VALUES ({', '.join('?' * (len(_COLUMNS) - 1))})",
+                self._to_row(job)[1:],
+            )
+        job.id = cursor.lastrowid  # type: ignore
+        self._start(job)
+        return job
+
+    def resume(self) -> int:
+        """Starts again the jobs left unfinished by the previous run."""
+        rows = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE state IN (?, ?) ORDER BY id",
+            (JobState.QUEUED.value, JobState.RUNNING.value),
+        ).fetchall()
+        for row in rows:
+            job = self._from_row(row)
+            if job.kind not in self.runners:
+                self._finish(job, JobState.FAILED, "job kind no longer exists")
+                continue
+            job.state = JobState.QUEUED
+            job.progress = "restarted after bot restart"
+            job.started_at = None
+            self._start(job)
+        return len(rows)
+
+    def report(self, job: Job, progress: str) -> None:
+        if job.cancelled.is_set():
+            return
+        job.progress = progress
+        self._save(job)
+        self._notify(job)
+
+    def cancel(self, chat_id: int, job_id: int) -> bool:
+        entry = self._tasks.get(job_id)
+        if entry is None or entry[0].chat_id != chat_id:
+            return False
+        entry[0].cancelled.set()
+        entry[1].cancel()
+        return True
+
+    def get(self, chat_id: int, job_id: int) -> Optional[Job]:
+        entry = self._tasks.get(job_id)
+        if entry is not None:
+            return entry[0] if entry[0].chat_id == chat_id else None
+        row = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ? AND chat_id = ?",
+            (job_id, chat_id),
+        ).fetchone()
+        return None if row is None else self._from_row(row)
+
+    def jobs_of(self, chat_id: int, limit: int = 10) -> list[Job]:
+        rows = self._db.execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE chat_id = ? "
+            "ORDER BY id DESC LIMIT ?",
+            (chat_id, limit),
+        ).fetchall()
+        # live jobs carry progress that may be newer than the stored row
+        return [
+            self._tasks[row[0]][0] if row[0] in self._tasks else self._from_row(row)
+            for row in rows
+        ]
+
+    async def close(self) -> None:
+        # unfinished jobs keep their stored state and are resumed next start
+        self._closing = True
+        tasks = [task for _, task in self._tasks.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._db.close()
+
+    def _start(self, job: Job) -> None:
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks[job.id] = (job, task)
+        self._notify(job)
+
+    async def _run(self, job: Job) -> None:
+        try:
+            async with self._semaphores[job.kind]:
+                job.state = JobState.RUNNING
+                job.started_at = time.time()
+                self._save(job)
+                self._notify(job)
+                await self.runners[job.kind](job)
+        except asyncio.CancelledError:
+            if self._closing:
+                raise
+            self._finish(job, JobState.CANCELLED)
+        except Exception as e:
+            if job.cancelled.is_set():
+                self._finish(job, JobState.CANCELLED)
+            else:
+                self._finish(job, JobState.FAILED, str(e) or type(e).__name__)
+        else:
+            # cancelled after the runner's last await; its result is dropped
+            state = JobState.CANCELLED if job.cancelled.is_set() else JobState.DONE
+            self._finish(job, state)
+
+    def _finish(self, job: Job, state: JobState, error: Optional[str] = None) -> None:
+        job.state = state
+        job.error = error
+        job.finished_at = time.time()
+        self._tasks.pop(job.id, None)
+        self._save(job)
+        self._notify(job)
+
+    def _notify(self, job: Job) -> None:
+        # the state is passed along because the job may have moved on by the
+        # time the callback runs
+        async def notify(state: JobState) -> None:
+            try:
+                await self.on_change(job, state)
+            except Exception as e:
+                print(f"<error> failed to report status of job {job.id}: {e}")
+
+        task = asyncio.get_running_loop().create_task(notify(job.state))
+        self._notifications.add(task)
+        task.add_done_callback(self._notifications.discard)
+
+    def _save(self, job: Job) -> None:
+        with self._db:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                self._to_row(job),
+            )
+
+    @staticmethod
+    def _to_row(job: Job) -> tuple:
+        return (
+            job.id,
+            job.chat_id,
+            job.kind,
+            job.title,
+            json.dumps(job.args, ensure_ascii=False),
+            job.state.value,
+            job.progress,
+            job.result_text,
+            job.result_file,
+            job.error,
+            job.created_at,
+            job.started_at,
+            job.finished_at,
+        )
+
+    @staticmethod
+    def _from_row(row: tuple) -> Job:
+        values = dict(zip(_COLUMNS, row))
+        values["args"] = json.loads(values["args"])
+        values["state"] = JobState(values["state"])
+        return Job(**values)
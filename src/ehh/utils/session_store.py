@@ -0,0 +1,182 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from ..models.api.token import Token
+from ..models.homework_index import HomeworkIndex
+from ..models.homework_record import HomeworkRecord
+from .context.base import Context
+from .fs import DATA_DIR
+from .logging import print
+
+SESSIONS_DB = DATA_DIR / "bot_sessions.sqlite3"
+
+
+class ChatSession:
+    """Everything one chat owns: its context (messenger + http client), login
+    state, homework list and scratch caches.
+
+    Handlers and jobs `hold` the session while they run. An evicted session
+    that is still held keeps its http client open until the last of them
+    `release`s it.
+    """
+
+    def __init__(self, chat_id: int, context: Context) -> None:
+        self.chat_id = chat_id
+        self.context = context
+        self.token: Optional[Token] = None
+        self.token_obtained_at: float = 0.0
+        self.hw_list: list[HomeworkRecord] = []
+        self.hw_index: Optional[HomeworkIndex] = None
+        self.cache: dict = {}
+        self.last_used = time.monotonic()
+        self._users = 0
+        self._evicted = False
+        self._lock = threading.Lock()
+
+    def hold(self) -> None:
+        with self._lock:
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            close = self._evicted and self._users == 0
+        if close:
+            self.context.http_client.close()
+
+    def set_token(
+        self, token: Optional[Token], obtained_at: float | None = None
+    ) -> None:
+        self.token = token
+        self.token_obtained_at = time.time() if obtained_at is None else obtained_at
+        if token is None:
+            self.hw_list = []
+            self.hw_index = None
+
+    @property
+    def token_expired(self) -> bool:
+        if self.token is None:
+            return True
+        return time.time() >= self.token_obtained_at + self.token.expires_in
+
+    def close(self) -> None:
+        with self._lock:
+            self._evicted = True
+            close = self._users == 0
+        if close:
+            self.context.http_client.close()
+
+
+class SessionStore:
+    """LRU of chat sessions with idle eviction.
+
+    Only the login token is persisted (to SQLite), so a chat that comes back
+    after eviction or a restart does not need to log in again; homework lists
+    are cheap to refetch and are kept in memory only.
+    """
+
+    def __init__(
+        self,
+        context_factory: Callable[[int], Context],
+        max_sessions: int = 256,
+        idle_timeout: float = 3600,
+        db_path: str | Path = SESSIONS_DB,
+    ) -> None:
+        self.context_factory = context_factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions: OrderedDict[int, ChatSession] = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        with self._db_lock, self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "chat_id INTEGER PRIMARY KEY, token TEXT NOT NULL, obtained_at REAL NOT NULL)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[ChatSession]:
+        # a copy, so sessions can be evicted while the caller iterates
+        return iter(list(self._sessions.values()))
+
+    def get(self, chat_id: int) -> ChatSession:
+        self._evict_idle()
+
+        session = self._sessions.get(chat_id)
+        if session is None:
+            session = ChatSession(chat_id, self.context_factory(chat_id))
+            self._restore(session)
+            self._sessions[chat_id] = session
+            while len(self._sessions) > self.max_sessions:
+                _, oldest = self._sessions.popitem(last=False)
+                self._evict(oldest)
+        else:
+            self._sessions.move_to_end(chat_id)
+
+        session.last_used = time.monotonic()
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        with self._db_lock, self._db:
+            if session.token is None:
+                self._db.execute(
+                    "DELETE FROM sessions WHERE chat_id = ?", (session.chat_id,)
+                )
+            else:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                    (
+                        session.chat_id,
+                        json.dumps(session.token.to_dict(), ensure_ascii=False),
+                        session.token_obtained_at,
+                    ),
+                )
+
+    def close(self) -> None:
+        while self._sessions:
+            _, session = self._sessions.popitem(last=False)
+            self._evict(session)
+        with self._db_lock:
+            self._db.close()
+
+    def _restore(self, session: ChatSession) -> None:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT token, obtained_at FROM sessions WHERE chat_id = ?",
+                (session.chat_id,),
+            ).fetchone()
+        if row is None:
+            return
+
+        try:
+            session.set_token(Token.from_dict(json.loads(row[0])), row[1])
+        except (ValueError, KeyError, TypeError) as e:
+            print(
+                f"<warning> dropping unreadable session of chat {session.chat_id}: {e}"
+            )
+            session.set_token(None)
+        if session.token_expired:
+            session.set_token(None)
+            self.save(session)
+
+    def _evict_idle(self) -> None:
+        # sessions are kept in least-recently-used order, so stop at the first
+        # one that is still fresh
+        deadline = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            chat_id, session = next(iter(self._sessions.items()))
+            if session.last_used > deadline:
+                break
+            del self._sessions[chat_id]
+            self._evict(session)
+
+    def _evict(self, session: ChatSession) -> None:
+        self.save(session)
+        session.close()
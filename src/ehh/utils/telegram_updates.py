@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently while keeping each chat's updates in order.
+
+    Updates wait for their chat's turn before taking one of
+    `max_concurrent_updates` slots, so a user flooding one chat cannot starve
+    the others. At most `max_pending_updates` updates are held at once.
+    """
+
+    def __init__(
+        self, max_concurrent_updates: int, max_pending_updates: int = 1024
+    ) -> None:
+        super().__init__(max(max_pending_updates, max_concurrent_updates))
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        # chat id -> (lock, number of updates holding or waiting for it)
+        self._chat_locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        chat_id = None
+        if isinstance(update, Update) and update.effective_chat is not None:
+            chat_id = update.effective_chat.id
+        if chat_id is None:
+            async with self._running:
+                await coroutine
+            return
+
+        # asyncio.Lock wakes waiters first-in first-out, and updates reach
+        # this point in the order they were received
+        lock, users = self._chat_locks.get(chat_id, (asyncio.Lock(), 0))
+        self._chat_locks[chat_id] = (lock, users + 1)
+        try:
+            async with lock, self._running:
+                await coroutine
+        finally:
+            lock, users = self._chat_locks[chat_id]
+            if users == 1:
+                del self._chat_locks[chat_id]
+            else:
+                self._chat_locks[chat_id] = (lock, users - 1)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,121 @@
+import hmac
+import json
+from typing import Optional
+
+import uvicorn
+from telegram import Update
+from telegram.ext import Application
+
+from .logging import print
+
+SECRET_TOKEN_HEADER = b"x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class WebhookApp:
+    """ASGI app that accepts Telegram webhook requests and hands the updates
+    to the application's update queue.
+
+    It answers as soon as the update is queued; handlers run afterwards,
+    so Telegram never waits on a slow command.
+    """
+
+    def __init__(
+        self, application: Application, path: str, secret_token: Optional[str] = None
+    ) -> None:
+        self.application = application
+        self.path = "/" + path.strip("/")
+        self.secret_token = secret_token.encode() if secret_token else None
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            return
+
+        if scope["path"].rstrip("/") != self.path.rstrip("/"):
+            await self._respond(send, 404)
+            return
+        if scope["method"] != "POST":
+            await self._respond(send, 405)
+            return
+        if self.secret_token is not None:
+            headers = dict(scope["headers"])
+            if not hmac.compare_digest(
+                headers.get(SECRET_TOKEN_HEADER, b""), self.secret_token
+            ):
+                await self._respond(send, 403)
+                return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_SIZE:
+                await self._respond(send, 413)
+                return
+            if not message.get("more_body", False):
+                break
+
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"<warning> telegram bot: rejected malformed webhook update: {e}")
+            await self._respond(send, 400)
+            return
+
+        await self.application.update_queue.put(update)
+        await self._respond(send, 200)
+
+    @staticmethod
+    async def _respond(send, status: int) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-length", b"0")],
+            }
+        )
+        await send({"type": "http.response.body", "body": b""})
+
+
+async def run_webhook(
+    application: Application,
+    url: str,
+    listen: str = "127.0.0.1",
+    port: int = 8080,
+    path: str = "/",
+    secret_token: Optional[str] = None,
+    allowed_updates: Optional[list[str]] = None,
+) -> None:
+    """Registers `url` as the bot's webhook and serves it until interrupted.
+
+    Several workers may run this with the same `url` behind a reverse proxy;
+    registering the webhook again is harmless.
+    """
+    server = uvicorn.Server(
+        uvicorn.Config(
+            WebhookApp(application, path, secret_token),
+            host=listen,
+            port=port,
+            lifespan="off",
+            log_level="warning",
+        )
+    )
+
+    # the order of `Application.run_polling`: stop, shutdown, post_shutdown
+    await application.initialize()
+    try:
+        if application.post_init is not None:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=url, secret_token=secret_token, allowed_updates=allowed_updates
+        )
+        await application.start()
+        print(f"<info> telegram bot: serving webhook on {listen}:{port}{path}")
+        try:
+            await server.serve()
+        finally:
+            await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
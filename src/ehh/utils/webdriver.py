@@ -1,9 +1,226 @@
+import atexit
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from munch import Munch
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.remote.webelement import WebElement
 
+from .fs import DATA_DIR
+from .logging import print
+
+BROWSER_PROFILES_DIR = DATA_DIR / "browser_profiles"
+# fonts, media and trackers; the pages work without any of them
+DEFAULT_BLOCKED_URLS = [
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.eot",
+    "*.mp3",
+    "*.mp4",
+    "*.m4a",
+    "*.wav",
+    "*.ogg",
+    "*.webm",
+    "*hm.baidu.com*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+]
+CHROMIUM_BROWSERS = ("chrome", "edge")
+PROFILE_LOCK_FILE = ".ehh.lock"
+
+# lock files of the profile directories this process has claimed; kept open,
+# as closing one releases its lock
+_claimed_profiles: dict[Path, object] = {}
+
+
+def _try_lock(path: Path):
+    # an exclusive lock on a file of its own, which the os drops when the
+    # process exits, however it exits
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def _claim_profile_dir(profile_dir: Path, browser_type: str) -> Path:
+    """`profile_dir`, or a temporary profile if another process (a second
+    CLI, or the TUI) already runs a browser on it."""
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    if profile_dir in _claimed_profiles:
+        return profile_dir
+    lock = _try_lock(profile_dir / PROFILE_LOCK_FILE)
+    if lock is not None:
+        _claimed_profiles[profile_dir] = lock
+        return profile_dir
+
+    temp_dir = Path(tempfile.mkdtemp(prefix=f"ehh-{browser_type}-profile-"))
+    atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+    print(
+        f"<warning> browser profile '{profile_dir}' is in use by another process; using a temporary profile"
+    )
+    return temp_dir
+
 
 def safe_find_element(driver, by=By.ID, value: str | None = None) -> WebElement | None:
     try:
         return driver.find_element(by, value)
     except:
         return None
+
+
+def _get_performance_config(browser_config: Munch) -> Munch | None:
+    performance = getattr(browser_config, "performance", None)
+    if performance is None or not getattr(performance, "enabled", True):
+        return None
+    return performance
+
+
+def get_profile_dir(browser_config: Munch) -> Path:
+    """The persistent profile directory of the browser set up by `browser`."""
+    performance = getattr(browser_config, "performance", None)
+    profile_dir = getattr(performance, "profile_dir", None) or (
+        BROWSER_PROFILES_DIR / browser_config.type
+    )
+    return Path(profile_dir).expanduser()
+
+
+def apply_performance_options(
+    driver_options, browser_config: Munch, profile_dir: Path | None = None
+) -> None:
+    """Applies the `browser.performance` profile to the options of a driver
+    that has not been started yet.
+
+    Disables images, sets the page load strategy (eager by default: the SPA is
+    usable before its last resource has loaded) and points the browser at a
+    persistent profile directory, so its HTTP cache survives restarts.
+    `profile_dir` overrides the configured one; a profile can only be open in
+    one browser at a time.
+    """
+    performance = _get_performance_config(browser_config)
+    if performance is None:
+        return
+    browser_type = browser_config.type
+
+    driver_options.page_load_strategy = getattr(
+        performance, "page_load_strategy", "eager"
+    )
+
+    if browser_type == "safari":
+        print(
+            "<warning> safari does not support blocking resources or custom profiles; only the page load strategy is applied"
+        )
+        return
+
+    block_images = getattr(performance, "block_images", True)
+    profile_dir = _claim_profile_dir(
+        profile_dir or get_profile_dir(browser_config), browser_type
+    )
+
+    if browser_type in CHROMIUM_BROWSERS:
+        if block_images:
+            driver_options.add_argument("--blink-settings=imagesEnabled=false")
+            driver_options.add_experimental_option(
+                "prefs", {"profile.managed_default_content_settings.images": 2}
+            )
+        driver_options.add_argument(f"--user-data-dir={profile_dir}")
+    elif browser_type == "firefox":
+        if block_images:
+            driver_options.set_preference("permissions.default.image", 2)
+        # firefox has no url blocking outside of extensions; skip what it can
+        driver_options.set_preference("browser.display.use_document_fonts", 0)
+        driver_options.set_preference("media.autoplay.default", 5)
+        driver_options.set_preference("media.preload.default", 0)
+        driver_options.add_argument("-profile")
+        driver_options.add_argument(str(profile_dir))
+
+    print(f"<info> browser performance profile enabled; profile dir: '{profile_dir}'")
+
+
+def apply_performance_session(driver, browser_config: Munch) -> None:
+    """Applies the parts of the `browser.performance` profile that need a
+    running driver: blocking `block_urls` (chromium browsers only)."""
+    performance = _get_performance_config(browser_config)
+    if performance is None or browser_config.type not in CHROMIUM_BROWSERS:
+        return
+
+    block_urls = getattr(performance, "block_urls", None)
+    if block_urls is None:
+        block_urls = DEFAULT_BLOCKED_URLS
+    if not block_urls:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(block_urls)})
+    except WebDriverException as e:
+        print(f"<warning> failed to block resource urls: {e.msg}")
+        return
+    print(f"<info> blocking {len(block_urls)} resource url patterns")
+
+
+def create_driver(browser_config: Munch, profile_dir: Path | None = None):
+    """Starts a browser as configured by `browser`, with the performance
+    profile applied (in `profile_dir` instead of the configured directory, if
+    given), or returns `None` if the browser type is unsupported."""
+    match browser_config.type:
+        case "chrome":
+            from selenium.webdriver.chrome.options import (
+                Options as WebDriverOptions,
+            )
+            from selenium.webdriver.chrome.webdriver import (
+                WebDriver,
+            )
+        case "firefox":
+            from selenium.webdriver.firefox.options import (
+                Options as WebDriverOptions,
+            )
+            from selenium.webdriver.firefox.webdriver import (
+                WebDriver,
+            )
+        case "edge":
+            from selenium.webdriver.edge.options import (
+                Options as WebDriverOptions,
+            )
+            from selenium.webdriver.edge.webdriver import (
+                WebDriver,
+            )
+        case "safari":
+            from selenium.webdriver.safari.options import (
+                Options as WebDriverOptions,
+            )
+            from selenium.webdriver.safari.webdriver import (
+                WebDriver,
+            )
+        case _:
+            print(f"<error> unsupported browser type: {browser_config.type}")
+            return None
+
+    driver_options = WebDriverOptions()
+    if browser_config.type != "safari":
+        driver_options.binary_location = browser_config.binary_path  # type: ignore
+    else:
+        if browser_config.binary_path != "":
+            print(
+                "<warning> safari browser binary path is ignored; using system default"
+            )
+    if browser_config.headless:
+        driver_options.add_argument("--headless")
+    apply_performance_options(driver_options, browser_config, profile_dir)
+    driver = WebDriver(options=driver_options)  # type: ignore
+    apply_performance_session(driver, browser_config)
+    return driver